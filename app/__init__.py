@@ -7,26 +7,80 @@ from flask_sqlalchemy import SQLAlchemy
 db = SQLAlchemy()
 migrate = Migrate()
 
-def create_app(config_class=None):
+def start_background(app):
+    """
+    Фоновые потоки процесса веб-сервера: слив буфера воспроизведений,
+    JOB_WORKERS воркеров очереди и (WATCH_MEDIA) наблюдатель за медиатекой.
+    create_app их не запускает — иначе их поднимали бы и flask db upgrade,
+    и скрипты; вызывается из run.py и gunicorn.conf.py (после fork).
+    """
+    app.play_events.start()
+    if app.config.get("JOB_WORKERS", 1) > 0:
+        app.jobs.start()
+    elif app.jobs.tasks:
+        app.logger.warning(
+            "JOB_WORKERS=0: this process does not run background jobs. Uploads, rescans, "
+            "seek indexes and periodic jobs stay queued until run_worker.py is started."
+        )
+    if app.config.get("WATCH_MEDIA", False):
+        try:
+            started = app.media_service.start_watcher()
+            if started:
+                app.logger.info("Media watcher started")
+        except Exception as e:
+            app.logger.warning(f"Failed to start media watcher: {e}")
+
+def create_app(config_class=None, start_workers=False):
     app = Flask(__name__, static_folder="../static", template_folder="../templates")
     cfg = config_class or Config()
     app.config.from_object(cfg)
 
+    from .serializers import JSONProvider
+    app.json = JSONProvider(app)
+
     db.init_app(app)
     migrate.init_app(app, db)
 
+    # Server-Timing, медленные запросы, /admin/perf (PROFILING_ENABLED)
+    from .profiling import init_profiling
+    init_profiling(app)
+
+    # кэш ответов + инвалидация по событиям сессии
+    from .cache import create_cache, init_cache_invalidation
+    app.cache = create_cache(app)
+    init_cache_invalidation(app)
+
     # services
     from .services.media_service import MediaService
     app.media_service = MediaService(app)
+    from .services.hls import HlsPackager
+    app.hls = HlsPackager(app)
+    from .services.search_service import SearchService
+    app.search_service = SearchService(app)
+    from .services.trending import Trending
+    app.trending = Trending(app)
+    from .services.history import HistoryRetention
+    app.history = HistoryRetention(app)
+    from .services.play_events import PlayEventBuffer
+    app.play_events = PlayEventBuffer(app)
+    from .services.recommendations import Recommender
+    app.recommender = Recommender(app)
 
-    # optionally start media watcher if enabled
-    if app.config.get("WATCH_MEDIA", False):
-        try:
-            started = app.media_service.start_watcher()
-            if started:
-                app.logger.info("Media watcher started")
-        except Exception as e:
-            app.logger.warning(f"Failed to start media watcher: {e}")
+    # фоновые задачи: воркеры процесса веб-сервера (JOB_WORKERS) и/или run_worker.py
+    from .services.jobs import JobQueue
+    app.jobs = JobQueue(app)
+    app.jobs.register("rescan", app.media_service.scan_and_sync_db, max_attempts=3)
+    app.jobs.register("import_files", app.media_service.import_files)
+    app.jobs.register("import_zip", app.media_service.import_zip)
+    app.jobs.register("build_seek_index", app.media_service.build_seek_index)
+    app.jobs.register("build_recommendations", app.recommender.build, max_attempts=3)
+    app.jobs.every("build_recommendations", app.config.get("RECS_INTERVAL", 3600))
+    app.jobs.register("refresh_trending", app.trending.refresh, max_attempts=3)
+    app.jobs.every("refresh_trending", app.config.get("TRENDING_INTERVAL", 300))
+    app.jobs.register("compact_history", app.history.compact, max_attempts=3)
+    app.jobs.every("compact_history", app.config.get("HISTORY_COMPACT_INTERVAL", 3600))
+    app.jobs.register("purge_hls_cache", app.hls.purge, max_attempts=3)
+    app.jobs.every("purge_hls_cache", app.config.get("HLS_PURGE_INTERVAL", 3600))
 
     # blueprints
     from .routes import main_bp
@@ -77,4 +131,14 @@ def create_app(config_class=None):
             app.logger.error(f"Error creating default admin: {e}")
             # Не прерываем запуск, возможно таблицы ещё не созданы
 
+        # Полнотекстовые индексы поиска (FTS5 / tsvector)
+        try:
+            backend = app.search_service.init_index()
+            app.logger.info(f"Search backend: {backend}")
+        except Exception as e:
+            app.logger.warning(f"Failed to init search index: {e}")
+
+    if start_workers:
+        start_background(app)
+
     return app
\ No newline at end of file
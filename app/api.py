@@ -1,24 +1,82 @@
-from flask import Blueprint, jsonify, request, current_app, session
-from .models import Track, Playlist, User, ListeningHistory, LikedTrack, Genre, playlist_tracks
+from flask import Blueprint, jsonify, request, current_app, session, url_for, Response, send_file, stream_with_context
+from .models import Track, Playlist, ListeningHistory, LikedTrack, Genre, TrackAnalysis, playlist_tracks
 from . import db
-from .auth import require_api_key, require_login
+from .auth import require_api_key, require_admin, require_login, get_current_user
+from .services.streaming import send_media, send_artwork, IMMUTABLE_MAX_AGE
+from .pagination import keyset_page, cached_count, InvalidCursor
+from .cache import cached_response
+from .services.trending import WINDOWS, DEFAULT_WINDOW
+from .services.playlists import PlaylistError, add_tracks, remove_tracks, move_tracks
+from .serializers import (TRACK_COLUMNS, PLAYLIST_COLUMNS, GENRE_COLUMNS, HISTORY_COLUMNS,
+                          project, as_dict, as_dicts, track_dicts, history_dicts)
 from sqlalchemy import func, desc
 
 api_bp = Blueprint("api", __name__)
 
+@api_bp.errorhandler(InvalidCursor)
+def invalid_cursor(e):
+    return jsonify({"error": "invalid_cursor"}), 400
+
+def _limit_arg(default=50, maximum=500):
+    """Размер страницы из ?limit= в пределах [1, maximum]"""
+    return min(max(int(request.args.get("limit", default)), 1), maximum)
+
+STREAM_BATCH = 500  # строк из БД и элементов JSON за один кусок ответа
+
+def _stream_json(head, key, rows, serialize):
+    """
+    Потоковый JSON-ответ: объект head + массив key, элементы которого
+    сериализуются пачками по мере чтения rows — весь ответ в памяти не собирается
+    """
+    dumps = current_app.json.dumps
+    
+    def generate():
+        opening = dumps(head)[:-1]
+        yield opening + ("," if head else "") + dumps(key) + ":["
+        chunk, first = [], True
+        for row in rows:
+            chunk.append(dumps(serialize(row)))
+            if len(chunk) >= STREAM_BATCH:
+                yield ("" if first else ",") + ",".join(chunk)
+                chunk, first = [], False
+        if chunk:
+            yield ("" if first else ",") + ",".join(chunk)
+        yield "]}"
+    
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+def _playlist_tracks_query(pl):
+    """Проекция треков плейлиста + position (для курсора и ответа)"""
+    return project(pl.tracks_query(), TRACK_COLUMNS + (playlist_tracks.c.position,))
+
+def _tracks_in_order(ids):
+    """Проекции треков в порядке ids (чарты, рекомендации); удалённые пропускаются"""
+    by_id = {row["id"]: row for row in as_dicts(db.session.query(*TRACK_COLUMNS).filter(Track.id.in_(ids)))}
+    return [by_id[i] for i in ids if i in by_id]
+
+def _with_cursor_headers(resp, next_cursor, prev_cursor):
+    """Курсоры для эндпоинтов, отдающих JSON-массив"""
+    if next_cursor:
+        resp.headers["X-Next-Cursor"] = next_cursor
+    if prev_cursor:
+        resp.headers["X-Prev-Cursor"] = prev_cursor
+    return resp
+
 @api_bp.route("/playlists/my", methods=["GET"])
 @require_login
 def get_my_playlists_only():  # ИЗМЕНИТЬ ИМЯ
     """Получить только плейлисты текущего пользователя"""
     user_id = session.get("user_id")
-    pls = Playlist.query.filter_by(user_id=user_id).order_by(Playlist.id).all()
-    return jsonify([p.to_dict() for p in pls])
+    pls = project(Playlist.query.filter_by(user_id=user_id), PLAYLIST_COLUMNS).order_by(Playlist.id)
+    return jsonify(as_dicts(pls))
 
 # Tracks
 @api_bp.route("/tracks", methods=["GET"])
 def get_tracks():
-    page = int(request.args.get("page", 1))
-    per = int(request.args.get("per", 100))
+    """
+    Треки: по умолчанию — прежний ответ {items, page, per, total} (OFFSET).
+    С after/before/limit — курсорная пагинация {items, limit, next, prev}.
+    """
     genre = request.args.get("genre")
     search = request.args.get("search", "").strip()
     
@@ -28,28 +86,179 @@ def get_tracks():
         q = q.filter(Track.genre == genre)
     
     if search:
-        q = q.filter(
-            db.or_(
-                Track.title.ilike(f"%{search}%"),
-                Track.artist.ilike(f"%{search}%"),
-                Track.album.ilike(f"%{search}%")
-            )
-        )
+        q = current_app.search_service.filter(q, Track, search)
+    q = project(q, TRACK_COLUMNS)
+    
+    if not any(arg in request.args for arg in ("after", "before", "limit")):
+        page = int(request.args.get("page", 1))
+        per = int(request.args.get("per", 100))
+        items = q.order_by(Track.id).paginate(page=page, per_page=per, error_out=False)
+        return jsonify({
+            "items": as_dicts(items.items),
+            "page": page,
+            "per": per,
+            "total": items.total
+        })
+    
+    limit = _limit_arg(default=int(request.args.get("per", 100)))
+    items, next_cursor, prev_cursor = keyset_page(
+        q, [Track.id], limit,
+        after=request.args.get("after"),
+        before=request.args.get("before")
+    )
     
-    q = q.order_by(Track.id)
-    items = q.paginate(page=page, per_page=per, error_out=False)
+    data = {
+        "items": as_dicts(items),
+        "limit": limit,
+        "next": next_cursor,
+        "prev": prev_cursor
+    }
+    if request.args.get("total") == "1":
+        data["total"] = cached_count(("tracks", genre, search), q)
+    return jsonify(data)
+
+@api_bp.route("/search", methods=["GET"])
+def search():
+    """Полнотекстовый поиск: релевантность + пагинация"""
+    query = request.args.get("q", "").strip()
+    page = max(int(request.args.get("page", 1)), 1)
+    per = min(max(int(request.args.get("per", 20)), 1), 100)
+    types = request.args.get("type", "tracks,playlists,genres").split(",")
+    
+    results = current_app.search_service.search(
+        query,
+        user_id=session.get("user_id"),
+        types=types,
+        limit=per,
+        offset=(page - 1) * per
+    )
     
-    return jsonify({
-        "items": [t.to_dict() for t in items.items],
-        "page": page,
-        "per": per,
-        "total": items.total
-    })
+    data = {"query": query, "page": page, "per": per, "has_more": {}}
+    for kind, (items, has_more) in results.items():
+        data[kind] = [i.to_dict() for i in items]
+        data["has_more"][kind] = has_more
+    return jsonify(data)
 
 @api_bp.route("/tracks/<int:track_id>", methods=["GET"])
 def get_track(track_id):
     t = Track.query.get_or_404(track_id)
-    return jsonify(t.to_dict())
+    return jsonify(t.to_dict(include_lyrics=True))
+
+@api_bp.route("/tracks/<int:track_id>/lyrics", methods=["GET"])
+@cached_response(tags=("tracks",))
+def get_track_lyrics(track_id):
+    """Текст песни — отдельно от списков треков, где lyrics не отдаётся"""
+    row = db.session.query(Track.lyrics).filter(Track.id == track_id).first()
+    if row is None:
+        return jsonify({"error": "not_found"}), 404
+    return jsonify({"id": track_id, "lyrics": row.lyrics or ""})
+
+@api_bp.route("/tracks/<int:track_id>/stream", methods=["GET"])
+def stream_track(track_id):
+    """
+    Стриминг аудио с поддержкой Range/If-Range и ETag.
+    ?t=<секунды> — для MP3 ответ начинается с кадра, содержащего этот момент
+    (точное время начала — в заголовке X-Seek-Time).
+    """
+    t = Track.query.get_or_404(track_id)
+    path = current_app.media_service.media_path(t)
+    if not path.is_file():
+        return jsonify({"error": "media_not_found"}), 404
+    seconds = request.args.get("t", type=float)
+    if seconds and seconds > 0:
+        found = current_app.media_service.locate(t, seconds)
+        if found is not None:
+            offset, at, _ = found
+            resp = send_media(path, start=offset)
+            resp.headers["X-Seek-Time"] = str(at)
+            return resp
+    return send_media(path)
+
+@api_bp.route("/tracks/<int:track_id>/seek", methods=["GET"])
+def seek_track(track_id):
+    """Байтовое смещение кадра для момента ?t= и адрес потока, начинающегося с него"""
+    t = Track.query.get_or_404(track_id)
+    seconds = request.args.get("t", 0.0, type=float)
+    if not current_app.media_service.media_path(t).is_file():
+        return jsonify({"error": "media_not_found"}), 404
+    found = current_app.media_service.locate(t, max(seconds, 0.0))
+    if found is None:
+        return jsonify({"error": "seek_unavailable"}), 404
+    offset, at, index = found
+    return jsonify({
+        "t": at,
+        "offset": offset,
+        "exact": index is not None,  # False — оценка по битрейту, индекс ещё строится
+        "duration": round(index.duration, 3) if index is not None else t.duration,
+        "url": url_for("api.stream_track", track_id=track_id, t=at) if at else
+               url_for("api.stream_track", track_id=track_id),
+    })
+
+@api_bp.route("/tracks/<int:track_id>/hls.m3u8", methods=["GET"])
+def get_track_hls(track_id):
+    """
+    HLS-манифест для MP3 (сегменты по границам кадров, без перекодирования).
+    Пока индекс перемотки строится в фоне — 202 со ссылкой на обычный поток.
+    """
+    t = Track.query.get_or_404(track_id)
+    media = current_app.media_service
+    path = media.media_path(t)
+    hls = current_app.hls
+    if not path.is_file() or not hls.supports(path):
+        return jsonify({"error": "hls_unavailable"}), 404
+    index = media.seek_index(t)
+    if index is None:
+        if media.seek_index_pending(t):
+            stream_url = url_for("api.stream_track", track_id=track_id)
+            return jsonify({"status": "building", "stream_url": stream_url}), 202, {"Retry-After": "5"}
+        return jsonify({"error": "hls_unavailable"}), 404
+    manifest = hls.manifest(path, index)
+    if manifest is None:
+        return jsonify({"error": "hls_unavailable"}), 404
+    resp = Response(manifest, mimetype="application/vnd.apple.mpegurl")
+    resp.set_etag(hls.version(path))
+    resp.cache_control.public = True
+    resp.cache_control.max_age = 60
+    return resp.make_conditional(request)
+
+@api_bp.route("/tracks/<int:track_id>/hls/<version>/<int:n>.mp3", methods=["GET"])
+def get_track_hls_segment(track_id, version, n):
+    """Сегмент HLS: адрес включает версию файла, поэтому кэшируется как immutable"""
+    t = Track.query.get_or_404(track_id)
+    path = current_app.media_service.media_path(t)
+    if not path.is_file():
+        return jsonify({"error": "media_not_found"}), 404
+    seg = current_app.hls.segment(path, version, n)
+    if seg is None:
+        index = current_app.media_service.seek_index(t)
+        seg = current_app.hls.segment(path, version, n, index) if index is not None else None
+    if seg is None:
+        return jsonify({"error": "segment_not_found"}), 404
+    resp = send_file(seg, mimetype="audio/mpeg", conditional=True, etag=f"{version}-{n}",
+                     max_age=IMMUTABLE_MAX_AGE)
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    return resp
+
+@api_bp.route("/tracks/<int:track_id>/waveform", methods=["GET"])
+def get_track_waveform(track_id):
+    """Пики волны и громкость (ReplayGain), посчитанные при импорте"""
+    analysis = db.session.get(TrackAnalysis, track_id)
+    if analysis is None or not analysis.peaks:
+        return jsonify({"error": "not_analyzed"}), 404
+    resp = jsonify(analysis.to_dict())
+    resp.set_etag(f"{track_id}-{analysis.analyzed_at.timestamp():.0f}")
+    resp.cache_control.public = True
+    resp.cache_control.max_age = current_app.config.get("MEDIA_CACHE_MAX_AGE", 86400)
+    return resp.make_conditional(request)
+
+@api_bp.route("/artwork/<key>-<int:size>.jpg", methods=["GET"])
+def get_artwork(key, size):
+    """Обложка трека (content-addressed, immutable)"""
+    resp = send_artwork(key, size)
+    if resp is None:
+        return jsonify({"error": "not_found"}), 404
+    return resp
 
 @api_bp.route("/queue/add/<int:track_id>", methods=["POST"])
 @require_login
@@ -66,17 +275,15 @@ def add_to_queue(track_id):
 
 @api_bp.route("/tracks/<int:track_id>/play", methods=["POST"])
 def play_track(track_id):
-    """Записать воспроизведение трека"""
-    track = Track.query.get_or_404(track_id)
-    track.plays += 1
-    
-    user_id = session.get("user_id")
-    if user_id:
-        history = ListeningHistory(user_id=user_id, track_id=track_id)
-        db.session.add(history)
-    
-    db.session.commit()
-    return jsonify({"success": True, "plays": track.plays})
+    """
+    Записать воспроизведение трека (в БД попадёт пачкой, см. PlayEventBuffer).
+    plays — сохранённый счётчик плюс это воспроизведение (без ещё не слитых чужих)
+    """
+    plays = db.session.query(Track.plays).filter(Track.id == track_id).first()
+    if plays is None:
+        return jsonify({"error": "not_found"}), 404
+    current_app.play_events.record(track_id, session.get("user_id"))
+    return jsonify({"success": True, "queued": True, "plays": (plays[0] or 0) + 1})
 
 @api_bp.route("/tracks/<int:track_id>/like", methods=["POST"])
 def like_track(track_id):
@@ -100,37 +307,39 @@ def like_track(track_id):
         return jsonify({"liked": True})
 
 @api_bp.route("/tracks/trending", methods=["GET"])
+@cached_response(tags=("tracks", "trending", "plays"))
 def get_trending():
-    """Популярные треки"""
-    limit = int(request.args.get("limit", 20))
-    tracks = Track.query.order_by(desc(Track.plays)).limit(limit).all()
-    return jsonify([t.to_dict() for t in tracks])
+    """
+    Треки в тренде из материализованного чарта: ?window=24h|7d|30d (по умолчанию 7d)
+    и ?genre=. window=all — по общему счётчику plays, как раньше; он же — пока чарт пуст.
+    """
+    limit = _limit_arg(default=20)
+    window = request.args.get("window", DEFAULT_WINDOW)
+    genre = request.args.get("genre", "")
+    if window != "all" and window not in WINDOWS:
+        return jsonify({"error": "invalid_window", "windows": [*WINDOWS, "all"]}), 400
+    ids = current_app.trending.chart(window, genre, limit) if window != "all" else []
+    if not ids:
+        q = db.session.query(*TRACK_COLUMNS)
+        if genre:
+            q = q.filter(Track.genre == genre)
+        return jsonify(as_dicts(q.order_by(desc(Track.plays)).limit(limit)))
+    return jsonify(_tracks_in_order(ids))
 
 @api_bp.route("/tracks/recent", methods=["GET"])
+@cached_response(tags=("tracks",))
 def get_recent():
     """Недавно добавленные"""
     limit = int(request.args.get("limit", 20))
-    tracks = Track.query.order_by(desc(Track.created_at)).limit(limit).all()
-    return jsonify([t.to_dict() for t in tracks])
+    tracks = db.session.query(*TRACK_COLUMNS).order_by(desc(Track.created_at)).limit(limit)
+    return jsonify(as_dicts(tracks))
 
 # Playlists - ТОЛЬКО ОДНА ФУНКЦИЯ get_playlists
 @api_bp.route("/playlists", methods=["GET"])
+@cached_response(tags=("playlists",), anonymous_only=True)
 def get_playlists():  # ОСТАВЛЯЕМ ТОЛЬКО ЭТУ ФУНКЦИЮ
-    user_id = session.get("user_id")
-    
-    if user_id:
-        # Показываем публичные плейлисты + плейлисты пользователя
-        pls = Playlist.query.filter(
-            db.or_(
-                Playlist.is_public == True,
-                Playlist.user_id == user_id
-            )
-        ).order_by(Playlist.id).all()
-    else:
-        # Только публичные плейлисты
-        pls = Playlist.query.filter_by(is_public=True).order_by(Playlist.id).all()
-    
-    return jsonify([p.to_dict() for p in pls])
+    pls = project(Playlist.visible_to(session.get("user_id")), PLAYLIST_COLUMNS).order_by(Playlist.id)
+    return jsonify(as_dicts(pls))
 
 @api_bp.route("/playlists/<int:playlist_id>", methods=["GET"])
 def get_playlist(playlist_id):  # singular - get_playlist
@@ -140,7 +349,33 @@ def get_playlist(playlist_id):  # singular - get_playlist
     if not pl.is_public and pl.user_id != user_id:
         return jsonify({"error": "access_denied"}), 403
     
-    return jsonify(pl.to_dict(include_tracks=True))
+    # все треки потоком; постранично — GET /playlists/<id>/tracks
+    rows = _playlist_tracks_query(pl)\
+        .order_by(playlist_tracks.c.position, Track.id)\
+        .yield_per(STREAM_BATCH)
+    return _stream_json(pl.to_dict(), "tracks", rows, as_dict)
+
+@api_bp.route("/playlists/<int:playlist_id>/tracks", methods=["GET"])
+def get_playlist_tracks(playlist_id):
+    """Треки плейлиста по порядку: курсорная пагинация (after/before)"""
+    pl = Playlist.query.get_or_404(playlist_id)
+    
+    user_id = session.get("user_id")
+    if not pl.is_public and pl.user_id != user_id:
+        return jsonify({"error": "access_denied"}), 403
+    
+    limit = _limit_arg(default=100)
+    rows, next_cursor, prev_cursor = keyset_page(
+        _playlist_tracks_query(pl), [playlist_tracks.c.position, Track.id], limit,
+        after=request.args.get("after"),
+        before=request.args.get("before")
+    )
+    return jsonify({
+        "items": as_dicts(rows),
+        "limit": limit,
+        "next": next_cursor,
+        "prev": prev_cursor
+    })
 
 @api_bp.route("/playlists", methods=["POST"])
 def create_playlist():  # Другое имя
@@ -205,63 +440,115 @@ def delete_playlist(playlist_id):
     
     return jsonify({"success": True})
 
-@api_bp.route("/playlists/<int:playlist_id>/tracks", methods=["POST"])
-def add_track_to_playlist(playlist_id):
+def _editable_playlist(playlist_id):
+    """(playlist, None) или (None, ответ с ошибкой) — править может владелец или админ"""
     user_id = session.get("user_id")
     if not user_id:
-        return jsonify({"error": "auth_required"}), 401
-    
+        return None, (jsonify({"error": "auth_required"}), 401)
     pl = Playlist.query.get_or_404(playlist_id)
-    
     if pl.user_id != user_id and not session.get("is_admin"):
-        return jsonify({"error": "access_denied"}), 403
-    
-    data = request.get_json()
-    track_id = data.get("track_id")
-    
-    if not track_id:
-        return jsonify({"error": "track_id required"}), 400
-    
-    track = Track.query.get_or_404(track_id)
-    
-    if track not in pl.tracks:
-        pl.tracks.append(track)
-        db.session.commit()
-    
-    return jsonify(pl.to_dict(include_tracks=True))
+        return None, (jsonify({"error": "access_denied"}), 403)
+    return pl, None
+
+def _anchor(data, key):
+    """?before= / ?after= из тела запроса: id трека или None"""
+    value = data.get(key)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise PlaylistError(f"invalid_{key}")
+
+@api_bp.errorhandler(PlaylistError)
+def playlist_error(e):
+    return jsonify({"error": e.args[0]}), 400
+
+@api_bp.route("/playlists/<int:playlist_id>/tracks", methods=["POST"])
+def add_track_to_playlist(playlist_id):
+    """
+    Добавить трек ({"track_id"}) или несколько ({"track_ids": [...]}) —
+    в конец либо перед/после трека ({"before"} / {"after"}).
+    Ответ — только изменения (added/skipped/missing), без списка треков.
+    """
+    pl, error = _editable_playlist(playlist_id)
+    if error:
+        return error
+    
+    data = request.get_json() or {}
+    track_ids = data.get("track_ids")
+    if track_ids is None:
+        if not data.get("track_id"):
+            return jsonify({"error": "track_id required"}), 400
+        track_ids = [data["track_id"]]
+    
+    delta = add_tracks(pl.id, track_ids, before=_anchor(data, "before"), after=_anchor(data, "after"))
+    db.session.commit()
+    return jsonify(delta)
+
+@api_bp.route("/playlists/<int:playlist_id>/tracks", methods=["DELETE"])
+def remove_tracks_from_playlist(playlist_id):
+    """Убрать несколько треков: {"track_ids": [...]}"""
+    pl, error = _editable_playlist(playlist_id)
+    if error:
+        return error
+    
+    data = request.get_json() or {}
+    delta = remove_tracks(pl.id, data.get("track_ids") or [])
+    db.session.commit()
+    return jsonify(delta)
 
 @api_bp.route("/playlists/<int:playlist_id>/tracks/<int:track_id>", methods=["DELETE"])
 def remove_track_from_playlist(playlist_id, track_id):
-    user_id = session.get("user_id")
-    if not user_id:
-        return jsonify({"error": "auth_required"}), 401
+    pl, error = _editable_playlist(playlist_id)
+    if error:
+        return error
     
-    pl = Playlist.query.get_or_404(playlist_id)
-    
-    if pl.user_id != user_id and not session.get("is_admin"):
-        return jsonify({"error": "access_denied"}), 403
-    
-    track = Track.query.get_or_404(track_id)
-    
-    if track in pl.tracks:
-        pl.tracks.remove(track)
-        db.session.commit()
-    
-    return jsonify(pl.to_dict(include_tracks=True))
+    delta = remove_tracks(pl.id, [track_id])
+    db.session.commit()
+    return jsonify(delta)
+
+@api_bp.route("/playlists/<int:playlist_id>/tracks/move", methods=["POST"])
+def move_playlist_tracks(playlist_id):
+    """
+    Переставить треки {"track_ids": [...]} подряд в конец либо перед/после
+    трека {"before"} / {"after"}; меняются только их позиции
+    """
+    pl, error = _editable_playlist(playlist_id)
+    if error:
+        return error
+    
+    data = request.get_json() or {}
+    delta = move_tracks(pl.id, data.get("track_ids") or [],
+                        before=_anchor(data, "before"), after=_anchor(data, "after"))
+    db.session.commit()
+    return jsonify(delta)
 
 # Genres
 @api_bp.route("/genres", methods=["GET"])
+@cached_response(tags=("genres",))
 def get_genres():
-    genres = Genre.query.all()
-    return jsonify([g.to_dict() for g in genres])
+    return jsonify(as_dicts(db.session.query(*GENRE_COLUMNS)))
 
 @api_bp.route("/genres/<int:genre_id>/tracks", methods=["GET"])
+@cached_response(tags=("genres", "tracks", "plays"))
 def get_genre_tracks(genre_id):
+    """Треки жанра по популярности: курсорная пагинация (after/before)"""
     genre = Genre.query.get_or_404(genre_id)
-    tracks = Track.query.filter_by(genre=genre.name).limit(50).all()
+    limit = _limit_arg(default=50)
+    tracks, next_cursor, prev_cursor = keyset_page(
+        db.session.query(*TRACK_COLUMNS).filter(Track.genre == genre.name),
+        [Track.plays, Track.id], limit,
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        descending=True
+    )
     return jsonify({
         "genre": genre.to_dict(),
-        "tracks": [t.to_dict() for t in tracks]
+        "tracks": as_dicts(tracks),
+        "limit": limit,
+        "next": next_cursor,
+        "prev": prev_cursor
     })
 
 # User
@@ -271,13 +558,19 @@ def get_user_history():
     if not user_id:
         return jsonify({"error": "auth_required"}), 401
     
-    limit = int(request.args.get("limit", 50))
-    
-    history = ListeningHistory.query.filter_by(user_id=user_id)\
-        .order_by(desc(ListeningHistory.played_at))\
-        .limit(limit).all()
+    history, next_cursor, prev_cursor = keyset_page(
+        db.session.query(*HISTORY_COLUMNS)
+            .join(Track, Track.id == ListeningHistory.track_id)
+            .filter(ListeningHistory.user_id == user_id),
+        [ListeningHistory.played_at, ListeningHistory.id],
+        _limit_arg(default=50),
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        descending=True
+    )
     
-    return jsonify([h.to_dict() for h in history])
+    resp = jsonify(history_dicts(history))
+    return _with_cursor_headers(resp, next_cursor, prev_cursor)
 
 @api_bp.route("/user/liked", methods=["GET"])
 def get_user_liked():
@@ -285,54 +578,46 @@ def get_user_liked():
     if not user_id:
         return jsonify({"error": "auth_required"}), 401
     
-    liked = LikedTrack.query.filter_by(user_id=user_id).all()
-    track_ids = [l.track_id for l in liked]
-    tracks = Track.query.filter(Track.id.in_(track_ids)).all()
-    
-    return jsonify([t.to_dict() for t in tracks])
+    q = db.session.query(*TRACK_COLUMNS, LikedTrack.liked_at, LikedTrack.id.label("like_id"))\
+        .join(LikedTrack, LikedTrack.track_id == Track.id)\
+        .filter(LikedTrack.user_id == user_id)
+    
+    # без limit/after/before — весь список, как раньше
+    if not {"limit", "after", "before"} & set(request.args):
+        rows = q.order_by(desc(LikedTrack.liked_at), desc(LikedTrack.id)).all()
+        return jsonify(track_dicts(rows))
+    
+    rows, next_cursor, prev_cursor = keyset_page(
+        q, [LikedTrack.liked_at, LikedTrack.id],
+        _limit_arg(default=100),
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        descending=True,
+        key=lambda row: (row.liked_at, row.like_id)
+    )
+    resp = jsonify(track_dicts(rows))
+    return _with_cursor_headers(resp, next_cursor, prev_cursor)
 
 @api_bp.route("/user/recommendations", methods=["GET"])
 def get_recommendations():
-    """Простые рекомендации на основе истории"""
+    """Рекомендации по похожим трекам (item-item); без истории — популярное"""
     user_id = session.get("user_id")
-    if not user_id:
-        tracks = Track.query.order_by(desc(Track.plays)).limit(20).all()
-        return jsonify([t.to_dict() for t in tracks])
-    
-    history = ListeningHistory.query.filter_by(user_id=user_id)\
-        .order_by(desc(ListeningHistory.played_at))\
-        .limit(20).all()
-    
-    if not history:
-        tracks = Track.query.order_by(desc(Track.plays)).limit(20).all()
-        return jsonify([t.to_dict() for t in tracks])
-    
-    listened_track_ids = [h.track_id for h in history]
-    listened_tracks = Track.query.filter(Track.id.in_(listened_track_ids)).all()
-    genres = list(set([t.genre for t in listened_tracks if t.genre]))
-    
-    if genres:
-        recommendations = Track.query.filter(
-            Track.genre.in_(genres),
-            ~Track.id.in_(listened_track_ids)
-        ).order_by(desc(Track.plays)).limit(20).all()
-    else:
-        recommendations = Track.query.order_by(desc(Track.plays)).limit(20).all()
-    
-    return jsonify([t.to_dict() for t in recommendations])
+    ids = current_app.recommender.recommend(user_id) if user_id else []
+    if not ids:
+        tracks = db.session.query(*TRACK_COLUMNS).order_by(desc(Track.plays)).limit(20)
+        return jsonify(as_dicts(tracks))
+    return jsonify(_tracks_in_order(ids))
 
 # Добавить этот endpoint для проверки статуса
 @api_bp.route("/user/status", methods=["GET"])
 def user_status():
     """Проверить статус входа пользователя"""
-    user_id = session.get("user_id")
-    if user_id:
-        user = User.query.get(user_id)
-        if user:
-            return jsonify({
-                "logged_in": True,
-                "user": user.to_dict()
-            })
+    user = get_current_user()
+    if user:
+        return jsonify({
+            "logged_in": True,
+            "user": user.to_dict()
+        })
     
     return jsonify({"logged_in": False})
 
@@ -342,14 +627,28 @@ def user_status():
 def upload():
     if "file" not in request.files:
         return jsonify({"error": "no_file"}), 400
-    f = request.files["file"]
-    svc = current_app.media_service
-    track = svc.add_track_from_upload(f)
-    return jsonify(track), 201
+    files = current_app.media_service.spool_uploads(request.files.getlist("file"))
+    if not files:
+        return jsonify({"error": "no_file"}), 400
+    return _job_accepted(current_app.jobs.enqueue("import_files", files=files))
+
+@api_bp.route("/jobs/<job_id>")
+@require_admin
+def get_job(job_id):
+    job = current_app.jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "not_found"}), 404
+    return jsonify(job)
 
 @api_bp.route("/rescan", methods=["POST"])
 @require_api_key
 def rescan():
-    svc = current_app.media_service
-    summary = svc.scan_and_sync_db()
-    return jsonify(summary)
\ No newline at end of file
+    """?prune=1 — после скана удалить треки, файлов которых нет (необратимо)"""
+    if request.args.get("prune") == "1":
+        return _job_accepted(current_app.jobs.enqueue("rescan", dedupe=True, prune=True))
+    return _job_accepted(current_app.jobs.enqueue("rescan", dedupe=True))
+
+def _job_accepted(job_id):
+    """202 со ссылкой на статус фоновой задачи"""
+    status_url = url_for("api.get_job", job_id=job_id)
+    return jsonify({"job_id": job_id, "status_url": status_url}), 202, {"Location": status_url}
\ No newline at end of file
@@ -1,10 +1,61 @@
 from functools import wraps
-from flask import Blueprint, request, current_app, jsonify, session, render_template, redirect, url_for, flash
+from flask import Blueprint, request, current_app, jsonify, session, render_template, redirect, url_for, flash, g
 from .models import User
+from .serializers import USER_COLUMNS
 from . import db
 
 auth_bp = Blueprint("auth", __name__)
 
+class CurrentUser:
+    """Снимок пользователя для кэша: не привязан к сессии SQLAlchemy"""
+    __slots__ = tuple(c.key for c in USER_COLUMNS)
+
+    def __init__(self, user):
+        for name in self.__slots__:
+            setattr(self, name, getattr(user, name))
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def to_dict(self):
+        return User.to_dict(self)
+
+def _user_cache_key(user_id):
+    return f"user:{user_id}"
+
+def _load_user(user_id):
+    """Пользователь по id через TTL-кэш приложения"""
+    cache = getattr(current_app, "cache", None)
+    key = _user_cache_key(user_id)
+    user = cache.get(key) if cache is not None else None
+    if user is None:
+        # проекция: строка без ORM-объекта и связей — снимку нужны только колонки
+        row = db.session.query(*USER_COLUMNS).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        user = CurrentUser(row)
+        if cache is not None:
+            cache.set(key, user, current_app.config.get("USER_CACHE_TTL", 60))
+    return user
+
+def invalidate_user(user_id):
+    """Сбросить кэш пользователя (после правки профиля)"""
+    cache = getattr(current_app, "cache", None)
+    if cache is not None:
+        cache.delete(_user_cache_key(user_id))
+    g.pop("current_user", None)
+
+def get_current_user():
+    """Текущий пользователь: не больше одного обращения к кэшу/БД за запрос"""
+    if "current_user" not in g:
+        user_id = session.get("user_id")
+        g.current_user = _load_user(user_id) if user_id else None
+    return g.current_user
+
 def require_api_key(func):
     """Декоратор для проверки API ключа (для старых эндпоинтов)"""
     @wraps(func)
@@ -25,11 +76,9 @@ def require_admin(func):
             return func(*args, **kwargs)
         
         # Проверка сессии пользователя
-        user_id = session.get("user_id")
-        if user_id:
-            user = User.query.get(user_id)
-            if user and user.is_admin:
-                return func(*args, **kwargs)
+        user = get_current_user()
+        if user and user.is_admin:
+            return func(*args, **kwargs)
         
         # Если ajax/JSON — вернуть 401, иначе редирект на логин
         if request.is_json or request.headers.get("Accept", "").startswith("application/json"):
@@ -75,7 +124,7 @@ def require_auth(roles=None):
                 flash("Please log in to continue", "error")
                 return redirect(url_for("auth.login", next=request.path))
             
-            user = User.query.get(user_id)
+            user = get_current_user()
             if not user:
                 session.clear()
                 return redirect(url_for("auth.login"))
@@ -178,12 +227,8 @@ def register():
 @auth_bp.route("/logout")
 def logout():
     """Выход из системы"""
-    username = None
-    user_id = session.get("user_id")
-    if user_id:
-        user = User.query.get(user_id)
-        if user:
-            username = user.username
+    user = get_current_user()
+    username = user.username if user else None
     
     session.clear()
     
@@ -198,27 +243,27 @@ def logout():
 @require_login
 def profile():
     """Профиль пользователя"""
-    user_id = session.get("user_id")
-    user = User.query.get_or_404(user_id)
+    user = get_current_user()
+    if not user:
+        session.clear()
+        return redirect(url_for("auth.login"))
     
-    # Статистика
-    from .models import ListeningHistory, LikedTrack, Playlist
+    # Статистика — готовые счётчики (user_stats), без COUNT по истории
+    from .models import ListeningHistory
     
-    total_plays = ListeningHistory.query.filter_by(user_id=user.id).count()
-    total_likes = LikedTrack.query.filter_by(user_id=user.id).count()
-    total_playlists = Playlist.query.filter_by(user_id=user.id).count()
+    stats = current_app.history.stats(user.id)
     
     # Недавние прослушивания
-    recent = ListeningHistory.query.filter_by(user_id=user.id)\
+    recent = ListeningHistory.for_user(user.id)\
         .order_by(ListeningHistory.played_at.desc())\
         .limit(10).all()
     
     return render_template(
         "profile.html",
         user=user,
-        total_plays=total_plays,
-        total_likes=total_likes,
-        total_playlists=total_playlists,
+        total_plays=stats["plays"],
+        total_likes=stats["likes"],
+        total_playlists=stats["playlists"],
         recent=recent
     )
 
@@ -254,6 +299,7 @@ def profile_edit():
             user.avatar = new_avatar
         
         db.session.commit()
+        invalidate_user(user.id)
         flash("Profile updated successfully", "success")
         return redirect(url_for("auth.profile"))
     
@@ -267,11 +313,10 @@ def ping():
 @auth_bp.route("/whoami")
 def whoami():
     """Информация о текущем пользователе"""
-    user_id = session.get("user_id")
-    if not user_id:
+    if not session.get("user_id"):
         return jsonify({"authenticated": False})
     
-    user = User.query.get(user_id)
+    user = get_current_user()
     if not user:
         session.clear()
         return jsonify({"authenticated": False})
@@ -285,10 +330,6 @@ def whoami():
 @auth_bp.app_context_processor
 def inject_user():
     """Добавить текущего пользователя в контекст всех шаблонов"""
-    user_id = session.get("user_id")
-    if user_id:
-        user = User.query.get(user_id)
-        return {"current_user": user}
-    return {"current_user": None}
+    return {"current_user": get_current_user()}
 
 # Добавить в auth.py после существующих декораторов
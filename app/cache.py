@@ -0,0 +1,237 @@
+"""
+Кэш ответов для каталога.
+Backend-ы: in-process LRU с TTL (по умолчанию) или общий SQLite-файл для
+нескольких воркеров gunicorn. Инвалидация — через «поколения» тегов:
+ключ записи включает текущие поколения её тегов, а коммит, затронувший
+таблицу, увеличивает поколение соответствующего тега.
+"""
+import hashlib
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from itertools import chain
+from flask import current_app, request, session, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# таблица -> тег инвалидации. Слив счётчика plays (play_events) помечает
+# не "tracks", а отдельный тег "plays": на него подписаны только ответы,
+# упорядоченные по plays, остальной каталог не сбрасывается каждые несколько секунд
+TABLE_TAGS = {
+    "tracks": "tracks",
+    "playlists": "playlists",
+    "playlist_tracks": "playlists",
+    "genres": "genres",
+    "trending_charts": "trending",
+}
+
+
+class MemoryCache:
+    """LRU с TTL в памяти процесса"""
+
+    def __init__(self, max_entries=2048, default_ttl=60):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()
+        self._gens = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (ttl or self.default_ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def generation(self, tag):
+        return self._gens.get(tag, 0)
+
+    def bump(self, tag):
+        with self._lock:
+            self._gens[tag] = self._gens.get(tag, 0) + 1
+
+
+class SQLiteCache:
+    """Общий для всех воркеров кэш в SQLite-файле (WAL)"""
+
+    def __init__(self, path, default_ttl=60):
+        self.path = str(path)
+        self.default_ttl = default_ttl
+        self._local = threading.local()
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires REAL);
+            CREATE TABLE IF NOT EXISTS cache_gen (tag TEXT PRIMARY KEY, gen INTEGER NOT NULL);
+        """)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl=None):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+            (key, pickle.dumps(value), time.time() + (ttl or self.default_ttl))
+        )
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self._conn().execute("DELETE FROM cache")
+
+    def generation(self, tag):
+        row = self._conn().execute("SELECT gen FROM cache_gen WHERE tag = ?", (tag,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, tag):
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO cache_gen (tag, gen) VALUES (?, 1) "
+            "ON CONFLICT(tag) DO UPDATE SET gen = gen + 1", (tag,)
+        )
+        # заодно чистим протухшие записи
+        conn.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+
+
+def create_cache(app):
+    backend = app.config.get("CACHE_BACKEND", "memory")
+    ttl = app.config.get("CACHE_DEFAULT_TTL", 60)
+    if backend == "sqlite":
+        return SQLiteCache(app.config["CACHE_SQLITE_PATH"], default_ttl=ttl)
+    if backend == "memory":
+        return MemoryCache(app.config.get("CACHE_MAX_ENTRIES", 2048), default_ttl=ttl)
+    return None
+
+
+def tagged_key(cache, key, tags):
+    """Ключ с поколениями тегов: после инвалидации тега старые записи не находятся"""
+    gens = ",".join(f"{t}{cache.generation(t)}" for t in tags)
+    return f"{key}|{gens}"
+
+
+def invalidate(*tags):
+    """Явно сбросить кэш по тегам (для изменений в обход сессии)"""
+    cache = getattr(current_app, "cache", None)
+    if cache is not None:
+        for tag in tags:
+            cache.bump(tag)
+
+
+def cached_response(tags, ttl=None, anonymous_only=False):
+    """
+    Кэшировать GET-ответ view по endpoint + аргументам запроса.
+    Отдаёт ETag и 304 на If-None-Match. anonymous_only — только для
+    неавторизованных (ответ зависит от пользователя).
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = getattr(current_app, "cache", None)
+            if (
+                cache is None
+                or request.method != "GET"
+                or (anonymous_only and session.get("user_id"))
+                or session.get("_flashes")
+            ):
+                return func(*args, **kwargs)
+
+            base = "|".join((
+                request.endpoint,
+                repr(sorted(kwargs.items())),
+                repr(sorted(request.args.items(multi=True))),
+                request.headers.get("X-Requested-With", ""),
+            ))
+            key = tagged_key(cache, base, tags)
+            hit = cache.get(key)
+            if hit is None:
+                resp = current_app.make_response(func(*args, **kwargs))
+                if resp.status_code != 200 or resp.is_streamed:
+                    return resp
+                body = resp.get_data()
+                hit = (body, resp.mimetype, hashlib.sha1(body).hexdigest())
+                cache.set(key, hit, ttl)
+
+            body, mimetype, etag = hit
+            resp = Response(body, mimetype=mimetype)
+            resp.set_etag(etag)
+            resp.cache_control.no_cache = True
+            return resp.make_conditional(request)
+        return wrapper
+    return decorator
+
+
+def _mark(session, *tags):
+    session.info.setdefault("cache_tags", set()).update(tags)
+
+
+def init_cache_invalidation(app):
+    """Сбрасывать теги кэша после коммитов, затронувших каталог"""
+    if getattr(init_cache_invalidation, "_installed", False):
+        return
+    init_cache_invalidation._installed = True
+
+    @event.listens_for(Session, "after_flush")
+    def _after_flush(session, flush_context):
+        for obj in chain(session.new, session.dirty, session.deleted):
+            tag = TABLE_TAGS.get(getattr(obj, "__tablename__", None))
+            if tag:
+                _mark(session, tag)
+
+    @event.listens_for(Session, "do_orm_execute")
+    def _on_execute(orm_execute_state):
+        # Core/bulk DML через session.execute (например, слив счётчика plays)
+        if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+            return
+        explicit = orm_execute_state.execution_options.get("cache_tags")
+        if explicit:
+            _mark(orm_execute_state.session, *explicit)
+            return
+        table = getattr(orm_execute_state.statement, "table", None)
+        tag = TABLE_TAGS.get(getattr(table, "name", None))
+        if tag:
+            _mark(orm_execute_state.session, tag)
+
+    @event.listens_for(Session, "after_commit")
+    def _after_commit(session):
+        tags = session.info.pop("cache_tags", None)
+        if tags:
+            invalidate(*tags)
+
+    @event.listens_for(Session, "after_rollback")
+    def _after_rollback(session):
+        session.info.pop("cache_tags", None)
@@ -13,6 +13,81 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
     WATCH_MEDIA = os.getenv("WATCH_MEDIA", "0") == "1"
+    # События watcher-а сливаются: файл обрабатывается после WATCH_DEBOUNCE секунд тишины
+    WATCH_DEBOUNCE = float(os.getenv("WATCH_DEBOUNCE", "2"))
+    # flock на этом файле выбирает единственный наблюдающий процесс среди воркеров gunicorn
+    WATCH_LOCK_FILE = os.getenv("WATCH_LOCK_FILE", str(BASE_DIR / "watcher.lock"))
 
     MEDIA_DIR = BASE_DIR / "static" / "media"
+    # Стриминг: X-Sendfile (Apache/lighttpd) или X-Accel-Redirect (nginx)
+    USE_X_SENDFILE = os.getenv("USE_X_SENDFILE", "0") == "1"
+    MEDIA_ACCEL_PREFIX = os.getenv("MEDIA_ACCEL_PREFIX", "")  # например "/protected-media/"
+    MEDIA_CACHE_MAX_AGE = int(os.getenv("MEDIA_CACHE_MAX_AGE", "86400"))
+    # HLS для MP3: сегменты по точкам индекса перемотки, кэш на диске (можно удалять целиком).
+    # Раз в HLS_PURGE_INTERVAL секунд кэш урезается до HLS_CACHE_MAX_MB и
+    # HLS_CACHE_MAX_AGE_DAYS с последнего запроса манифеста (0 — без ограничения)
+    HLS_CACHE_DIR = os.getenv("HLS_CACHE_DIR", str(BASE_DIR / "hls_cache"))
+    HLS_SEGMENT_SECONDS = int(os.getenv("HLS_SEGMENT_SECONDS", "6"))
+    HLS_CACHE_MAX_MB = int(os.getenv("HLS_CACHE_MAX_MB", "1024"))
+    HLS_CACHE_MAX_AGE_DAYS = int(os.getenv("HLS_CACHE_MAX_AGE_DAYS", "30"))
+    HLS_PURGE_INTERVAL = int(os.getenv("HLS_PURGE_INTERVAL", "3600"))
+    # Шаг индекса перемотки MP3 (секунды); 0 — не строить при импорте
+    SEEK_INDEX_STEP = float(os.getenv("SEEK_INDEX_STEP", "1"))
+    # Обложки и их миниатюры (content-addressed, отдаются как immutable)
+    ARTWORK_DIR = os.getenv("ARTWORK_DIR", str(BASE_DIR / "artwork"))
+
+    # Сканер медиатеки: 0 — по числу CPU
+    SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", "0"))
+    SCAN_BATCH_SIZE = int(os.getenv("SCAN_BATCH_SIZE", "500"))
+    SCAN_POOL_MIN_FILES = 16  # меньше файлов — пробуем без пула процессов
+    # Волна и громкость при импорте (WAV — встроенный декодер, остальное — ffmpeg из PATH)
+    ANALYZE_AUDIO = os.getenv("ANALYZE_AUDIO", "1") == "1"
+    # Повторная загрузка уже известного файла (по sha256 содержимого):
+    # skip — отбросить, link — отбросить и вернуть существующий трек,
+    # replace — оставить новый файл, трек переезжает на него (только загрузки:
+    # при скане MEDIA_DIR файлы пользователя не удаляются, replace = link)
+    DUPLICATE_POLICY = os.getenv("DUPLICATE_POLICY", "link")
+
+    # Загрузки складываются сюда до фонового импорта
+    UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", str(BASE_DIR / "uploads_tmp"))
+
+    # Очередь фоновых задач (SQLite-файл). JOB_WORKERS — потоки-воркеры в процессе
+    # веб-сервера (поднимает start_background: run.py, gunicorn.conf.py);
+    # 0 — задачи выполняет только отдельный run_worker.py
+    JOBS_DB = os.getenv("JOBS_DB", str(BASE_DIR / "jobs.db"))
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+    JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+    JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "7"))
+
+    # Буфер воспроизведений (write-behind): локальный SQLite-файл + периодический слив
+    PLAY_EVENTS_DB = os.getenv("PLAY_EVENTS_DB", str(BASE_DIR / "play_events.db"))
+    PLAY_FLUSH_INTERVAL = float(os.getenv("PLAY_FLUSH_INTERVAL", "5"))
+    PLAY_FLUSH_SIZE = int(os.getenv("PLAY_FLUSH_SIZE", "500"))
+
+    # Рекомендации: пересчёт соседей раз в RECS_INTERVAL секунд (0 — только вручную)
+    RECS_INTERVAL = int(os.getenv("RECS_INTERVAL", "3600"))
+    RECS_NEIGHBORS = int(os.getenv("RECS_NEIGHBORS", "50"))  # top-K похожих на трек
+    RECS_BATCH_SIZE = int(os.getenv("RECS_BATCH_SIZE", "10000"))  # строк истории за шаг
+    # Чарты «в тренде» (24h/7d/30d): пересчёт раз в TRENDING_INTERVAL секунд
+    TRENDING_INTERVAL = int(os.getenv("TRENDING_INTERVAL", "300"))
+    TRENDING_TOP_N = int(os.getenv("TRENDING_TOP_N", "100"))
+    # История прослушиваний: сырые строки хранятся HISTORY_RETENTION_DAYS дней,
+    # старше — сжимаются в свёртку по дням пачками по HISTORY_COMPACT_BATCH строк
+    HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "90"))
+    HISTORY_COMPACT_INTERVAL = int(os.getenv("HISTORY_COMPACT_INTERVAL", "3600"))
+    HISTORY_COMPACT_BATCH = int(os.getenv("HISTORY_COMPACT_BATCH", "5000"))
+    HISTORY_COMPACT_PAUSE = float(os.getenv("HISTORY_COMPACT_PAUSE", "0.1"))  # секунд между пачками
+
+    # Кэш ответов каталога: memory | sqlite (общий для воркеров) | none
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", str(BASE_DIR / "cache.db"))
+    CACHE_DEFAULT_TTL = int(os.getenv("CACHE_DEFAULT_TTL", "60"))
+    CACHE_MAX_ENTRIES = 2048
+    USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "60"))
+
+    # Профилирование запросов и SQL (Server-Timing, медленные запросы, /admin/perf);
+    # выключено — обработчики не регистрируются вовсе
+    PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+    PROFILING_SLOW_QUERY_MS = float(os.getenv("PROFILING_SLOW_QUERY_MS", "100"))
+    PROFILING_MAX_FINGERPRINTS = 500  # разных медленных запросов в памяти
     ADMIN_API_KEY = os.getenv("ADMIN_API_KEY", "change-me-to-secure-key")
\ No newline at end of file
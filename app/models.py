@@ -6,7 +6,9 @@ playlist_tracks = db.Table('playlist_tracks',
     db.Column('playlist_id', db.Integer, db.ForeignKey('playlists.id'), primary_key=True),
     db.Column('track_id', db.Integer, db.ForeignKey('tracks.id'), primary_key=True),
     db.Column('position', db.Integer, default=0),
-    db.Column('added_at', db.DateTime, default=datetime.utcnow)
+    db.Column('added_at', db.DateTime, default=datetime.utcnow),
+    db.Index('ix_playlist_tracks_playlist_position', 'playlist_id', 'position'),
+    db.Index('ix_playlist_tracks_track_id', 'track_id')
 )
 
 class Track(db.Model):
@@ -21,16 +23,37 @@ class Track(db.Model):
     gradient = db.Column(db.String(255), default="linear-gradient(135deg,#374151,#1f2937)")
     genre = db.Column(db.String(100), default="Other")
     year = db.Column(db.Integer, nullable=True)
+    track_number = db.Column(db.Integer, nullable=True)
     plays = db.Column(db.Integer, default=0)
-    lyrics = db.Column(db.Text, default="")
+    lyrics = db.deferred(db.Column(db.Text, default=""))  # тяжёлое поле: грузится только по обращению
+    artwork = db.Column(db.String(40), nullable=True)  # ключ обложки в ARTWORK_DIR
+    content_hash = db.Column(db.String(64), nullable=True)  # sha256 файла, для поиска дубликатов
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
     playlists = db.relationship('Playlist', secondary=playlist_tracks, back_populates='tracks')
     listening_history = db.relationship('ListeningHistory', back_populates='track', cascade='all, delete-orphan')
+    analysis = db.relationship('TrackAnalysis', uselist=False, cascade='all, delete-orphan')
 
-    def to_dict(self):
-        return {
+    __table_args__ = (
+        db.Index('ix_tracks_genre', 'genre'),
+        db.Index('ix_tracks_genre_plays', 'genre', 'plays'),
+        db.Index('ix_tracks_plays', 'plays'),
+        db.Index('ix_tracks_created_at', 'created_at'),
+        db.Index('ix_tracks_content_hash', 'content_hash', unique=True),
+    )
+
+    # колонки для списков треков (без lyrics и служебных полей)
+    LIST_COLUMNS = ("id", "title", "artist", "album", "duration", "cover", "media", "gradient",
+                    "genre", "year", "track_number", "artwork", "plays", "created_at")
+
+    @classmethod
+    def list_columns(cls):
+        """Опция запроса: загрузить только LIST_COLUMNS"""
+        return db.load_only(*(getattr(cls, name) for name in cls.LIST_COLUMNS))
+
+    def to_dict(self, include_lyrics=False):
+        data = {
             "id": self.id,
             "title": self.title,
             "artist": self.artist,
@@ -41,10 +64,14 @@ class Track(db.Model):
             "gradient": self.gradient,
             "genre": self.genre,
             "year": self.year,
+            "track_number": self.track_number,
+            "artwork": self.artwork,
             "plays": self.plays,
-            "lyrics": self.lyrics,
             "created_at": self.created_at.isoformat()
         }
+        if include_lyrics:
+            data["lyrics"] = self.lyrics
+        return data
 
 class Playlist(db.Model):
     __tablename__ = "playlists"
@@ -59,9 +86,39 @@ class Playlist(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    tracks = db.relationship('Track', secondary=playlist_tracks, back_populates='playlists')
+    # порядок — playlist_tracks.position; добавлять/переставлять через services.playlists
+    tracks = db.relationship('Track', secondary=playlist_tracks, back_populates='playlists',
+                             order_by=(playlist_tracks.c.position, playlist_tracks.c.track_id))
     user = db.relationship('User', back_populates='playlists')
 
+    # Число треков считается в том же SELECT (коррелированный подзапрос по индексу),
+    # без ленивой загрузки всей коллекции tracks
+    track_count = db.column_property(
+        db.select(db.func.count(playlist_tracks.c.track_id))
+        .where(playlist_tracks.c.playlist_id == id)
+        .correlate_except(playlist_tracks)
+        .scalar_subquery()
+    )
+
+    __table_args__ = (
+        db.Index('ix_playlists_user_id', 'user_id'),
+        db.Index('ix_playlists_is_public', 'is_public'),
+    )
+
+    @classmethod
+    def visible_to(cls, user_id=None):
+        """Публичные плейлисты + собственные плейлисты пользователя"""
+        if user_id:
+            return cls.query.filter(db.or_(cls.is_public == True, cls.user_id == user_id))
+        return cls.query.filter(cls.is_public == True)
+
+    def tracks_query(self):
+        """(Track, position) плейлиста, только колонки списков; порядок задаёт вызывающий"""
+        return db.session.query(Track, playlist_tracks.c.position)\
+            .join(playlist_tracks, playlist_tracks.c.track_id == Track.id)\
+            .filter(playlist_tracks.c.playlist_id == self.id)\
+            .options(Track.list_columns())
+
     def to_dict(self, include_tracks=False):
         data = {
             "id": self.id,
@@ -70,7 +127,7 @@ class Playlist(db.Model):
             "cover": self.cover,
             "gradient": self.gradient,
             "is_public": self.is_public,
-            "trackCount": len(self.tracks),
+            "trackCount": self.track_count,
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat()
         }
@@ -113,6 +170,17 @@ class ListeningHistory(db.Model):
     user = db.relationship('User', back_populates='listening_history')
     track = db.relationship('Track', back_populates='listening_history')
 
+    __table_args__ = (
+        db.Index('ix_listening_history_user_played', 'user_id', 'played_at'),
+        db.Index('ix_listening_history_track_id', 'track_id'),
+        db.Index('ix_listening_history_played_at', 'played_at'),  # сжатие старой истории
+    )
+
+    @classmethod
+    def for_user(cls, user_id):
+        """История пользователя; трек подгружается тем же запросом (JOIN)"""
+        return cls.query.filter_by(user_id=user_id).options(db.joinedload(cls.track))
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -131,7 +199,10 @@ class LikedTrack(db.Model):
     # Relationships
     user = db.relationship('User', back_populates='liked_tracks')
     
-    __table_args__ = (db.UniqueConstraint('user_id', 'track_id', name='unique_user_track_like'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'track_id', name='unique_user_track_like'),
+        db.Index('ix_liked_tracks_user_liked', 'user_id', 'liked_at'),
+    )
 
 class Genre(db.Model):
     __tablename__ = "genres"
@@ -146,4 +217,147 @@ class Genre(db.Model):
             "name": self.name,
             "cover": self.cover,
             "gradient": self.gradient
-        }
\ No newline at end of file
+        }
+
+class MediaFile(db.Model):
+    """Индекс состояния файлов в MEDIA_DIR для инкрементального сканирования"""
+    __tablename__ = "media_files"
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(512), unique=True, nullable=False)  # имя файла внутри MEDIA_DIR
+    size = db.Column(db.BigInteger, nullable=False)
+    mtime_ns = db.Column(db.BigInteger, nullable=False)
+    inode = db.Column(db.BigInteger, nullable=True)
+    content_hash = db.Column(db.String(64), nullable=True, index=True)
+    track_id = db.Column(db.Integer, db.ForeignKey('tracks.id', ondelete='SET NULL'), nullable=True)
+    seek_index = db.Column(db.LargeBinary, nullable=True)  # mp3frames.SeekIndex для MP3
+    scanned_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    track = db.relationship('Track')
+
+    def matches(self, st):
+        """Файл не изменился с прошлого сканирования"""
+        return (
+            self.size == st.st_size
+            and self.mtime_ns == st.st_mtime_ns
+            and (self.inode is None or self.inode == st.st_ino)
+        )
+
+class TrackAnalysis(db.Model):
+    """Результаты анализа аудио при импорте: волна и громкость"""
+    __tablename__ = "track_analysis"
+    track_id = db.Column(db.Integer, db.ForeignKey('tracks.id', ondelete='CASCADE'), primary_key=True)
+    peaks = db.Column(db.LargeBinary, nullable=True)  # байт на точку, 0..255 от полной шкалы
+    loudness = db.Column(db.Float, nullable=True)  # интегральная громкость, LUFS
+    replay_gain = db.Column(db.Float, nullable=True)  # дБ до -18 LUFS
+    sample_peak = db.Column(db.Float, nullable=True)  # 0..1
+    decoder = db.Column(db.String(32), nullable=True)
+    analyzed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "track_id": self.track_id,
+            "peaks": list(self.peaks or b""),
+            "loudness": self.loudness,
+            "replay_gain": self.replay_gain,
+            "sample_peak": self.sample_peak,
+        }
+
+class Watermark(db.Model):
+    """Позиция инкрементальных фоновых пересчётов (например, последний обработанный id истории)"""
+    __tablename__ = "watermarks"
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @classmethod
+    def get(cls, name):
+        row = db.session.get(cls, name)
+        return row.value if row else 0
+
+    @classmethod
+    def set(cls, name, value):
+        row = db.session.get(cls, name)
+        if row is None:
+            db.session.add(cls(name=name, value=value))
+        else:
+            row.value = value
+
+class UserTrackAffinity(db.Model):
+    """Взаимодействия пользователя с треком (свёртка истории и лайков) для рекомендаций"""
+    __tablename__ = "user_track_affinity"
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    track_id = db.Column(db.Integer, db.ForeignKey('tracks.id', ondelete='CASCADE'), primary_key=True)
+    plays = db.Column(db.Integer, nullable=False, default=0)
+    liked = db.Column(db.Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        db.Index('ix_user_track_affinity_track_id', 'track_id'),
+    )
+
+class TrackNeighbor(db.Model):
+    """Top-K похожих треков (item-item, косинус по совместным прослушиваниям и лайкам)"""
+    __tablename__ = "track_neighbors"
+    track_id = db.Column(db.Integer, db.ForeignKey('tracks.id', ondelete='CASCADE'), primary_key=True)
+    neighbor_id = db.Column(db.Integer, db.ForeignKey('tracks.id', ondelete='CASCADE'), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+
+class TrackPlaysHourly(db.Model):
+    """Свёртка воспроизведений трека по часам (для чарта 24h/7d)"""
+    __tablename__ = "track_plays_hourly"
+    track_id = db.Column(db.Integer, db.ForeignKey('tracks.id', ondelete='CASCADE'), primary_key=True)
+    hour = db.Column(db.DateTime, primary_key=True)  # UTC, начало часа
+    plays = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_track_plays_hourly_hour', 'hour'),
+    )
+
+class TrackPlaysDaily(db.Model):
+    """Свёртка воспроизведений трека по дням (для чарта 30d)"""
+    __tablename__ = "track_plays_daily"
+    track_id = db.Column(db.Integer, db.ForeignKey('tracks.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)  # UTC
+    plays = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_track_plays_daily_day', 'day'),
+    )
+
+class TrendingChart(db.Model):
+    """Материализованный top-N чарт окна; genre='' — общий"""
+    __tablename__ = "trending_charts"
+    window = db.Column(db.String(8), primary_key=True)
+    genre = db.Column(db.String(100), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    track_id = db.Column(db.Integer, db.ForeignKey('tracks.id', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+class ListeningHistoryDaily(db.Model):
+    """Сжатая история: прослушивания пользователем трека за день (старше окна хранения сырой истории)"""
+    __tablename__ = "listening_history_daily"
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    track_id = db.Column(db.Integer, db.ForeignKey('tracks.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)  # UTC
+    plays = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_listening_history_daily_user_day', 'user_id', 'day'),
+    )
+
+class UserStats(db.Model):
+    """Счётчики профиля, поддерживаются инкрементально (plays — за всё время, с учётом сжатой истории)"""
+    __tablename__ = "user_stats"
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    plays = db.Column(db.Integer, nullable=False, default=0)
+    likes = db.Column(db.Integer, nullable=False, default=0)
+    playlists = db.Column(db.Integer, nullable=False, default=0)
+
+class PlayEventBatch(db.Model):
+    """Пачки буфера воспроизведений, уже слитые в БД (claim пишется в той же транзакции)"""
+    __tablename__ = "play_event_batches"
+    claim = db.Column(db.String(32), primary_key=True)
+    flushed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_play_event_batches_flushed_at', 'flushed_at'),
+    )
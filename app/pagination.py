@@ -0,0 +1,79 @@
+"""
+Keyset (cursor) пагинация по (sort_key, id).
+Курсор — непрозрачный base64-токен со значениями ключа последней/первой строки.
+"""
+import base64
+import json
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import tuple_
+from .cache import tagged_key
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    payload = [{"dt": v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        return tuple(datetime.fromisoformat(v["dt"]) if isinstance(v, dict) else v for v in payload)
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor(token)
+
+
+def keyset_page(query, columns, limit, after=None, before=None, descending=False, key=None):
+    """
+    Страница query, упорядоченная по columns (последняя колонка — уникальный id).
+    after/before — курсоры из предыдущего ответа.
+    key(item) — значения columns для строки; по умолчанию getattr(item, column.key).
+    Возвращает (items, next_cursor, prev_cursor).
+    """
+    key = key or (lambda item: tuple(getattr(item, c.key) for c in columns))
+    backwards = bool(before)
+    cursor = decode_cursor(before if backwards else after)
+    if cursor is not None and len(cursor) != len(columns):
+        raise InvalidCursor(before or after)
+
+    ascending = descending == backwards
+    if cursor is not None:
+        lhs = tuple_(*columns) if len(columns) > 1 else columns[0]
+        rhs = tuple_(*cursor) if len(columns) > 1 else cursor[0]
+        query = query.filter(lhs > rhs if ascending else lhs < rhs)
+    query = query.order_by(*[c.asc() if ascending else c.desc() for c in columns])
+
+    items = query.limit(limit + 1).all()
+    has_more = len(items) > limit
+    items = items[:limit]
+    if backwards:
+        items.reverse()
+
+    next_cursor = prev_cursor = None
+    if items:
+        if has_more or backwards:
+            next_cursor = encode_cursor(key(items[-1]))
+        if (backwards and has_more) or (not backwards and cursor is not None):
+            prev_cursor = encode_cursor(key(items[0]))
+    return items, next_cursor, prev_cursor
+
+
+def cached_count(cache_key, query, ttl=60, tags=("tracks",)):
+    """COUNT(*) для query из кэша приложения (сбрасывается вместе с тегами)"""
+    cache = getattr(current_app, "cache", None)
+    if cache is None:
+        return query.order_by(None).count()
+    key = tagged_key(cache, f"count|{cache_key!r}", tags)
+    total = cache.get(key)
+    if total is None:
+        total = query.order_by(None).count()
+        cache.set(key, total, ttl)
+    return total
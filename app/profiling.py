@@ -0,0 +1,217 @@
+"""
+Профилирование запросов и SQL (включается PROFILING_ENABLED=1).
+На каждый HTTP-запрос считаются число SQL-запросов и время в БД
+(события before/after_cursor_execute движка) и отдаются заголовком
+Server-Timing. Медленные запросы (дольше PROFILING_SLOW_QUERY_MS)
+пишутся в лог и группируются по отпечатку — тексту SQL без литералов.
+По endpoint-ам копятся гистограммы задержек для /admin/perf.
+
+Статистика в памяти процесса: у каждого воркера gunicorn своя.
+Выключено — ни одного обработчика не регистрируется, накладных
+расходов нет.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from . import db
+
+# верхние границы корзин гистограммы, мс (последняя — всё, что дольше)
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES = re.compile(r"(\(\?(?:, \?)*\))(?:\s*,\s*\1)+")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(statement):
+    """SQL без литералов и с одним ? вместо списков — одинаковый для запросов одной формы"""
+    sql = _SPACES.sub(" ", statement).strip()
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _VALUES.sub(r"\1, ...", sql)
+    return _IN_LIST.sub("(?, ...)", sql)
+
+
+def _percentile(buckets, count, p, max_ms):
+    """Оценка перцентиля по гистограмме — верхняя граница корзины (не больше максимума)"""
+    target = count * p / 100
+    seen = 0
+    for bound, n in zip(BUCKETS_MS, buckets):
+        seen += n
+        if seen >= target and n:
+            return round(min(bound, max_ms), 2)
+    return round(max_ms, 2)
+
+
+class _EndpointStats:
+    __slots__ = ("count", "total_ms", "max_ms", "queries", "db_ms", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = self.max_ms = self.db_ms = 0.0
+        self.queries = 0
+        self.buckets = [0] * len(BUCKETS_MS)
+
+    def add(self, ms, queries, db_ms):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.queries += queries
+        self.db_ms += db_ms
+        for i, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                break
+
+
+class PerfStats:
+    """Агрегаты по endpoint-ам и медленным запросам (потокобезопасно)"""
+
+    def __init__(self, slow_query_ms=100, max_fingerprints=500):
+        self.slow_query_ms = slow_query_ms
+        self.max_fingerprints = max_fingerprints
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.since = datetime.utcnow()
+            self.endpoints = {}
+            self.slow = OrderedDict()  # отпечаток -> статистика, давно не виденные — первыми
+
+    def record_request(self, endpoint, ms, queries, db_ms):
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = _EndpointStats()
+            stats.add(ms, queries, db_ms)
+
+    def record_slow_query(self, statement, ms, endpoint):
+        fp = fingerprint(statement)
+        with self._lock:
+            entry = self.slow.pop(fp, None)
+            if entry is None:
+                entry = {
+                    "id": hashlib.sha1(fp.encode()).hexdigest()[:12],
+                    "fingerprint": fp,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "endpoints": set(),
+                }
+                if len(self.slow) >= self.max_fingerprints:
+                    self.slow.popitem(last=False)
+            entry["count"] += 1
+            entry["total_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+            entry["endpoints"].add(endpoint or "<background>")
+            entry["last_seen"] = datetime.utcnow()
+            self.slow[fp] = entry
+        return entry["id"]
+
+    def snapshot(self):
+        """Данные для /admin/perf: endpoint-ы по суммарному времени, медленные запросы по нему же"""
+        with self._lock:
+            endpoints = [
+                {
+                    "endpoint": name,
+                    "count": s.count,
+                    "mean_ms": round(s.total_ms / s.count, 2),
+                    "p50_ms": _percentile(s.buckets, s.count, 50, s.max_ms),
+                    "p95_ms": _percentile(s.buckets, s.count, 95, s.max_ms),
+                    "p99_ms": _percentile(s.buckets, s.count, 99, s.max_ms),
+                    "max_ms": round(s.max_ms, 2),
+                    "total_ms": round(s.total_ms, 1),
+                    "queries_per_request": round(s.queries / s.count, 1),
+                    "db_ms_per_request": round(s.db_ms / s.count, 2),
+                    "histogram": list(s.buckets),
+                }
+                for name, s in self.endpoints.items()
+            ]
+            slow = [
+                {**entry, "endpoints": sorted(entry["endpoints"]),
+                 "total_ms": round(entry["total_ms"], 1), "max_ms": round(entry["max_ms"], 1),
+                 "mean_ms": round(entry["total_ms"] / entry["count"], 1)}
+                for entry in self.slow.values()
+            ]
+            since = self.since
+        endpoints.sort(key=lambda e: e["total_ms"], reverse=True)
+        slow.sort(key=lambda e: e["total_ms"], reverse=True)
+        return {
+            "pid": os.getpid(),
+            "since": since,
+            "slow_query_ms": self.slow_query_ms,
+            "buckets_ms": [b if b != float("inf") else None for b in BUCKETS_MS],
+            "endpoints": endpoints,
+            "slow_queries": slow,
+        }
+
+
+def _instrument_engine(app, engine, perf):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("perf_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        ms = (time.perf_counter() - conn.info["perf_started"].pop()) * 1000
+        endpoint = None
+        if has_request_context():
+            counters = g.get("perf_db")
+            if counters is not None:
+                counters[0] += 1
+                counters[1] += ms
+            endpoint = request.endpoint
+        if ms >= perf.slow_query_ms:
+            fp_id = perf.record_slow_query(statement, ms, endpoint)
+            app.logger.warning(f"Slow query {fp_id} {ms:.1f} ms ({endpoint or 'background'}): "
+                               f"{_SPACES.sub(' ', statement)[:500]}")
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(context):
+        # after_cursor_execute не придёт — снять отметку начала
+        started = context.connection.info.get("perf_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+def init_profiling(app):
+    """Подключить профилирование к приложению; app.perf — PerfStats или None"""
+    app.perf = None
+    if not app.config.get("PROFILING_ENABLED", False):
+        return
+    perf = app.perf = PerfStats(
+        slow_query_ms=app.config.get("PROFILING_SLOW_QUERY_MS", 100),
+        max_fingerprints=app.config.get("PROFILING_MAX_FINGERPRINTS", 500),
+    )
+    with app.app_context():
+        for engine in db.engines.values():
+            _instrument_engine(app, engine, perf)
+
+    @app.before_request
+    def _start_timer():
+        g.perf_started = time.perf_counter()
+        g.perf_db = [0, 0.0]
+
+    @app.after_request
+    def _server_timing(response):
+        started = g.get("perf_started")
+        if started is None or request.endpoint == "static":
+            return response
+        # для потоковых ответов — до начала отдачи тела
+        ms = (time.perf_counter() - started) * 1000
+        queries, db_ms = g.perf_db
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={db_ms:.2f};desc="{queries} queries", app;dur={max(ms - db_ms, 0):.2f}, total;dur={ms:.2f}'
+        )
+        perf.record_request(request.endpoint or "<unmatched>", ms, queries, db_ms)
+        return response
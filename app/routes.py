@@ -1,29 +1,29 @@
-from flask import Blueprint, render_template, current_app, request, redirect, url_for, flash, session
-from .models import Track, Playlist, User, Genre, LikedTrack, ListeningHistory
+from flask import Blueprint, render_template, current_app, request, redirect, url_for, flash, session, jsonify
+from .models import Track, Playlist, User, Genre, LikedTrack, ListeningHistory, playlist_tracks
 from . import db
-from .auth import require_admin, require_auth
+from .auth import require_admin, require_auth, get_current_user
+from .pagination import keyset_page, cached_count, InvalidCursor
+from .cache import cached_response
 
 main_bp = Blueprint("main", __name__)
 
+PAGE_SIZE = 100  # треков на странице плейлиста / жанра
+
+@main_bp.errorhandler(InvalidCursor)
+def invalid_cursor(e):
+    return "Invalid cursor", 400
+
 def is_ajax():
     """Проверка AJAX запроса"""
     return request.headers.get('X-Requested-With') == 'XMLHttpRequest'
 
 @main_bp.route("/")
+@cached_response(tags=("tracks", "playlists", "genres"), anonymous_only=True)
 def index():
     """Главная страница"""
     tracks = Track.query.order_by(Track.id).limit(100).all()
     
-    user_id = session.get("user_id")
-    if user_id:
-        playlists = Playlist.query.filter(
-            db.or_(
-                Playlist.is_public == True,
-                Playlist.user_id == user_id
-            )
-        ).order_by(Playlist.id).all()
-    else:
-        playlists = Playlist.query.filter_by(is_public=True).order_by(Playlist.id).all()
+    playlists = Playlist.visible_to(session.get("user_id")).order_by(Playlist.id).all()
     
     genres = Genre.query.all()
     
@@ -50,9 +50,22 @@ def playlist_view(playlist_id):
     
     template = "playlist_content.html" if is_ajax() else "playlist.html"
     
+    rows, next_cursor, prev_cursor = keyset_page(
+        pl.tracks_query(), [playlist_tracks.c.position, Track.id], PAGE_SIZE,
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        key=lambda row: (row.position, row.Track.id)
+    )
+    playlist = pl.to_dict()
+    playlist["tracks"] = [track.to_dict() for track, _ in rows]
+    
     return render_template(
         template,
-        playlist=pl.to_dict(include_tracks=True)
+        playlist=playlist,
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor,
+        start=max(int(request.args.get("start", 0)), 0),
+        page_size=PAGE_SIZE
     )
 
 @main_bp.route("/search")
@@ -66,29 +79,14 @@ def search_page():
     genres = []
     
     if query:
-        tracks = Track.query.filter(
-            db.or_(
-                Track.title.ilike(f"%{query}%"),
-                Track.artist.ilike(f"%{query}%"),
-                Track.album.ilike(f"%{query}%")
-            )
-        ).limit(50).all()
-        
-        user_id = session.get("user_id")
-        if user_id:
-            playlists = Playlist.query.filter(
-                db.or_(
-                    Playlist.is_public == True,
-                    Playlist.user_id == user_id
-                ),
-                Playlist.name.ilike(f"%{query}%")
-            ).limit(20).all()
-        else:
-            playlists = Playlist.query.filter_by(is_public=True)\
-                .filter(Playlist.name.ilike(f"%{query}%"))\
-                .limit(20).all()
-        
-        genres = Genre.query.filter(Genre.name.ilike(f"%{query}%")).all()
+        results = current_app.search_service.search(
+            query,
+            user_id=session.get("user_id"),
+            limit=50
+        )
+        tracks = results["tracks"][0]
+        playlists = results["playlists"][0][:20]
+        genres = results["genres"][0]
     
     template = "search_content.html" if is_ajax() else "search.html"
     
@@ -114,7 +112,10 @@ def library_page():
         flash("Please log in to access your library", "error")
         return redirect(url_for("auth.login", next=url_for("main.library_page")))
     
-    user = User.query.get_or_404(user_id)
+    user = get_current_user()
+    if not user:
+        session.clear()
+        return redirect(url_for("auth.login"))
     user_playlists = Playlist.query.filter_by(user_id=user_id).all()
     
     liked_tracks = []
@@ -123,7 +124,7 @@ def library_page():
         track_ids = [l.track_id for l in liked]
         liked_tracks = Track.query.filter(Track.id.in_(track_ids)).all()
     
-    history = ListeningHistory.query.filter_by(user_id=user_id)\
+    history = ListeningHistory.for_user(user_id)\
         .order_by(ListeningHistory.played_at.desc())\
         .limit(20).all()
     
@@ -180,7 +181,8 @@ def admin_dashboard():
         total_tracks=total_tracks,
         total_playlists=total_playlists,
         total_users=total_users,
-        popular_tracks=popular_tracks
+        popular_tracks=popular_tracks,
+        jobs=current_app.jobs.recent()
     )
 
 @main_bp.route("/admin/login", methods=["GET"])
@@ -191,8 +193,7 @@ def admin_login_page():
 @main_bp.route("/tracks")
 def tracks_page():
     """Все треки"""
-    page = int(request.args.get("page", 1))
-    per = int(request.args.get("per", 50))
+    per = min(max(int(request.args.get("per", 50)), 1), 500)
     genre = request.args.get("genre")
     search = request.args.get("search", "").strip()
     
@@ -202,22 +203,21 @@ def tracks_page():
         q = q.filter(Track.genre == genre)
     
     if search:
-        q = q.filter(
-            db.or_(
-                Track.title.ilike(f"%{search}%"),
-                Track.artist.ilike(f"%{search}%"),
-                Track.album.ilike(f"%{search}%")
-            )
-        )
+        q = current_app.search_service.filter(q, Track, search)
     
-    q = q.order_by(Track.id)
-    items = q.paginate(page=page, per_page=per, error_out=False)
+    items, next_cursor, prev_cursor = keyset_page(
+        q, [Track.id], per,
+        after=request.args.get("after"),
+        before=request.args.get("before")
+    )
     
     genres = Genre.query.all()
     
     return render_template(
         "tracks.html",
         items=items,
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor,
         genres=genres,
         current_genre=genre,
         search_query=search
@@ -227,38 +227,36 @@ def tracks_page():
 def track_view(track_id):
     """Отдельный трек"""
     t = Track.query.get_or_404(track_id)
-    return render_template("track.html", track=t.to_dict())
+    return render_template("track.html", track=t.to_dict(include_lyrics=True))
 
 @main_bp.route("/admin/bulk_upload", methods=["POST"])
 @require_auth(roles=['admin'])
 def admin_bulk_upload():
-    """Массовая загрузка"""
+    """Массовая загрузка: файлы сохраняются на диск, импорт идёт в фоне"""
     svc = current_app.media_service
-    added_total = []
     
     if 'files' in request.files:
-        files = request.files.getlist('files')
-        res = svc.add_tracks_from_files(files)
-        added_total.extend(res)
+        files = svc.spool_uploads(request.files.getlist('files'))
+        if files:
+            job_id = current_app.jobs.enqueue("import_files", files=files)
+            flash(f"Upload of {len(files)} files queued (job {job_id[:8]}).", "success")
     
     if 'zipfile' in request.files and request.files['zipfile'].filename:
-        zipf = request.files['zipfile']
-        res_zip = svc.add_tracks_from_zip(zipf)
-        added_total.extend(res_zip)
+        zip_path = svc.spool_upload(request.files['zipfile'], suffix=".zip")
+        job_id = current_app.jobs.enqueue("import_zip", zip_path=str(zip_path))
+        flash(f"ZIP import queued (job {job_id[:8]}).", "success")
     
-    flash(f"Bulk upload finished — added {len(added_total)} tracks.", "success")
     return redirect(url_for("main.admin_dashboard"))
 
 @main_bp.route("/admin/rescan", methods=["POST"])
 @require_auth(roles=['admin'])
 def admin_rescan():
-    """Пересканировать медиа"""
-    svc = current_app.media_service
-    summary = svc.scan_and_sync_db()
-    flash(
-        f"Rescan finished. Found {summary['found_files']} files, added {summary['added']} tracks.",
-        "success"
-    )
+    """Пересканировать медиа (в фоне); prune — заодно удалить треки без файлов"""
+    if request.form.get("prune"):
+        job_id = current_app.jobs.enqueue("rescan", dedupe=True, prune=True)
+    else:
+        job_id = current_app.jobs.enqueue("rescan", dedupe=True)
+    flash(f"Rescan queued (job {job_id[:8]}).", "success")
     return redirect(url_for("main.admin_dashboard"))
 
 @main_bp.route("/admin/upload", methods=["GET", "POST"])
@@ -275,9 +273,9 @@ def admin_upload():
             flash("Empty filename", "error")
             return redirect(url_for("main.admin_upload"))
         
-        svc = current_app.media_service
-        track = svc.add_track_from_upload(f)
-        flash(f"Uploaded: {track['title']}", "success")
+        files = current_app.media_service.spool_uploads([f])
+        job_id = current_app.jobs.enqueue("import_files", files=files)
+        flash(f"Uploaded {f.filename}, import queued (job {job_id[:8]}).", "success")
         return redirect(url_for("main.admin_dashboard"))
     
     return render_template("admin_upload.html")
@@ -286,16 +284,22 @@ def admin_upload():
 @require_auth(roles=['admin'])
 def admin_tracks():
     """Управление треками"""
-    page = int(request.args.get("page", 1))
-    per = int(request.args.get("per", 50))
+    per = min(max(int(request.args.get("per", 50)), 1), 500)
     
-    items = Track.query.order_by(Track.id.desc()).paginate(
-        page=page,
-        per_page=per,
-        error_out=False
+    items, next_cursor, prev_cursor = keyset_page(
+        Track.query, [Track.id], per,
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        descending=True
     )
     
-    return render_template("admin_tracks.html", items=items)
+    return render_template(
+        "admin_tracks.html",
+        items=items,
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor,
+        total=cached_count("admin_tracks", Track.query)
+    )
 
 @main_bp.route("/admin/track/<int:track_id>/edit", methods=["GET", "POST"])
 @require_auth(roles=['admin'])
@@ -328,10 +332,7 @@ def admin_track_delete(track_id):
     
     import os
     if track.media:
-        file_path = os.path.join(
-            current_app.config["MEDIA_DIR"],
-            os.path.basename(track.media)
-        )
+        file_path = current_app.media_service.media_path(track)
         if os.path.exists(file_path):
             try:
                 os.remove(file_path)
@@ -386,6 +387,25 @@ def admin_users():
     users = User.query.all()
     return render_template("admin_users.html", users=users)
 
+@main_bp.route("/admin/perf")
+@require_auth(roles=['admin'])
+def admin_perf():
+    """Профилирование: задержки по endpoint-ам и медленные SQL (этого процесса)"""
+    perf = current_app.perf
+    stats = perf.snapshot() if perf is not None else None
+    if request.args.get("format") == "json":
+        return jsonify({"enabled": perf is not None, **(stats or {})})
+    return render_template("admin_perf.html", stats=stats)
+
+@main_bp.route("/admin/perf/reset", methods=["POST"])
+@require_auth(roles=['admin'])
+def admin_perf_reset():
+    """Обнулить статистику профилирования"""
+    if current_app.perf is not None:
+        current_app.perf.reset()
+        flash("Profiling stats reset.", "success")
+    return redirect(url_for("main.admin_perf"))
+
 @main_bp.route("/genres")
 def genres_page():
     """Жанры"""
@@ -396,10 +416,18 @@ def genres_page():
 def genre_view(genre_id):
     """Жанр с треками"""
     genre = Genre.query.get_or_404(genre_id)
-    tracks = Track.query.filter_by(genre=genre.name).order_by(Track.plays.desc()).all()
+    tracks, next_cursor, prev_cursor = keyset_page(
+        Track.query.filter_by(genre=genre.name).options(Track.list_columns()),
+        [Track.plays, Track.id], PAGE_SIZE,
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        descending=True
+    )
     
     return render_template(
         "genre.html",
         genre=genre,
-        tracks=[t.to_dict() for t in tracks]
+        tracks=[t.to_dict() for t in tracks],
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor
     )
\ No newline at end of file
@@ -0,0 +1,105 @@
+"""
+Сериализация списков без ORM-объектов: запрос выбирает явный набор
+колонок (проекцию) и возвращает Row-кортежи, из которых сразу строятся
+dict для JSON — без identity map, загрузки атрибутов и to_dict() на
+каждую строку. Поля и их имена совпадают с to_dict() моделей.
+
+JSON кодируется orjson, если он установлен, иначе stdlib json; даты в
+обоих случаях — ISO 8601, как в to_dict().
+"""
+from datetime import date, datetime
+from flask.json.provider import DefaultJSONProvider
+from .models import Track, Playlist, Genre, User, ListeningHistory
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+TRACK_COLUMNS = tuple(getattr(Track, name) for name in Track.LIST_COLUMNS)
+PLAYLIST_COLUMNS = (
+    Playlist.id, Playlist.name, Playlist.description, Playlist.cover, Playlist.gradient,
+    Playlist.is_public, Playlist.track_count.label("trackCount"),
+    Playlist.created_at, Playlist.updated_at,
+)
+GENRE_COLUMNS = (Genre.id, Genre.name, Genre.cover, Genre.gradient)
+USER_COLUMNS = (User.id, User.username, User.email, User.avatar, User.is_admin, User.created_at)
+# трек истории — с префиксом, чтобы id/created_at не смешались с полями записи
+HISTORY_COLUMNS = (ListeningHistory.id, ListeningHistory.user_id, ListeningHistory.played_at) + tuple(
+    c.label(f"track_{c.key}") for c in TRACK_COLUMNS
+)
+
+
+def project(query, columns):
+    """Тот же запрос (фильтры, join), но только с колонками проекции"""
+    return query.with_entities(*columns)
+
+
+def as_dict(row):
+    return dict(zip(row._fields, row))
+
+
+def as_dicts(rows, fields=None):
+    """Row -> dict; fields — только эти поля (по умолчанию все колонки проекции)"""
+    rows = list(rows)
+    if not rows:
+        return []
+    names = rows[0]._fields
+    fields = tuple(fields or names)
+    if fields == names:
+        return [dict(zip(names, row)) for row in rows]
+    index = [names.index(f) for f in fields]
+    return [{f: row[i] for f, i in zip(fields, index)} for row in rows]
+
+
+def track_dicts(rows):
+    """Поля трека из строк, где кроме них есть служебные колонки (курсоры и т.п.)"""
+    return as_dicts(rows, Track.LIST_COLUMNS)
+
+
+def history_dicts(rows):
+    """Строки HISTORY_COLUMNS -> формат ListeningHistory.to_dict()"""
+    return [
+        {
+            "id": row.id,
+            "user_id": row.user_id,
+            "track": {name: getattr(row, f"track_{name}") for name in Track.LIST_COLUMNS},
+            "played_at": row.played_at,
+        }
+        for row in rows
+    ]
+
+
+def _default(o):
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    return DefaultJSONProvider.default(o)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Провайдер app.json: orjson при наличии, stdlib — иначе и для нестандартных опций"""
+
+    default = staticmethod(_default)
+
+    def _orjson_options(self):
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return options
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_default, option=self._orjson_options()).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None or self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)  # с отступами — для отладки
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_default, option=self._orjson_options())
+        return self._app.response_class(body, mimetype=self.mimetype)
@@ -0,0 +1,218 @@
+"""
+Анализ аудио при импорте: пики волны для плеера и громкость (ReplayGain).
+Аудио декодируется один раз, потоково, в моно float-отсчёты. Декодеры
+подключаемые: WAV читается стандартным модулем wave (NumPy ускоряет
+разбор, если установлен), остальное — через ffmpeg, если он есть в PATH.
+Громкость считается по схеме EBU R128 / BS.1770 (блоки 400 мс, гейты
+-70 LUFS и -10 LU); K-фильтр применяется, если доступен SciPy.
+"""
+import math
+import shutil
+import subprocess
+import wave
+from array import array
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from scipy.signal import lfilter, lfilter_zi
+except ImportError:
+    lfilter = None
+
+PEAK_POINTS = 1000  # точек волны на трек
+REFERENCE_LUFS = -18.0  # ReplayGain 2.0
+WINDOW_SECONDS = 0.01  # разрешение пиков до прореживания до PEAK_POINTS
+BLOCK_WINDOWS = 40  # 400 мс блок громкости
+STEP_WINDOWS = 10  # шаг блоков 100 мс (перекрытие 75%)
+CHUNK_FRAMES = 65536
+
+
+# ---- decoders: path -> (sample_rate, итератор моно-чанков float -1..1) ----
+
+def _pcm_to_mono(raw, channels, sampwidth):
+    """PCM little-endian -> моно float-отсчёты"""
+    if sampwidth == 3:  # 24 бит: расширяем до 32
+        raw = b"".join(b"\0" + raw[i:i + 3] for i in range(0, len(raw), 3))
+        sampwidth = 4
+    scale = float(1 << (8 * sampwidth - 1))
+    if np is not None:
+        dtype = {1: np.uint8, 2: "<i2", 4: "<i4"}[sampwidth]
+        data = np.frombuffer(raw, dtype=dtype).astype(np.float32)
+        if sampwidth == 1:
+            data -= 128.0
+            scale = 128.0
+        if channels > 1:
+            data = data[: len(data) // channels * channels].reshape(-1, channels).mean(axis=1)
+        return data / scale
+    samples = array({1: "B", 2: "h", 4: "i"}[sampwidth], raw)
+    if sampwidth == 1:
+        samples = [s - 128 for s in samples]
+        scale = 128.0
+    if channels > 1:
+        return [sum(samples[i:i + channels]) / (channels * scale) for i in range(0, len(samples), channels)]
+    return [s / scale for s in samples]
+
+
+def _decode_wav(path):
+    w = wave.open(str(path), "rb")
+    rate, channels, sampwidth = w.getframerate(), w.getnchannels(), w.getsampwidth()
+
+    def chunks():
+        with w:
+            while True:
+                raw = w.readframes(CHUNK_FRAMES)
+                if not raw:
+                    break
+                yield _pcm_to_mono(raw, channels, sampwidth)
+    return rate, chunks()
+
+
+def _decode_ffmpeg(path, rate=22050):
+    proc = subprocess.Popen(
+        [shutil.which("ffmpeg"), "-v", "quiet", "-i", str(path), "-ac", "1", "-ar", str(rate), "-f", "s16le", "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+
+    def chunks():
+        try:
+            while True:
+                raw = proc.stdout.read(CHUNK_FRAMES * 2)
+                if not raw:
+                    break
+                yield _pcm_to_mono(raw[: len(raw) // 2 * 2], 1, 2)
+        finally:
+            proc.stdout.close()
+            proc.wait()
+    return rate, chunks()
+
+
+# (имя, подходит ли файл, декодер) — в порядке приоритета
+DECODERS = [
+    ("wave", lambda path: Path(path).suffix.lower() == ".wav", _decode_wav),
+    ("ffmpeg", lambda path: shutil.which("ffmpeg") is not None, _decode_ffmpeg),
+]
+
+
+def register_decoder(name, accepts, decode, first=True):
+    """Подключить свой декодер: decode(path) -> (sample_rate, итератор моно-чанков)"""
+    entry = (name, accepts, decode)
+    DECODERS.insert(0, entry) if first else DECODERS.append(entry)
+
+
+# ---- analysis ----
+
+def _k_filter(rate):
+    """Коэффициенты K-фильтра BS.1770 (shelf + high-pass) для частоты rate"""
+    def biquad(f0, gain_db, q, kind):
+        k = math.tan(math.pi * f0 / rate)
+        if kind == "shelf":
+            vh = 10 ** (gain_db / 20)
+            vb = vh ** 0.4996667741545416
+            a0 = 1 + k / q + k * k
+            b = [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0]
+        else:
+            a0 = 1 + k / q + k * k
+            b = [1.0, -2.0, 1.0]
+        a = [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+        return b, a
+    return [
+        biquad(1681.974450955533, 3.999843853973347, 0.7071752369554196, "shelf"),
+        biquad(38.13547087602444, 0.0, 0.5003270373238773, "highpass"),
+    ]
+
+
+class _Accumulator:
+    """Потоковый сбор (max |x|, сумма x²) по окнам WINDOW_SECONDS"""
+
+    def __init__(self, rate):
+        self.window = max(int(rate * WINDOW_SECONDS), 1)
+        self.peaks = array("f")
+        self.energy = array("d")
+        self._tail = []
+        self._filters = None
+        if lfilter is not None and np is not None:
+            self._filters = [(b, a, lfilter_zi(b, a) * 0.0) for b, a in _k_filter(rate)]
+
+    def feed(self, samples):
+        if np is not None:
+            samples = np.concatenate((np.asarray(self._tail, dtype=np.float32), samples))
+            usable = len(samples) // self.window * self.window
+            self._tail = samples[usable:]
+            block = samples[:usable].reshape(-1, self.window)
+            self.peaks.extend(np.abs(block).max(axis=1).tolist())
+            weighted = block.ravel()
+            if self._filters:
+                for i, (b, a, zi) in enumerate(self._filters):
+                    weighted, zi = lfilter(b, a, weighted, zi=zi)
+                    self._filters[i] = (b, a, zi)
+            self.energy.extend(np.square(weighted, dtype=np.float64).reshape(-1, self.window).sum(axis=1).tolist())
+            return
+        samples = list(self._tail) + list(samples)
+        usable = len(samples) // self.window * self.window
+        self._tail = samples[usable:]
+        w = self.window
+        for i in range(0, usable, w):
+            seg = samples[i:i + w]
+            self.peaks.append(max(max(seg), -min(seg)))
+            self.energy.append(sum(x * x for x in seg))
+
+
+def _integrated_loudness(energy, window):
+    """Гейтированная громкость по блокам 400 мс с шагом 100 мс (LUFS)"""
+    blocks = []
+    for start in range(0, len(energy) - BLOCK_WINDOWS + 1, STEP_WINDOWS):
+        ms = sum(energy[start:start + BLOCK_WINDOWS]) / (BLOCK_WINDOWS * window)
+        if ms > 0:
+            blocks.append(ms)
+    # абсолютный гейт -70 LUFS, затем относительный -10 LU
+    blocks = [ms for ms in blocks if -0.691 + 10 * math.log10(ms) > -70]
+    if not blocks:
+        return None
+    gate = -0.691 + 10 * math.log10(sum(blocks) / len(blocks)) - 10
+    gated = [ms for ms in blocks if -0.691 + 10 * math.log10(ms) > gate]
+    return -0.691 + 10 * math.log10(sum(gated) / len(gated))
+
+
+def _downsample(peaks, points):
+    if not peaks:
+        return b""
+    points = min(points, len(peaks))
+    step = len(peaks) / points
+    out = bytearray()
+    for i in range(points):
+        lo = int(i * step)
+        hi = max(int((i + 1) * step), lo + 1)
+        out.append(min(255, int(max(peaks[lo:hi]) * 255 + 0.5)))
+    return bytes(out)
+
+
+def analyze(path, points=PEAK_POINTS):
+    """
+    Декодировать файл и посчитать пики и громкость.
+    Возвращает dict (peaks — bytes, 0..255 на точку) или None, если декодера нет.
+    """
+    for name, accepts, decode in DECODERS:
+        if not accepts(path):
+            continue
+        try:
+            rate, chunks = decode(path)
+            acc = _Accumulator(rate)
+            for chunk in chunks:
+                acc.feed(chunk)
+        except Exception:
+            continue  # пробуем следующий декодер
+        if not acc.peaks:
+            return None
+        loudness = _integrated_loudness(acc.energy, acc.window)
+        return {
+            "decoder": name,
+            "peaks": _downsample(acc.peaks, points),
+            "sample_peak": round(min(max(acc.peaks), 1.0), 4),
+            "loudness": round(loudness, 2) if loudness is not None else None,
+            "replay_gain": round(REFERENCE_LUFS - loudness, 2) if loudness is not None else None,
+        }
+    return None
@@ -0,0 +1,127 @@
+"""
+Хранение истории прослушиваний. Сырые строки ListeningHistory живут
+HISTORY_RETENTION_DAYS дней, более старые сжимаются в свёртку
+пользователь × трек × день (listening_history_daily) короткими пачками —
+каждая в своей транзакции, с паузой между ними, чтобы не держать
+блокировку записи. Счётчики профиля (user_stats) ведутся инкрементально:
+plays — при сливе буфера воспроизведений, лайки и плейлисты — по
+событиям flush сессии.
+"""
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from ..models import ListeningHistory, ListeningHistoryDaily, LikedTrack, Playlist, UserStats, Watermark
+from .recommendations import HISTORY_WATERMARK
+from .trending import _increment
+from .. import db
+
+# модель -> счётчик в user_stats, который она двигает
+_COUNTED = {LikedTrack: "likes", Playlist: "playlists"}
+_CHUNK = 900  # параметров в одном IN (лимит SQLite)
+
+
+def _track_counters():
+    """+1/-1 к likes/playlists при вставке/удалении строк через ORM (в той же транзакции)"""
+    if getattr(_track_counters, "_installed", False):
+        return
+    _track_counters._installed = True
+
+    @event.listens_for(Session, "after_flush")
+    def _after_flush(session, flush_context):
+        deltas = {column: Counter() for column in _COUNTED.values()}
+        for objects, sign in ((session.new, 1), (session.deleted, -1)):
+            for obj in objects:
+                column = _COUNTED.get(type(obj))
+                if column and obj.user_id:
+                    deltas[column][(obj.user_id,)] += sign
+        for column, counts in deltas.items():
+            counts = {k: n for k, n in counts.items() if n}
+            _increment(UserStats, ("user_id",), counts, column=column, session=session)
+
+
+class HistoryRetention:
+    def __init__(self, app):
+        self.app = app
+        self.retention_days = app.config.get("HISTORY_RETENTION_DAYS", 90)
+        self.batch_size = app.config.get("HISTORY_COMPACT_BATCH", 5000)
+        self.pause = app.config.get("HISTORY_COMPACT_PAUSE", 0.1)
+        _track_counters()
+
+    def record(self, plays):
+        """Учесть воспроизведения [(user_id, track_id), ...] в счётчиках (в транзакции слива)"""
+        _increment(UserStats, ("user_id",), Counter((user_id,) for user_id, _ in plays))
+
+    def stats(self, user_id):
+        """{"plays", "likes", "playlists"} пользователя; строки нет — ещё ничего не было"""
+        row = db.session.get(UserStats, user_id)
+        if row is None:
+            return {"plays": 0, "likes": 0, "playlists": 0}
+        return {"plays": row.plays, "likes": row.likes, "playlists": row.playlists}
+
+    def _compactable_until(self):
+        """
+        Максимальный id, который можно сжать: рекомендации читают историю по
+        id > watermark, поэтому ещё не учтённые ими строки не трогаем
+        """
+        if self.app.config.get("RECS_INTERVAL", 3600) > 0:
+            return Watermark.get(HISTORY_WATERMARK)
+        return None
+
+    def compact(self, max_batches=None, on_progress=None):
+        """
+        Сжать историю старше окна хранения пачками по batch_size строк.
+        max_batches ограничивает один запуск; остальное — в следующий.
+        """
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        until = self._compactable_until()
+        q = db.session.query(ListeningHistory.id, ListeningHistory.user_id,
+                             ListeningHistory.track_id, ListeningHistory.played_at)\
+            .filter(ListeningHistory.played_at < cutoff)
+        if until is not None:
+            q = q.filter(ListeningHistory.id <= until)
+        q = q.order_by(ListeningHistory.played_at).limit(self.batch_size)
+
+        total = batches = 0
+        while max_batches is None or batches < max_batches:
+            rows = q.all()
+            if not rows:
+                break
+            days = Counter((user_id, track_id, played_at.date()) for _, user_id, track_id, played_at in rows)
+            _increment(ListeningHistoryDaily, ("user_id", "track_id", "day"), days)
+            ids = [row.id for row in rows]
+            for i in range(0, len(ids), _CHUNK):
+                ListeningHistory.query.filter(ListeningHistory.id.in_(ids[i:i + _CHUNK]))\
+                    .delete(synchronize_session=False)
+            db.session.commit()
+            total += len(rows)
+            batches += 1
+            if on_progress:
+                on_progress(total, None)
+            if len(rows) < self.batch_size:
+                break
+            if self.pause:
+                time.sleep(self.pause)  # даём пройти записям других процессов
+        return {"compacted": total, "batches": batches, "cutoff": cutoff.isoformat()}
+
+    def rebuild_stats(self):
+        """Пересчитать user_stats с нуля (восстановление после ручных правок БД)"""
+        stats = {}
+
+        def add(rows, column):
+            for user_id, n in rows:
+                if user_id:
+                    stats.setdefault(user_id, {"user_id": user_id, "plays": 0, "likes": 0, "playlists": 0})
+                    stats[user_id][column] += n or 0
+
+        add(db.session.query(ListeningHistory.user_id, func.count()).group_by(ListeningHistory.user_id), "plays")
+        add(db.session.query(ListeningHistoryDaily.user_id, func.sum(ListeningHistoryDaily.plays))
+            .group_by(ListeningHistoryDaily.user_id), "plays")
+        add(db.session.query(LikedTrack.user_id, func.count()).group_by(LikedTrack.user_id), "likes")
+        add(db.session.query(Playlist.user_id, func.count()).group_by(Playlist.user_id), "playlists")
+        UserStats.query.delete(synchronize_session=False)
+        if stats:
+            db.session.execute(UserStats.__table__.insert(), list(stats.values()))
+        db.session.commit()
+        return {"users": len(stats)}
@@ -0,0 +1,160 @@
+import math
+import os
+import shutil
+import struct
+import threading
+import time
+from pathlib import Path
+from .streaming import media_etag
+
+TIMESTAMP_OWNER = b"com.apple.streaming.transportStreamTimestamp\x00"
+
+
+def _syncsafe(n):
+    return bytes(((n >> 21) & 0x7F, (n >> 14) & 0x7F, (n >> 7) & 0x7F, n & 0x7F))
+
+
+def _timestamp_tag(seconds):
+    """ID3 с PRIV-меткой времени сегмента (packed audio в HLS, 90 кГц)"""
+    pts = int(round(seconds * 90000)) & ((1 << 33) - 1)
+    payload = TIMESTAMP_OWNER + struct.pack(">Q", pts)
+    frame = b"PRIV" + _syncsafe(len(payload)) + b"\x00\x00" + payload
+    return b"ID3\x04\x00\x00" + _syncsafe(len(frame)) + frame
+
+
+class HlsPackager:
+    """
+    HLS для MP3 без перекодирования: сегменты по HLS_SEGMENT_SECONDS
+    режутся по точкам индекса перемотки (SeekIndex из media_files), то есть
+    по границам кадров, — файл в запросе целиком не сканируется.
+    Сегменты кэшируются на диске в HLS_CACHE_DIR/<версия файла>/ — версия
+    меняется при перезаписи файла, поэтому сегменты неизменяемы.
+    Кэш ограничивает периодическая задача purge_hls_cache (purge);
+    удалённые сегменты создаются заново по запросу.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.cache_dir = Path(app.config["HLS_CACHE_DIR"])
+        self.segment_seconds = app.config.get("HLS_SEGMENT_SECONDS", 6)
+
+    @staticmethod
+    def supports(path):
+        return Path(path).suffix.lower() == ".mp3"
+
+    def version(self, path):
+        return media_etag(path)
+
+    def segments(self, index):
+        """[(start, end, длительность), ...] по SeekIndex файла"""
+        entry_seconds = index.frames_per_entry * index.frame_duration
+        step = max(1, round(self.segment_seconds / entry_seconds))
+        offsets = index.offsets
+        segments = []
+        for first in range(0, len(offsets), step):
+            last = first + step
+            end = offsets[last] if last < len(offsets) else index.end
+            frames = min(last * index.frames_per_entry, index.frame_count) - first * index.frames_per_entry
+            segments.append((offsets[first], end, round(frames * index.frame_duration, 3)))
+        return segments
+
+    def manifest(self, path, index):
+        """Текст m3u8 (VOD) или None; сегменты — относительные ссылки hls/<версия>/<n>.mp3"""
+        segments = self.segments(index)
+        if not segments:
+            return None
+        version = self.version(path)
+        try:
+            os.utime(self.cache_dir / version)  # для purge: версия ещё проигрывается
+        except OSError:
+            pass
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{math.ceil(max(d for _, _, d in segments))}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+            "#EXT-X-PLAYLIST-TYPE:VOD",
+        ]
+        for n, (_, _, duration) in enumerate(segments):
+            lines.append(f"#EXTINF:{duration:.3f},")
+            lines.append(f"hls/{version}/{n}.mp3")
+        lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
+
+    def segment(self, path, version, n, index=None):
+        """
+        Путь к файлу сегмента n или None. index (SeekIndex) нужен, только если
+        сегмента ещё нет на диске: тогда он создаётся.
+        """
+        if version != self.version(path):
+            return None  # файл изменился — клиенту нужен новый манифест
+        seg_file = self.cache_dir / version / f"{n}.mp3"
+        if seg_file.exists():
+            return seg_file
+        if index is None:
+            return None
+        segments = self.segments(index)
+        if not 0 <= n < len(segments):
+            return None
+
+        start, end, _ = segments[n]
+        offset = sum(d for _, _, d in segments[:n])
+        tmp = seg_file.with_name(f"{n}.{os.getpid()}.{threading.get_ident()}.tmp")
+        for attempt in range(2):
+            seg_file.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                self._write(path, tmp, start, end, offset)
+                tmp.replace(seg_file)
+                break
+            except FileNotFoundError:
+                if attempt or not path.is_file():
+                    raise  # иначе каталог версии удалил purge — создаём заново
+        return seg_file
+
+    @staticmethod
+    def _write(path, tmp, start, end, offset):
+        with open(path, "rb") as src, open(tmp, "wb") as out:
+            out.write(_timestamp_tag(offset))
+            src.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = src.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    break
+                out.write(chunk)
+                remaining -= len(chunk)
+
+    def purge(self, max_mb=None, max_age_days=None, on_progress=None):
+        """
+        Задача purge_hls_cache: удалить версии, манифест которых не запрашивали
+        дольше HLS_CACHE_MAX_AGE_DAYS, затем самые давние, пока кэш больше
+        HLS_CACHE_MAX_MB. 0 — без ограничения.
+        """
+        if max_mb is None:
+            max_mb = self.app.config.get("HLS_CACHE_MAX_MB", 1024)
+        if max_age_days is None:
+            max_age_days = self.app.config.get("HLS_CACHE_MAX_AGE_DAYS", 30)
+        versions = []
+        try:
+            dirs = [d for d in self.cache_dir.iterdir() if d.is_dir()]
+        except FileNotFoundError:
+            dirs = []
+        for d in dirs:
+            try:
+                size = sum(f.stat().st_size for f in d.iterdir())
+                versions.append((d.stat().st_mtime, size, d))
+            except FileNotFoundError:
+                continue  # удалён параллельно
+        versions.sort()
+
+        total = sum(size for _, size, _ in versions)
+        cutoff = time.time() - max_age_days * 86400 if max_age_days else None
+        limit = max_mb * 1024 * 1024 if max_mb else None
+        removed = 0
+        for mtime, size, d in versions:
+            if not (cutoff and mtime < cutoff) and not (limit and total > limit):
+                break
+            shutil.rmtree(d, ignore_errors=True)
+            total -= size
+            removed += 1
+        return {"removed": removed, "kept": len(versions) - removed, "size_mb": round(total / 1024 / 1024, 1)}
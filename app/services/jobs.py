@@ -0,0 +1,329 @@
+import os
+import json
+import uuid
+import time
+import sqlite3
+import logging
+import threading
+import traceback
+from pathlib import Path
+
+
+class _JobLogHandler(logging.Handler):
+    """Пишет записи app.logger из потока задачи в job_logs"""
+
+    def __init__(self, queue, job_id):
+        super().__init__(logging.INFO)
+        self.queue = queue
+        self.job_id = job_id
+        self.thread_id = threading.get_ident()
+
+    def emit(self, record):
+        if record.thread == self.thread_id:
+            self.queue.log(self.job_id, record.getMessage(), record.levelname.lower())
+
+
+class JobQueue:
+    """
+    Очередь фоновых задач в локальном SQLite-файле (WAL).
+    Файл общий для всех воркеров gunicorn и отдельного run_worker.py.
+    Задача — имя зарегистрированной функции + JSON-аргументы; воркер
+    захватывает её под BEGIN IMMEDIATE, так что одну задачу выполняет
+    ровно один поток. Упавшие задачи повторяются с backoff-ом.
+    """
+
+    HEARTBEAT_SECONDS = 30  # выполняющаяся задача отмечается по таймеру, независимо от on_progress
+    STALE_SECONDS = 300  # running без heartbeat дольше — процесс умер: повторить или завершить ошибкой
+    RETRY_DELAY = 10  # секунд, удваивается с каждой попыткой
+
+    def __init__(self, app):
+        self.app = app
+        self.path = Path(app.config["JOBS_DB"])
+        self.poll_interval = app.config.get("JOB_POLL_INTERVAL", 1.0)
+        self.tasks = {}
+        self.periodic = {}  # kind -> интервал в секундах
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._pid = None
+        self._threads = []
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 1,
+                done INTEGER NOT NULL DEFAULT 0,
+                total INTEGER,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                run_after REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                heartbeat REAL
+            );
+            CREATE INDEX IF NOT EXISTS ix_jobs_status_run_after ON jobs (status, run_after);
+            CREATE INDEX IF NOT EXISTS ix_jobs_kind_created_at ON jobs (kind, created_at);
+            CREATE TABLE IF NOT EXISTS job_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                level TEXT NOT NULL,
+                message TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_job_logs_job_id ON job_logs (job_id);
+        """)
+
+    def _conn(self):
+        # соединение на поток и на процесс (после fork старое использовать нельзя)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def register(self, kind, func, max_attempts=1):
+        """
+        Зарегистрировать задачу. func(**payload, on_progress=...) выполняется
+        в app_context; max_attempts > 1 — только для идемпотентных задач.
+        """
+        self.tasks[kind] = (func, max_attempts)
+
+    def every(self, kind, seconds):
+        """
+        Запускать задачу kind (без аргументов) не чаще раза в seconds секунд.
+        Ставит в очередь любой воркер; повторно — только когда прошлый запуск
+        завершён и интервал истёк. seconds <= 0 — не планировать.
+        """
+        if kind not in self.tasks:
+            raise KeyError(f"Unknown job kind: {kind}")
+        if seconds > 0:
+            self.periodic[kind] = seconds
+
+    # ---- producer side ----
+
+    def enqueue(self, kind, dedupe=False, **payload):
+        """
+        Поставить задачу в очередь, вернуть её id.
+        dedupe=True — если такая же задача ещё ждёт в очереди, вернуть её.
+        """
+        if kind not in self.tasks:
+            raise KeyError(f"Unknown job kind: {kind}")
+        conn = self._conn()
+        data = json.dumps(payload, sort_keys=True)
+        if dedupe:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE kind = ? AND payload = ? AND status = 'queued'",
+                (kind, data)
+            ).fetchone()
+            if row is not None:
+                return row["id"]
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn.execute(
+            "INSERT INTO jobs (id, kind, payload, status, max_attempts, created_at, run_after) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+            (job_id, kind, data, self.tasks[kind][1], now, now)
+        )
+        # процесс мог быть форкнут после start() — потоки нужно поднять заново
+        if self._threads and self._pid != os.getpid():
+            self.start(len(self._threads))
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id, with_logs=True):
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = self._to_dict(row)
+        if with_logs:
+            job["logs"] = [
+                {"at": r["created_at"], "level": r["level"], "message": r["message"]}
+                for r in self._conn().execute(
+                    "SELECT created_at, level, message FROM job_logs WHERE job_id = ? ORDER BY id",
+                    (job_id,)
+                )
+            ]
+        return job
+
+    def recent(self, limit=10):
+        rows = self._conn().execute(
+            "SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [self._to_dict(r) for r in rows]
+
+    def log(self, job_id, message, level="info"):
+        self._conn().execute(
+            "INSERT INTO job_logs (job_id, created_at, level, message) VALUES (?, ?, ?, ?)",
+            (job_id, time.time(), level, message)
+        )
+
+    @staticmethod
+    def _to_dict(row):
+        return {
+            "id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "max_attempts": row["max_attempts"],
+            "progress": {"done": row["done"], "total": row["total"]},
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+        }
+
+    # ---- worker side ----
+
+    def start(self, workers=None):
+        """Запустить потоки-воркеры в этом процессе"""
+        workers = self.app.config.get("JOB_WORKERS", 1) if workers is None else workers
+        if self._pid == os.getpid() and any(t.is_alive() for t in self._threads):
+            return
+        self._pid = os.getpid()
+        self.purge()
+        self._threads = [
+            threading.Thread(target=self.run_worker, name=f"job-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def run_worker(self, stop=None):
+        """Цикл воркера: брать задачи из очереди, пока не выставлен stop"""
+        while not (stop and stop.is_set()):
+            try:
+                job = self._claim()
+            except sqlite3.OperationalError as e:
+                self.app.logger.warning(f"Job claim failed: {e}")
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._execute(job)
+
+    def _schedule_periodic(self, conn, now):
+        """Поставить периодические задачи, которым подошёл срок (внутри транзакции _claim)"""
+        for kind, interval in self.periodic.items():
+            row = conn.execute(
+                "SELECT MAX(CASE WHEN status IN ('queued', 'running') THEN 1 ELSE 0 END) AS active, "
+                "MAX(created_at) AS last FROM jobs WHERE kind = ? AND payload = '{}'", (kind,)
+            ).fetchone()
+            if row["active"] or (row["last"] is not None and now - row["last"] < interval):
+                continue
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, max_attempts, created_at, run_after) "
+                "VALUES (?, ?, '{}', 'queued', ?, ?, ?)",
+                (uuid.uuid4().hex, kind, self.tasks[kind][1], now, now)
+            )
+
+    def _claim(self):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # попытки брошенной задачи уже потрачены — больше не запускать
+            stale = now - self.STALE_SECONDS
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'worker died', finished_at = ? "
+                "WHERE status = 'running' AND heartbeat < ? AND attempts >= max_attempts",
+                (now, stale)
+            )
+            conn.execute(
+                "UPDATE jobs SET status = 'queued' WHERE status = 'running' AND heartbeat < ?",
+                (stale,)
+            )
+            if self.periodic:
+                self._schedule_periodic(conn, now)
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND run_after <= ? "
+                "ORDER BY created_at LIMIT 1", (now,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, "
+                    "started_at = ?, heartbeat = ? WHERE id = ?",
+                    (now, now, row["id"])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def _execute(self, job):
+        job_id = job["id"]
+        conn = self._conn()
+        attempt = job["attempts"] + 1
+        last_beat = 0.0
+
+        def on_progress(done, total=None):
+            nonlocal last_beat
+            now = time.time()
+            if now - last_beat < 0.5 and done != total:
+                return
+            last_beat = now
+            conn.execute(
+                "UPDATE jobs SET done = ?, total = COALESCE(?, total), heartbeat = ? WHERE id = ?",
+                (done, total, now, job_id)
+            )
+
+        # heartbeat по таймеру: фазы без on_progress (распаковка ZIP и т.п.)
+        # не должны выглядеть как упавший процесс
+        finished = threading.Event()
+
+        def heartbeat():
+            while not finished.wait(self.HEARTBEAT_SECONDS):
+                self._conn().execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time(), job_id))
+
+        beater = threading.Thread(target=heartbeat, name=f"job-heartbeat-{job_id[:8]}", daemon=True)
+        beater.start()
+        handler = _JobLogHandler(self, job_id)
+        self.app.logger.addHandler(handler)
+        self.log(job_id, f"Attempt {attempt}/{job['max_attempts']} started")
+        try:
+            func, _ = self.tasks[job["kind"]]
+            with self.app.app_context():
+                result = func(**json.loads(job["payload"]), on_progress=on_progress)
+        except Exception as e:
+            self.log(job_id, traceback.format_exc(), "error")
+            if attempt < job["max_attempts"]:
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', error = ?, run_after = ? WHERE id = ?",
+                    (str(e), time.time() + self.RETRY_DELAY * 2 ** (attempt - 1), job_id)
+                )
+            else:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                    (str(e), time.time(), job_id)
+                )
+        else:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, finished_at = ? WHERE id = ?",
+                (json.dumps(result, default=str), time.time(), job_id)
+            )
+            self.log(job_id, "Finished")
+        finally:
+            finished.set()
+            beater.join()
+            self.app.logger.removeHandler(handler)
+
+    def purge(self, days=None):
+        """Удалить завершённые задачи старше JOB_RETENTION_DAYS"""
+        days = self.app.config.get("JOB_RETENTION_DAYS", 7) if days is None else days
+        cutoff = time.time() - days * 86400
+        conn = self._conn()
+        conn.execute(
+            "DELETE FROM job_logs WHERE job_id IN "
+            "(SELECT id FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?)", (cutoff,)
+        )
+        conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (cutoff,))
@@ -1,208 +1,693 @@
+import os
 import re
-import io
+import time
+import shutil
+import hashlib
+import tempfile
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from datetime import datetime
 from pathlib import Path
 from mutagen import File as MutagenFile
+from sqlalchemy import or_
 from werkzeug.utils import secure_filename
-from ..models import Track
+from ..models import Track, MediaFile, TrackAnalysis, LikedTrack
 from .. import db
+from .analysis import analyze
+from .mp3frames import SeekIndex, estimate_offset, scan_frames
+from .tags import Image, read_metadata, store_artwork
+
+AUDIO_EXTENSIONS = (".mp3", ".ogg", ".wav", ".m4a")
+DUPLICATE_POLICIES = ("skip", "link", "replace")
+ANALYSIS_FIELDS = ("peaks", "loudness", "replay_gain", "sample_peak", "decoder")
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def _read_duration(path):
+    try:
+        audio = MutagenFile(path)
+        if audio is None or not hasattr(audio, "info"):
+            return None
+        return int(audio.info.length)
+    except Exception:
+        return None
+
+
+def _hash_file(path, chunk_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _try_hash(path):
+    try:
+        return _hash_file(path)
+    except OSError:
+        return None
+
+
+def _copy_hashing(src, dst, chunk_size=COPY_CHUNK_SIZE):
+    """Скопировать поток в файл, считая sha256 на лету (без второго прохода)"""
+    h = hashlib.sha256()
+    for chunk in iter(lambda: src.read(chunk_size), b""):
+        h.update(chunk)
+        dst.write(chunk)
+    return h.hexdigest()
+
+
+def _build_seek_index(path, step):
+    """Индекс перемотки MP3 в сериализованном виде, b"" — кадров нет, None — не строился"""
+    if not step or not str(path).lower().endswith(".mp3"):
+        return None
+    try:
+        index = scan_frames(path)
+    except OSError:
+        return None
+    return SeekIndex.from_frames(index, step).to_bytes() if index else b""
+
+
+def _probe_file(path, content_hash=None, artwork_dir=None, analyze_audio=False, seek_step=0):
+    """
+    Выполняется в пуле процессов: (имя файла, метаданные, sha256).
+    content_hash — уже известный sha256 (посчитан при записи файла).
+    Обложка сразу сохраняется в artwork_dir, в метаданных остаётся её ключ;
+    analyze_audio — заодно посчитать волну и громкость (meta["analysis"]);
+    seek_step — построить индекс перемотки MP3 (meta["seek_index"]).
+    """
+    if content_hash is None:
+        content_hash = _try_hash(path)
+    meta = read_metadata(path)
+    picture = meta.pop("picture")
+    meta["artwork"] = store_artwork(picture, artwork_dir) if picture and artwork_dir else None
+    meta["analysis"] = _analyze_file(path)[1] if analyze_audio else None
+    meta["seek_index"] = _build_seek_index(path, seek_step)
+    return Path(path).name, meta, content_hash
+
+
+def _analyze_file(path):
+    """
+    Выполняется в пуле процессов: (путь, поля TrackAnalysis).
+    Поля None, если файл нечем декодировать — строку не пишем, чтобы
+    следующий analyze_missing (например, после установки ffmpeg) повторил попытку.
+    """
+    result = analyze(path)
+    if result is None:
+        return path, None
+    return path, {field: result.get(field) for field in ANALYSIS_FIELDS}
+
 
 class MediaService:
     def __init__(self, app):
         self.app = app
         self.media_dir: Path = Path(app.config["MEDIA_DIR"])
         self.media_dir.mkdir(parents=True, exist_ok=True)
+        if Image is None:
+            app.logger.warning("Pillow is not installed: artwork thumbnails are not generated, "
+                               "the original image is served for every size")
 
     def start_watcher(self):
-        try:
-            from watchdog.observers import Observer
-            from watchdog.events import FileSystemEventHandler
-        except Exception:
-            # watchdog не установлен — пропустить
-            return False
+        """Следить за MEDIA_DIR (watchdog); изменения уходят задачами rescan пачками"""
+        from .watcher import MediaWatcher
+        self.watcher = MediaWatcher(self.app, self.media_dir, AUDIO_EXTENSIONS)
+        return self.watcher.start()
+
+    def media_path(self, track) -> Path:
+        """Путь к файлу трека на диске"""
+        return self.media_dir / Path(track.media).name
 
-        class Handler(FileSystemEventHandler):
-            def __init__(self, svc):
-                self.svc = svc
-            def on_created(self, event):
-                if event.is_directory:
-                    return
-                # только аудио файлы
-                if str(event.src_path).lower().endswith((".mp3", ".ogg", ".wav", ".m4a")):
-                    # небольшая задержка, чтобы файл дописался
-                    import time
-                    time.sleep(0.3)
-                    try:
-                        self.svc.scan_and_sync_db()
-                    except Exception:
-                        pass
-
-        observer = Observer()
-        observer.schedule(Handler(self), str(self.media_dir), recursive=False)
-        observer.daemon = True
-        observer.start()
-        self.observer = observer
-        return True
-
-    def _list_media_files(self):
-        files = []
-        for p in sorted(self.media_dir.glob("*")):
-            if p.suffix.lower() in (".mp3", ".ogg", ".wav", ".m4a"):
-                files.append(p)
-        return files
+    def _stat_media_files(self, paths=None):
+        """Вернуть {имя файла: os.stat_result} для аудиофайлов в MEDIA_DIR"""
+        result = {}
+        if paths is None:
+            with os.scandir(self.media_dir) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.lower().endswith(AUDIO_EXTENSIONS):
+                        result[entry.name] = entry.stat()
+        else:
+            for p in paths:
+                p = Path(p)
+                if p.suffix.lower() not in AUDIO_EXTENSIONS:
+                    continue
+                try:
+                    result[p.name] = (self.media_dir / p.name).stat()
+                except FileNotFoundError:
+                    continue
+        return result
 
     def _get_duration(self, path: Path):
-        try:
-            audio = MutagenFile(path)
-            if audio is None or not hasattr(audio, "info"):
-                return None
-            return int(audio.info.length)
-        except Exception:
-            return None
+        return _read_duration(path)
 
     def _slug_to_title(self, fname: str) -> str:
         name = Path(fname).stem
         name = re.sub(r"[_\-]+", " ", name)
         return name.title()
 
-    def scan_and_sync_db(self):
-        found = self._list_media_files()
-        existing_media = {t.media for t in Track.query.all()}
-        added = []
-        for p in found:
-            web_path = f"/static/media/{p.name}"
-            if web_path in existing_media:
-                continue
-            title = self._slug_to_title(p.name)
-            duration = self._get_duration(p)
-            t = Track(
-                title=title,
-                artist="Unknown",
-                album="",
-                duration=duration,
-                cover="🎵",
-                media=web_path
-            )
-            db.session.add(t)
-            added.append(t)
-        if added:
-            db.session.commit()
-        return {"found_files": len(found), "added": len(added)}
+    def _track_fields(self, name, meta):
+        """Поля Track из тегов; чего нет в тегах — как раньше, из имени файла"""
+        return {
+            "title": (meta["title"] or self._slug_to_title(name))[:255],
+            "artist": (meta["artist"] or "Unknown")[:255],
+            "album": (meta["album"] or "")[:255],
+            "duration": meta["duration"],
+            "year": meta["year"],
+            "genre": (meta["genre"] or "Other")[:100],
+            "track_number": meta["track_number"],
+            "lyrics": meta["lyrics"] or "",
+            "artwork": meta["artwork"],
+        }
 
-    def add_track_from_upload(self, file_storage):
-        safe_name = file_storage.filename
-        base = Path(safe_name).stem
-        ext = Path(safe_name).suffix or ".mp3"
-        counter = 0
-        dest = self.media_dir / (base + ext)
-        while dest.exists():
-            counter += 1
-            dest = self.media_dir / f"{base}-{counter}{ext}"
-        file_storage.save(dest)
-        web_path = f"/static/media/{dest.name}"
-        duration = self._get_duration(dest)
-        title = self._slug_to_title(dest.name)
-        t = Track(
-            title=title,
-            artist="Unknown",
-            album="",
-            duration=duration,
-            cover="🎵",
-            media=web_path
+    def _map_files(self, func, paths, *extra):
+        """func по файлам (и параллельным спискам аргументов extra); крупные пачки — в пуле процессов"""
+        paths = [str(p) for p in paths]
+        workers = self.app.config.get("SCAN_WORKERS") or os.cpu_count() or 1
+        if workers <= 1 or len(paths) < self.app.config.get("SCAN_POOL_MIN_FILES", 16):
+            yield from map(func, paths, *extra)
+            return
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield from pool.map(func, paths, *extra, chunksize=8)
+
+    def _probe_many(self, paths, hashes=None):
+        """
+        Прогнать mutagen + хеширование + обложки (+ анализ аудио) по файлам.
+        hashes — уже посчитанные sha256 (тот же порядок), чтобы не читать файлы дважды.
+        """
+        probe = partial(
+            _probe_file,
+            artwork_dir=str(self.app.config["ARTWORK_DIR"]),
+            analyze_audio=self.app.config.get("ANALYZE_AUDIO", True),
+            seek_step=self.app.config.get("SEEK_INDEX_STEP", 1.0)
         )
-        db.session.add(t)
+        return self._map_files(probe, paths, hashes or [None] * len(paths))
+
+    def seek_index(self, track, build=False):
+        """
+        SeekIndex файла трека или None. Для файлов, импортированных до появления
+        индекса или изменённых после скана, индекс строится задачей
+        build_seek_index, а не в запросе (полный проход по кадрам);
+        build=True — построить сразу. Сохраняется, только если файл совпадает
+        с записью media_files; b"" — файл проверен, индекса у него нет.
+        """
+        path, mf, fresh = self._seek_index_row(track)
+        if fresh and mf.seek_index is not None:
+            return SeekIndex.from_bytes(mf.seek_index) if mf.seek_index else None
+        if path is None or not path.name.lower().endswith(".mp3"):
+            return None
+        if not build:
+            self.app.jobs.enqueue("build_seek_index", dedupe=True, track_id=track.id)
+            return None
+        data = _build_seek_index(path, self.app.config.get("SEEK_INDEX_STEP") or 1.0)
+        if fresh:
+            mf.seek_index = data or b""
+            db.session.commit()
+        return SeekIndex.from_bytes(data) if data else None
+
+    def seek_index_pending(self, track):
+        """True — у MP3 трека индекса перемотки ещё нет (его строит build_seek_index)"""
+        path, mf, fresh = self._seek_index_row(track)
+        if path is None or not path.name.lower().endswith(".mp3"):
+            return False
+        return not fresh or mf.seek_index is None
+
+    def _seek_index_row(self, track):
+        """(путь, строка media_files, совпадает ли она с файлом); путь None — файла нет"""
+        path = self.media_path(track)
+        mf = MediaFile.query.filter_by(path=path.name).first()
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None, mf, False
+        return path, mf, mf is not None and mf.matches(st)
+
+    def build_seek_index(self, track_id, on_progress=None):
+        """Задача build_seek_index: индекс перемотки для файла, у которого его нет"""
+        track = db.session.get(Track, track_id)
+        if track is not None:
+            self.seek_index(track, build=True)
+
+    def locate(self, track, seconds):
+        """
+        (байтовое смещение, время начала кадра, SeekIndex) для момента seconds
+        или None. Пока индекса нет — оценка по среднему битрейту (index=None),
+        сам индекс строится в фоне.
+        """
+        path = self.media_path(track)
+        index = self.seek_index(track)
+        with open(path, "rb") as f:
+            if index is not None:
+                return (*index.locate(f, seconds), index)
+            if not path.name.lower().endswith(".mp3"):
+                return None
+            found = estimate_offset(f, seconds, track.duration or 0)
+        return (*found, None) if found else None
+
+    def analyze_missing(self, on_progress=None):
+        """
+        Посчитать волну и громкость для треков, у которых анализа ещё нет.
+        Пустые строки без декодера (от прежних версий) тоже пересчитываются.
+        """
+        batch_size = self.app.config.get("SCAN_BATCH_SIZE", 500)
+        rows = db.session.query(Track.id, Track.media)\
+            .outerjoin(TrackAnalysis, TrackAnalysis.track_id == Track.id)\
+            .filter(or_(TrackAnalysis.track_id.is_(None), TrackAnalysis.decoder.is_(None))).all()
+        by_path = {}
+        for track_id, media in rows:
+            path = self.media_dir / Path(media).name
+            if path.is_file():
+                by_path[str(path)] = track_id
+
+        done = analyzed = 0
+        for done, (path, fields) in enumerate(self._map_files(_analyze_file, list(by_path)), 1):
+            if fields is not None:
+                db.session.merge(TrackAnalysis(track_id=by_path[path], analyzed_at=datetime.utcnow(), **fields))
+                analyzed += 1
+            if done % batch_size == 0:
+                db.session.commit()
+            if on_progress:
+                on_progress(done, len(by_path))
         db.session.commit()
-        return t.to_dict()
+        return analyzed
+
+    def _duplicate_policy(self):
+        policy = self.app.config.get("DUPLICATE_POLICY", "link")
+        return policy if policy in DUPLICATE_POLICIES else "link"
+
+    def _track_by_hash(self, content_hash, exclude_id=None):
+        """Трек с таким содержимым (уникальный индекс по tracks.content_hash)"""
+        if not content_hash:
+            return None
+        q = Track.query.filter_by(content_hash=content_hash)
+        if exclude_id is not None:
+            q = q.filter(Track.id != exclude_id)
+        return q.first()
 
+    def _move_track_file(self, track, dest, st=None):
+        """Перевести трек на файл dest с тем же содержимым; прежний файл удаляется"""
+        old = self.media_path(track)
+        old_mf = MediaFile.query.filter_by(path=old.name).first()
+        if old != dest:
+            old.unlink(missing_ok=True)
+        st = st or dest.stat()
+        mf = MediaFile.query.filter_by(path=dest.name).first()
+        if mf is None:
+            mf = MediaFile(path=dest.name)
+            db.session.add(mf)
+        mf.size = st.st_size
+        mf.mtime_ns = st.st_mtime_ns
+        mf.inode = st.st_ino
+        mf.content_hash = track.content_hash
+        mf.seek_index = old_mf.seek_index if old_mf is not None else None
+        mf.track_id = track.id
+        mf.scanned_at = datetime.utcnow()
+        if old_mf is not None and old_mf is not mf:
+            db.session.delete(old_mf)
+        track.media = f"/static/media/{dest.name}"
 
-    def add_tracks_from_files(self, file_storages):
+    def _index_duplicate(self, name, st, content_hash, existing, index, summary):
         """
-        Принимает список werkzeug FileStorage (input multiple),
-        сохраняет файлы в media_dir и добавляет записи в БД.
-        Возвращает список добавленных Track.to_dict().
+        Файл в MEDIA_DIR с содержимым уже известного трека. Если файл трека
+        пропал (переименование) — трек переезжает на новый файл; иначе файл
+        заносится в индекс без нового трека (link и replace — со ссылкой на
+        существующий), чтобы не пробовать его снова. Файлы, положенные
+        в MEDIA_DIR пользователем, скан не удаляет: replace — только для загрузок.
         """
-        allowed_ext = (".mp3", ".ogg", ".wav", ".m4a")
-        added = []
-        for fs in file_storages:
-            if not fs or not fs.filename:
+        policy = self._duplicate_policy()
+        if existing is not None and not self.media_path(existing).exists():
+            self._move_track_file(existing, self.media_dir / name, st)
+            summary["relinked"] += 1
+            return
+        mf = index.get(name)
+        if mf is None:
+            mf = MediaFile(path=name)
+            db.session.add(mf)
+        mf.size = st.st_size
+        mf.mtime_ns = st.st_mtime_ns
+        mf.inode = st.st_ino
+        mf.content_hash = content_hash
+        mf.track_id = existing.id if existing is not None and policy != "skip" else None
+        mf.scanned_at = datetime.utcnow()
+        summary["duplicates"] += 1
+
+    def scan_and_sync_db(self, paths=None, prune=False, on_progress=None):
+        """
+        Инкрементальное сканирование MEDIA_DIR.
+        Сравнивает (size, mtime, inode) с индексом media_files и пробует
+        mutagen-ом только новые/изменённые файлы. paths — ограничить
+        сканирование конкретными файлами (например, из watcher-а).
+        prune — после полного скана удалить треки без файлов (prune_missing).
+        """
+        started = time.monotonic()
+        batch_size = self.app.config.get("SCAN_BATCH_SIZE", 500)
+        stats = self._stat_media_files(paths)
+
+        index_q = MediaFile.query
+        if paths is not None:
+            index_q = index_q.filter(MediaFile.path.in_(list(stats) or [""]))
+        index = {mf.path: mf for mf in index_q.all()}
+
+        changed = [name for name, st in stats.items()
+                   if name not in index or not index[name].matches(st)]
+
+        # треки без записи в индексе (например, до первого инкрементального скана)
+        unindexed = [f"/static/media/{name}" for name in changed if name not in index]
+        track_ids = {}
+        for chunk_start in range(0, len(unindexed), 900):
+            chunk = unindexed[chunk_start:chunk_start + 900]
+            track_ids.update(
+                (media, tid) for tid, media in
+                db.session.query(Track.id, Track.media).filter(Track.media.in_(chunk))
+            )
+
+        summary = {
+            "found_files": len(stats),
+            "added": 0,
+            "updated": 0,
+            "unchanged": len(stats) - len(changed),
+            "removed": 0,
+            "missing": 0,
+            "removed_tracks": 0,
+            "relinked": 0,
+            "duplicates": 0,
+        }
+
+        # файлы без трека сначала только хешируются: переименованный или
+        # скопированный файл узнаётся по содержимому без mutagen-а и анализа
+        candidates = [name for name in changed if name not in index or index[name].track_id is None]
+        hashes = dict(zip(candidates, self._map_files(_try_hash, [self.media_dir / n for n in candidates])))
+        seen = set()
+        probe_names = []
+        for name in changed:
+            content_hash = hashes.get(name)
+            if content_hash is None:
+                probe_names.append(name)
                 continue
-            name = secure_filename(fs.filename)
-            if not name:
+            existing = self._track_by_hash(content_hash)
+            web_path = f"/static/media/{name}"
+            if content_hash in seen or (existing is not None and existing.media != web_path):
+                self._index_duplicate(name, stats[name], content_hash, existing, index, summary)
                 continue
-            if not name.lower().endswith(allowed_ext):
-                # пропускаем не-аудио
+            seen.add(content_hash)
+            probe_names.append(name)
+
+        pending = 0
+        probe_paths = [self.media_dir / name for name in probe_names]
+        probe_hashes = [hashes.get(name) for name in probe_names]
+        for done, (name, meta, content_hash) in enumerate(self._probe_many(probe_paths, probe_hashes), 1):
+            st = stats[name]
+            web_path = f"/static/media/{name}"
+            mf = index.get(name)
+            if mf is None:
+                mf = MediaFile(path=name, track_id=track_ids.get(web_path))
+                db.session.add(mf)
+            mf.size = st.st_size
+            mf.mtime_ns = st.st_mtime_ns
+            mf.inode = st.st_ino
+            mf.content_hash = content_hash
+            mf.seek_index = meta["seek_index"]
+            mf.scanned_at = datetime.utcnow()
+            fields = self._track_fields(name, meta)
+            if mf.track_id is None:
+                t = Track(cover="🎵", media=web_path, content_hash=content_hash, **fields)
+                if meta["analysis"]:
+                    t.analysis = TrackAnalysis(**meta["analysis"])
+                db.session.add(t)
+                db.session.flush()
+                mf.track_id = t.id
+                summary["added"] += 1
+            else:
+                if meta["analysis"]:
+                    db.session.merge(TrackAnalysis(track_id=mf.track_id, analyzed_at=datetime.utcnow(),
+                                                   **meta["analysis"]))
+                # файл изменился (перетегирован): обновляем то, что есть в тегах
+                changes = {"duration": meta["duration"], "artwork": meta["artwork"]}
+                if not self._track_by_hash(content_hash, exclude_id=mf.track_id):
+                    changes["content_hash"] = content_hash
+                changes.update((f, fields[f]) for f in ("title", "artist", "album", "year",
+                                                        "genre", "track_number", "lyrics") if meta[f])
+                db.session.query(Track).filter_by(id=mf.track_id).update(
+                    changes, synchronize_session=False
+                )
+                summary["updated"] += 1
+
+            pending += 1
+            if pending >= batch_size:
+                db.session.commit()
+                pending = 0
+            if on_progress:
+                on_progress(done, len(probe_names))
+
+        # файлы, пропавшие с диска: только индекс, треки остаются
+        gone = set(index) - set(stats) if paths is None else \
+            {Path(p).name for p in paths} - set(stats)
+        if gone:
+            summary["removed"], summary["missing"] = self._forget_gone(sorted(gone))
+        db.session.commit()
+
+        if prune and paths is None:
+            summary["removed_tracks"] = self.prune_missing()
+
+        # полный скан заодно догоняет анализ треков, добавленных до его появления
+        if paths is None and self.app.config.get("ANALYZE_AUDIO", True):
+            summary["analyzed"] = self.analyze_missing()
+
+        summary["elapsed"] = round(time.monotonic() - started, 3)
+        return summary
+
+    def _forget_gone(self, names):
+        """
+        Убрать из индекса пропавшие файлы. Треки при скане не удаляются:
+        файл мог быть переименован (новое имя придёт следующим событием),
+        а том — отмонтирован; удаление треков — только prune_missing.
+        Трек, у которого в MEDIA_DIR есть копия (дубликат по sha256), переезжает
+        на неё. Возвращает (записей индекса удалено, треков осталось без файла).
+        """
+        removed = missing = 0
+        for i in range(0, len(names), 900):
+            chunk = names[i:i + 900]
+            track_ids = [tid for (tid,) in db.session.query(MediaFile.track_id)
+                         .filter(MediaFile.path.in_(chunk), MediaFile.track_id.isnot(None))]
+            removed += MediaFile.query.filter(MediaFile.path.in_(chunk)).delete(synchronize_session=False)
+            if not track_ids:
                 continue
-            base = Path(name).stem
-            ext = Path(name).suffix
-            dest = self.media_dir / (base + ext)
-            i = 0
-            while dest.exists():
-                i += 1
-                dest = self.media_dir / f"{base}-{i}{ext}"
-            fs.save(dest)
-            duration = self._get_duration(dest)
-            title = self._slug_to_title(dest.name)
-            t = Track(
-                title=title,
-                artist="Unknown",
-                album="",
-                duration=duration,
-                cover="🎵",
-                media=f"/static/media/{dest.name}"
-            )
-            db.session.add(t)
-            added.append(t)
-        if added:
+            # трек, уже перепривязанный к другому файлу (переименование), не трогаем
+            tracks = Track.query.filter(
+                Track.id.in_(track_ids), Track.media.in_([f"/static/media/{n}" for n in chunk])
+            ).all()
+            missing += len(tracks) - len(self._relink_to_copies(tracks))
+        return removed, missing
+
+    def _relink_to_copies(self, tracks):
+        """Перевести треки без файла на копию в MEDIA_DIR с тем же sha256; id переведённых"""
+        by_hash = {t.content_hash: t for t in tracks if t.content_hash}
+        relinked = set()
+        for mf in MediaFile.query.filter(MediaFile.content_hash.in_(list(by_hash) or [""])):
+            track = by_hash.get(mf.content_hash)
+            if track is not None and track.id not in relinked and (self.media_dir / mf.path).is_file():
+                track.media = f"/static/media/{mf.path}"
+                mf.track_id = track.id
+                relinked.add(track.id)
+        return relinked
+
+    def prune_missing(self):
+        """
+        Удалить треки, файлов которых нет в MEDIA_DIR, — как удаление из
+        админки: с историей, лайками и местами в плейлистах. Необратимо,
+        поэтому только по явному запросу администратора (rescan с prune=True),
+        после того как полный скан проиндексировал и перепривязал новые файлы.
+        """
+        rows = db.session.query(Track.id, Track.media).all()
+        gone = [tid for tid, media in rows if not (self.media_dir / Path(media).name).is_file()]
+        removed = 0
+        for ids in (gone[i:i + 900] for i in range(0, len(gone), 900)):
+            tracks = Track.query.filter(Track.id.in_(ids)).all()
+            relinked = self._relink_to_copies(tracks)
+            orphans = [t for t in tracks if t.id not in relinked]
+            orphan_ids = [t.id for t in orphans] or [0]
+            MediaFile.query.filter(MediaFile.track_id.in_(orphan_ids))\
+                .update({"track_id": None}, synchronize_session=False)
+            # через ORM — чтобы счётчики профиля (user_stats) уменьшились
+            for like in LikedTrack.query.filter(LikedTrack.track_id.in_(orphan_ids)):
+                db.session.delete(like)
+            for track in orphans:
+                db.session.delete(track)
             db.session.commit()
-        return [t.to_dict() for t in added]
+            removed += len(orphans)
+        return removed
+
+    def _unique_dest(self, safe_name):
+        """Путь в media_dir без перезаписи существующих файлов: name, name-1, ..."""
+        base = Path(safe_name).stem
+        ext = Path(safe_name).suffix or ".mp3"
+        dest = self.media_dir / (base + ext)
+        i = 0
+        while dest.exists():
+            i += 1
+            dest = self.media_dir / f"{base}-{i}{ext}"
+        return dest
+
+    def _spool(self, stream, suffix=""):
+        """Записать поток во временный файл, считая sha256 по ходу записи"""
+        spool_dir = Path(self.app.config["UPLOAD_SPOOL_DIR"])
+        spool_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix=suffix, dir=spool_dir)
+        with os.fdopen(fd, "wb") as out:
+            content_hash = _copy_hashing(stream, out)
+        return Path(tmp), content_hash
+
+    def spool_upload(self, file_storage, suffix=""):
+        """Сохранить загрузку во временный файл на диске (потоково, без чтения в память)"""
+        return self._spool(file_storage.stream, suffix)[0]
+
+    def spool_uploads(self, file_storages):
+        """Сохранить загрузки во временный каталог: [(путь, исходное имя, sha256), ...] для import_files"""
+        result = []
+        for fs in file_storages:
+            if fs and fs.filename:
+                path, content_hash = self._spool(fs.stream)
+                result.append((str(path), fs.filename, content_hash))
+        return result
 
-    def add_tracks_from_zip(self, file_storage):
+    def import_zip(self, zip_path, on_progress=None, remove=True):
         """
-        Принимает Zip (FileStorage), извлекает аудиофайлы в media_dir,
-        добавляет записи в БД и возвращает список добавленных записей.
+        Импорт аудиофайлов из zip-архива на диске.
+        Файлы извлекаются кусками (память не зависит от размера архива)
+        с подсчётом sha256 на лету, дубликаты обрабатываются по DUPLICATE_POLICY,
+        метаданные пробуются в пуле процессов, треки коммитятся пачками.
+        remove=True — удалить архив после импорта.
         """
-        allowed_ext = (".mp3", ".ogg", ".wav", ".m4a")
-        added = []
-        # читаем zip в память (упрощённо)
-        data = file_storage.read()
-        bio = io.BytesIO(data)
+        started = time.monotonic()
+        extracted = []
+        skipped = 0
         try:
-            with zipfile.ZipFile(bio) as z:
+            with zipfile.ZipFile(zip_path) as z:
                 for member in z.infolist():
                     if member.is_dir():
                         continue
                     name = Path(member.filename).name  # убираем поддиректории
-                    if not name:
-                        continue
-                    if not name.lower().endswith(allowed_ext):
-                        continue
-                    safe = secure_filename(name)
+                    safe = secure_filename(name) if name.lower().endswith(AUDIO_EXTENSIONS) else ""
                     if not safe:
+                        skipped += 1
                         continue
-                    base = Path(safe).stem
-                    ext = Path(safe).suffix or ".mp3"
-                    dest = self.media_dir / (base + ext)
-                    i = 0
-                    while dest.exists():
-                        i += 1
-                        dest = self.media_dir / f"{base}-{i}{ext}"
-                    with z.open(member) as member_file, open(dest, "wb") as out_f:
-                        out_f.write(member_file.read())
-                    duration = self._get_duration(dest)
-                    title = self._slug_to_title(dest.name)
-                    t = Track(
-                        title=title,
-                        artist="Unknown",
-                        album="",
-                        duration=duration,
-                        cover="🎵",
-                        media=f"/static/media/{dest.name}"
-                    )
-                    db.session.add(t)
-                    added.append(t)
-                if added:
-                    db.session.commit()
-        except zipfile.BadZipFile:
-            # плохой zip — ничего не делаем
-            return []
-        return [t.to_dict() for t in added]
\ No newline at end of file
+                    with z.open(member) as member_file:
+                        path, content_hash = self._spool(member_file)
+                    extracted.append((path, safe, content_hash))
+        finally:
+            if remove:
+                Path(zip_path).unlink(missing_ok=True)
+
+        summary = self._import_spooled(extracted, on_progress)
+        summary["skipped"] = skipped
+        summary["elapsed"] = round(time.monotonic() - started, 3)
+        return summary
+
+    def import_files(self, files, on_progress=None):
+        """
+        Перенести загруженные файлы из spool-каталога в media_dir и добавить треки.
+        files — список (путь во временном каталоге, исходное имя файла[, sha256]).
+        """
+        started = time.monotonic()
+        accepted = []
+        skipped = 0
+        for spool_path, filename, *rest in files:
+            safe = secure_filename(filename or "")
+            if not safe or not safe.lower().endswith(AUDIO_EXTENSIONS):
+                Path(spool_path).unlink(missing_ok=True)
+                skipped += 1
+                continue
+            # задачи из очереди до появления хешей приходят без sha256
+            accepted.append((Path(spool_path), safe, rest[0] if rest else _try_hash(spool_path)))
+
+        summary = self._import_spooled(accepted, on_progress)
+        summary["skipped"] = skipped
+        summary["elapsed"] = round(time.monotonic() - started, 3)
+        return summary
+
+    def _duplicate_action(self, content_hash, seen):
+        """
+        new — новый файл; skip/link/replace — дубликат трека (по DUPLICATE_POLICY).
+        Если файл существующего трека пропал с диска, дубликат его заменяет.
+        """
+        if content_hash in seen:
+            return "skip", None  # тот же файл дважды в одной загрузке
+        existing = self._track_by_hash(content_hash)
+        if content_hash:
+            seen.add(content_hash)
+        if existing is None:
+            return "new", None
+        if not self.media_path(existing).exists():
+            return "replace", existing
+        return self._duplicate_policy(), existing
+
+    def _import_spooled(self, items, on_progress=None):
+        """
+        Перенести файлы (путь во временном каталоге, безопасное имя, sha256)
+        в media_dir. Дубликаты определяются по tracks.content_hash до переноса:
+        skip — файл отбрасывается, link — отбрасывается, но id существующего
+        трека попадает в track_ids, replace — трек переезжает на новый файл.
+        """
+        summary = {"duplicates": 0, "linked": 0, "replaced": 0}
+        known_ids = []
+        new_paths = []
+        new_hashes = []
+        seen = set()
+        for spool_path, safe, content_hash in items:
+            action, existing = self._duplicate_action(content_hash, seen)
+            if action in ("skip", "link"):
+                Path(spool_path).unlink(missing_ok=True)
+                if action == "link":
+                    known_ids.append(existing.id)
+                    summary["linked"] += 1
+                else:
+                    summary["duplicates"] += 1
+                continue
+            dest = self._unique_dest(safe)
+            shutil.move(spool_path, dest)
+            if action == "replace":
+                self._move_track_file(existing, dest)
+                known_ids.append(existing.id)
+                summary["replaced"] += 1
+            else:
+                new_paths.append(dest)
+                new_hashes.append(content_hash)
+        db.session.commit()
+
+        summary.update(self._register_files(new_paths, on_progress, new_hashes))
+        summary["track_ids"] = known_ids + summary["track_ids"]
+        return summary
+
+    def _register_files(self, paths, on_progress=None, hashes=None):
+        """Добавить треки для новых файлов в media_dir: пробуем пулом, коммитим пачками"""
+        batch_size = self.app.config.get("SCAN_BATCH_SIZE", 500)
+        added = 0
+        track_ids = []
+        pending = []
+        for done, (name, meta, content_hash) in enumerate(self._probe_many(paths, hashes), 1):
+            st = (self.media_dir / name).stat()
+            t = Track(cover="🎵", media=f"/static/media/{name}", content_hash=content_hash,
+                      **self._track_fields(name, meta))
+            if meta["analysis"]:
+                t.analysis = TrackAnalysis(**meta["analysis"])
+            # сразу заносим в индекс, чтобы следующий rescan не пробовал файл повторно
+            db.session.add(MediaFile(
+                path=name,
+                size=st.st_size,
+                mtime_ns=st.st_mtime_ns,
+                inode=st.st_ino,
+                content_hash=content_hash,
+                seek_index=meta["seek_index"],
+                scanned_at=datetime.utcnow(),
+                track=t
+            ))
+            pending.append(t)
+            added += 1
+            if len(pending) >= batch_size:
+                db.session.commit()
+                track_ids.extend(t.id for t in pending)
+                pending = []
+            if on_progress:
+                on_progress(done, len(paths))
+        db.session.commit()
+        track_ids.extend(t.id for t in pending)
+        return {"added": added, "track_ids": track_ids}
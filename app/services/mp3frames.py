@@ -0,0 +1,234 @@
+"""
+Разбор MPEG audio (Layer II/III) по заголовкам кадров — без декодирования.
+Даёт байтовые смещения кадров: по ним режутся HLS-сегменты и строится
+индекс перемотки (время -> байт).
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+# kbps по (MPEG1?, layer)
+_BITRATES = {
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Гц по версии: 3 — MPEG1, 2 — MPEG2, 0 — MPEG2.5
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+_SYNC_WINDOW = 64 * 1024  # сколько читать в поисках кадра при оценке по битрейту
+
+
+def parse_header(b):
+    """4 байта заголовка -> (длина кадра, sample_rate, отсчётов в кадре) или None"""
+    if len(b) < 4 or b[0] != 0xFF or (b[1] & 0xE0) != 0xE0:
+        return None
+    version = (b[1] >> 3) & 3
+    layer = 4 - ((b[1] >> 1) & 3)  # 1, 2, 3; 4 — зарезервировано
+    bitrate_idx = b[2] >> 4
+    rate_idx = (b[2] >> 2) & 3
+    if version == 1 or layer not in (2, 3) or bitrate_idx in (0, 15) or rate_idx == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_idx] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_idx]
+    padding = (b[2] >> 1) & 1
+    if layer == 3 and not mpeg1:
+        samples = 576
+        length = 72 * bitrate // sample_rate + padding
+    else:
+        samples = 1152
+        length = 144 * bitrate // sample_rate + padding
+    return length, sample_rate, samples
+
+
+def _id3v2_size(head):
+    if head[:3] != b"ID3" or len(head) < 10:
+        return 0
+    size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+    footer = 10 if head[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _is_info_frame(data, pos, b1, b3):
+    """Первый кадр Xing/Info/VBRI — служебный, аудио в нём нет"""
+    mpeg1 = (b1 >> 3) & 3 == 3
+    mono = (b3 >> 6) == 3
+    side = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    tag = data[pos + 4 + side:pos + 8 + side]
+    return tag in (b"Xing", b"Info") or data[pos + 36:pos + 40] == b"VBRI"
+
+
+class FrameIndex:
+    """Смещения кадров файла; длительность кадра постоянна (samples / sample_rate)"""
+
+    def __init__(self, sample_rate, samples_per_frame, offsets, end):
+        self.sample_rate = sample_rate
+        self.samples_per_frame = samples_per_frame
+        self.offsets = offsets  # array('Q') начала кадров
+        self.end = end  # байт после последнего кадра
+
+    @property
+    def frame_duration(self):
+        return self.samples_per_frame / self.sample_rate
+
+    @property
+    def duration(self):
+        return len(self.offsets) * self.frame_duration
+
+    def frame_at(self, seconds):
+        """Номер кадра, содержащего момент seconds"""
+        n = int(seconds / self.frame_duration)
+        return max(0, min(n, len(self.offsets) - 1))
+
+    def byte_range(self, first, last):
+        """Байты кадров [first, last)"""
+        start = self.offsets[first]
+        end = self.offsets[last] if last < len(self.offsets) else self.end
+        return start, end
+
+
+class SeekIndex:
+    """
+    Компактный индекс перемотки: смещение каждого frames_per_entry-го кадра
+    (примерно раз в step секунд). Точный кадр находится дочитыванием одного
+    небольшого участка файла между соседними точками индекса, поэтому
+    перемотка точна и для VBR без Xing TOC.
+    """
+
+    _HEADER = struct.Struct("<IHHIQ")  # sample_rate, samples, frames/entry, кадров, end
+
+    def __init__(self, sample_rate, samples_per_frame, frames_per_entry, frame_count, end, offsets):
+        self.sample_rate = sample_rate
+        self.samples_per_frame = samples_per_frame
+        self.frames_per_entry = frames_per_entry
+        self.frame_count = frame_count
+        self.end = end
+        self.offsets = offsets  # array('Q'), как у FrameIndex — файлы больше 4 ГБ
+
+    @classmethod
+    def from_frames(cls, index, step=1.0):
+        per_entry = max(1, round(step / index.frame_duration))
+        return cls(index.sample_rate, index.samples_per_frame, per_entry, len(index.offsets),
+                   index.end, index.offsets[::per_entry])
+
+    @property
+    def frame_duration(self):
+        return self.samples_per_frame / self.sample_rate
+
+    @property
+    def duration(self):
+        return self.frame_count * self.frame_duration
+
+    def to_bytes(self):
+        offsets = array("Q", self.offsets)
+        if sys.byteorder == "big":
+            offsets.byteswap()
+        return self._HEADER.pack(self.sample_rate, self.samples_per_frame, self.frames_per_entry,
+                                 self.frame_count, self.end) + offsets.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        header = cls._HEADER.unpack_from(data)
+        body = data[cls._HEADER.size:]
+        # индексы, сохранённые до перехода на 'Q', хранят смещения по 4 байта
+        entries = -(-header[3] // header[2])
+        offsets = array("I" if len(body) == entries * 4 else "Q")
+        offsets.frombytes(body)
+        if sys.byteorder == "big":
+            offsets.byteswap()
+        return cls(*header, array("Q", offsets))
+
+    def locate(self, f, seconds):
+        """
+        (байтовое смещение, точное время начала кадра) для момента seconds.
+        f — открытый файл; читается только участок до следующей точки индекса.
+        """
+        # допуск — чтобы время, возвращённое locate, снова указывало на тот же кадр
+        frame = max(0, min(int(seconds / self.frame_duration + 1e-3), self.frame_count - 1))
+        entry = frame // self.frames_per_entry
+        pos = self.offsets[entry]
+        skip = frame - entry * self.frames_per_entry
+        if skip:
+            limit = self.offsets[entry + 1] if entry + 1 < len(self.offsets) else self.end
+            f.seek(pos)
+            span = f.read(limit - pos)
+            at = walked = 0
+            while walked < skip:
+                parsed = parse_header(span[at:at + 4])
+                if parsed is None:
+                    break  # индекс устарел — отдаём с последнего найденного кадра
+                at += parsed[0]
+                walked += 1
+            pos += at
+            frame -= skip - walked
+        return pos, round(frame * self.frame_duration, 6)
+
+
+def estimate_offset(f, seconds, duration):
+    """
+    (байтовое смещение, время) кадра около момента seconds по среднему битрейту,
+    без скана всего файла: для CBR — с точностью до кадра, для VBR — приблизительно.
+    duration — длительность файла в секундах. None — кадр не найден.
+    """
+    size = os.fstat(f.fileno()).st_size
+    f.seek(0)
+    start = _id3v2_size(f.read(10))
+    if duration <= 0 or seconds >= duration or size <= start:
+        return None
+    pos = start + int((size - start) * seconds / duration)
+    f.seek(pos)
+    window = f.read(_SYNC_WINDOW)
+    at = window.find(b"\xff")
+    while at >= 0:
+        parsed = parse_header(window[at:at + 4])
+        # как и в scan_frames: кадр настоящий, если за ним следует ещё один заголовок
+        if parsed and parse_header(window[at + parsed[0]:at + parsed[0] + 4]):
+            pos += at
+            return pos, round((pos - start) / (size - start) * duration, 3)
+        at = window.find(b"\xff", at + 1)
+    return None
+
+
+def scan_frames(path):
+    """Построить FrameIndex по заголовкам кадров. None — не MPEG audio"""
+    with open(path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # пустой файл
+            return None
+        with data:
+            size = len(data)
+            pos = _id3v2_size(data[:10])
+            offsets = array("Q")
+            sample_rate = samples = None
+            end = pos
+            first = True
+            while pos + 4 <= size:
+                head = data[pos:pos + 4]
+                parsed = parse_header(head)
+                # кадр валиден, если за ним следует ещё один заголовок (или конец файла)
+                if parsed and pos + parsed[0] <= size:
+                    nxt = pos + parsed[0]
+                    if nxt + 4 > size or parse_header(data[nxt:nxt + 4]) or data[nxt:nxt + 3] in (b"TAG", b"APE"):
+                        length, rate, spf = parsed
+                        if sample_rate is None:
+                            sample_rate, samples = rate, spf
+                        if rate == sample_rate:
+                            if not (first and _is_info_frame(data, pos, head[1], head[3])):
+                                offsets.append(pos)
+                            first = False
+                            pos = end = nxt
+                            continue
+                if data[pos:pos + 3] in (b"TAG", b"APE") and offsets:
+                    break  # ID3v1 / APEv2 в конце файла
+                # потеряли синхронизацию — ищем следующий 0xFF
+                nxt = data.find(b"\xff", pos + 1)
+                if nxt < 0:
+                    break
+                pos = nxt
+    if not offsets:
+        return None
+    return FrameIndex(sample_rate, samples, offsets, end)
@@ -0,0 +1,189 @@
+import os
+import uuid
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from sqlalchemy import bindparam, func
+from ..models import Track, ListeningHistory, PlayEventBatch
+from .. import db
+
+
+class PlayEventBuffer:
+    """
+    Write-behind буфер воспроизведений.
+    /play только дописывает событие в локальный SQLite-файл (WAL) — он общий
+    для всех воркеров gunicorn и переживает перезапуск. Фоновый поток
+    сливает события в основную БД пачками: plays = plays + n одним
+    UPDATE на трек, bulk-вставка ListeningHistory и свёртки для чартов.
+    В той же транзакции записывается claim пачки (play_event_batches):
+    если процесс упал между коммитом и очисткой буфера, повторный слив
+    видит отметку и только удаляет пачку — счётчики не удваиваются.
+    """
+
+    STALE_CLAIM_SECONDS = 300
+    BATCH_RETENTION_SECONDS = 86400  # отметки слитых пачек (play_event_batches)
+
+    def __init__(self, app):
+        self.app = app
+        self.path = Path(app.config["PLAY_EVENTS_DB"])
+        self.flush_interval = app.config.get("PLAY_FLUSH_INTERVAL", 5.0)
+        self.flush_size = app.config.get("PLAY_FLUSH_SIZE", 500)
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._pending = 0
+        self._pid = None
+        self._thread = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS play_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                track_id INTEGER NOT NULL,
+                user_id INTEGER,
+                played_at TEXT NOT NULL,
+                claim TEXT,
+                claimed_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS ix_play_events_claim ON play_events (claim);
+        """)
+
+    def _conn(self):
+        # соединение на поток и на процесс (после fork старое использовать нельзя)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def start(self):
+        """Запустить фоновый поток слива (по одному на процесс)"""
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="play-events-flusher", daemon=True)
+        self._thread.start()
+
+    def record(self, track_id, user_id=None):
+        """Записать воспроизведение в буфер (без обращения к основной БД)"""
+        self._conn().execute(
+            "INSERT INTO play_events (track_id, user_id, played_at) VALUES (?, ?, ?)",
+            (track_id, user_id, datetime.utcnow().isoformat())
+        )
+        # процесс мог быть форкнут после start() — поток нужно поднять заново
+        if self._pid != os.getpid():
+            self.start()
+        self._pending += 1
+        if self._pending >= self.flush_size:
+            self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._pending = 0
+            try:
+                with self.app.app_context():
+                    while self.flush() >= self.flush_size:
+                        pass
+            except Exception as e:
+                self.app.logger.warning(f"Play events flush failed: {e}")
+
+    def _claim(self, limit):
+        """
+        Забрать пачку событий под уникальный claim (несколько воркеров не сольют
+        её дважды). Пачку, брошенную упавшим процессом, забираем первой и с
+        тем же claim — по нему видно, успела ли она попасть в БД.
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            stale = conn.execute(
+                "SELECT claim FROM play_events WHERE claim IS NOT NULL AND claimed_at < ? LIMIT 1",
+                (now - self.STALE_CLAIM_SECONDS,)
+            ).fetchone()
+            if stale:
+                claim = stale[0]
+                conn.execute("UPDATE play_events SET claimed_at = ? WHERE claim = ?", (now, claim))
+            else:
+                claim = uuid.uuid4().hex
+                conn.execute(
+                    "UPDATE play_events SET claim = ?, claimed_at = ? WHERE id IN "
+                    "(SELECT id FROM play_events WHERE claim IS NULL ORDER BY id LIMIT ?)",
+                    (claim, now, limit)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        rows = conn.execute(
+            "SELECT track_id, user_id, played_at FROM play_events WHERE claim = ?", (claim,)
+        ).fetchall()
+        return claim, rows
+
+    def _apply(self, claim, rows):
+        """Записать пачку в основную БД вместе с отметкой claim (одна транзакция)"""
+        counts = Counter(track_id for track_id, _, _ in rows)
+        # события по удалённым/несуществующим трекам отбрасываем
+        known = {tid for (tid,) in db.session.query(Track.id).filter(Track.id.in_(list(counts)))}
+
+        tracks = Track.__table__
+        if known:
+            db.session.execute(
+                tracks.update()
+                .where(tracks.c.id == bindparam("tid"))
+                .values(plays=func.coalesce(tracks.c.plays, 0) + bindparam("n"))
+                .execution_options(cache_tags=("plays",)),  # см. TABLE_TAGS в app/cache.py
+                [{"tid": tid, "n": n} for tid, n in counts.items() if tid in known]
+            )
+        history = [
+            {"user_id": user_id, "track_id": track_id, "played_at": datetime.fromisoformat(played_at)}
+            for track_id, user_id, played_at in rows
+            if user_id and track_id in known
+        ]
+        if history:
+            db.session.execute(ListeningHistory.__table__.insert(), history)
+            self.app.history.record([(row["user_id"], row["track_id"]) for row in history])
+        self.app.trending.record([
+            (track_id, datetime.fromisoformat(played_at))
+            for track_id, _, played_at in rows if track_id in known
+        ])
+        now = datetime.utcnow()
+        db.session.add(PlayEventBatch(claim=claim, flushed_at=now))
+        # старые отметки не нужны, если их пачек уже нет в буфере
+        in_spool = [c for (c,) in self._conn().execute(
+            "SELECT DISTINCT claim FROM play_events WHERE claim IS NOT NULL"
+        )]
+        PlayEventBatch.query.filter(
+            PlayEventBatch.flushed_at < now - timedelta(seconds=self.BATCH_RETENTION_SECONDS),
+            PlayEventBatch.claim.notin_(in_spool)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+    def flush(self, limit=None):
+        """Слить пачку событий в основную БД. Возвращает число обработанных событий"""
+        claim, rows = self._claim(limit or self.flush_size)
+        if not rows:
+            return 0
+        conn = self._conn()
+        # пачка уже в БД (процесс упал до удаления из буфера) — только убрать её
+        if db.session.get(PlayEventBatch, claim) is None:
+            try:
+                self._apply(claim, rows)
+            except Exception:
+                db.session.rollback()
+                # конфликт отметки — ту же пачку успел слить другой процесс
+                if db.session.get(PlayEventBatch, claim) is None:
+                    conn.execute("UPDATE play_events SET claim = NULL, claimed_at = NULL WHERE claim = ?", (claim,))
+                    raise
+        conn.execute("DELETE FROM play_events WHERE claim = ?", (claim,))
+        return len(rows)
+
+    def pending(self):
+        """Число ещё не слитых событий"""
+        return self._conn().execute("SELECT COUNT(*) FROM play_events").fetchone()[0]
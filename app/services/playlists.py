@@ -0,0 +1,177 @@
+"""
+Порядок треков в плейлисте: position с шагом POSITION_STEP. Вставка и
+перенос берут середину промежутка между соседями — меняется только
+строка самого трека; когда промежуток исчерпан, позиции плейлиста
+перенумеровываются заново (редко: ~log2(POSITION_STEP) вставок в одно место).
+Функции работают в текущей транзакции, коммитит вызывающий код.
+"""
+from datetime import datetime
+from sqlalchemy import select, func, desc, bindparam
+from ..models import Track, Playlist, playlist_tracks
+from .. import db
+
+POSITION_STEP = 1024
+BULK_LIMIT = 1000  # треков в одном запросе
+_CHUNK = 900  # параметров в одном IN (лимит SQLite)
+
+pt = playlist_tracks.c
+
+
+class PlaylistError(ValueError):
+    """Некорректный запрос к плейлисту; args[0] — код ошибки для API"""
+
+
+def _unique(track_ids):
+    """int-идентификаторы без повторов, порядок сохраняется"""
+    try:
+        ids = list(dict.fromkeys(int(t) for t in track_ids))
+    except (TypeError, ValueError):
+        raise PlaylistError("invalid_track_ids")
+    if not ids:
+        raise PlaylistError("track_ids required")
+    if len(ids) > BULK_LIMIT:
+        raise PlaylistError("too_many_tracks")
+    return ids
+
+
+def _chunks(items):
+    for i in range(0, len(items), _CHUNK):
+        yield items[i:i + _CHUNK]
+
+
+def _in_playlist(playlist_id, track_ids):
+    """Какие из track_ids уже в плейлисте (поиск по первичному ключу)"""
+    found = set()
+    for ids in _chunks(track_ids):
+        found.update(db.session.execute(
+            select(pt.track_id).where(pt.playlist_id == playlist_id, pt.track_id.in_(ids))
+        ).scalars())
+    return found
+
+
+def _bounds(playlist_id, before, after, exclude):
+    """Позиции соседей (lo, hi) места вставки; None — край плейлиста"""
+    base = select(pt.position).where(pt.playlist_id == playlist_id)
+    if exclude:
+        base = base.where(pt.track_id.notin_(exclude))
+    anchor = before if before is not None else after
+    if anchor is None:
+        return db.session.execute(base.order_by(desc(pt.position)).limit(1)).scalar(), None
+    pos = db.session.execute(
+        select(pt.position).where(pt.playlist_id == playlist_id, pt.track_id == anchor)
+    ).scalar()
+    if pos is None:
+        raise PlaylistError("anchor_not_found")
+    if before is not None:
+        lo = db.session.execute(base.where(pt.position < pos).order_by(desc(pt.position)).limit(1)).scalar()
+        return lo, pos
+    hi = db.session.execute(base.where(pt.position > pos).order_by(pt.position).limit(1)).scalar()
+    return pos, hi
+
+
+def _slots(playlist_id, count, before=None, after=None, exclude=()):
+    """count возрастающих позиций на месте вставки; None — промежуток исчерпан"""
+    lo, hi = _bounds(playlist_id, before, after, exclude)
+    if hi is None:
+        start = lo if lo is not None else 0
+        return [start + POSITION_STEP * (i + 1) for i in range(count)]
+    if lo is None:
+        lo = hi - POSITION_STEP * (count + 1)
+    gap = (hi - lo) // (count + 1)
+    if gap < 1:
+        return None
+    return [lo + gap * (i + 1) for i in range(count)]
+
+
+def _renumber(playlist_id):
+    """Заново разложить позиции с шагом POSITION_STEP в текущем порядке"""
+    ids = db.session.execute(
+        select(pt.track_id).where(pt.playlist_id == playlist_id).order_by(pt.position, pt.track_id)
+    ).scalars().all()
+    if ids:
+        db.session.execute(
+            playlist_tracks.update()
+            .where(pt.playlist_id == playlist_id, pt.track_id == bindparam("tid"))
+            .values(position=bindparam("pos")),
+            [{"tid": t, "pos": POSITION_STEP * (i + 1)} for i, t in enumerate(ids)]
+        )
+
+
+def _place(playlist_id, count, before, after, exclude=()):
+    """(позиции, была ли перенумерация)"""
+    positions = _slots(playlist_id, count, before, after, exclude)
+    if positions is not None:
+        return positions, False
+    _renumber(playlist_id)
+    return _slots(playlist_id, count, before, after, exclude), True
+
+
+def _delta(playlist_id, **changes):
+    """Ответ на изменение: только то, что поменялось, + новый счётчик треков"""
+    now = datetime.utcnow()
+    db.session.execute(Playlist.__table__.update().where(Playlist.id == playlist_id).values(updated_at=now))
+    count = db.session.execute(select(func.count()).where(pt.playlist_id == playlist_id)).scalar()
+    return {"playlist_id": playlist_id, "trackCount": count, "updated_at": now.isoformat(), **changes}
+
+
+def add_tracks(playlist_id, track_ids, before=None, after=None):
+    """
+    Добавить треки подряд в конец или перед/после трека-якоря.
+    Уже добавленные пропускаются (skipped), несуществующие — missing.
+    """
+    ids = _unique(track_ids)
+    known = set()
+    for chunk in _chunks(ids):
+        known.update(db.session.execute(select(Track.id).where(Track.id.in_(chunk))).scalars())
+    present = _in_playlist(playlist_id, ids)
+    new = [t for t in ids if t in known and t not in present]
+
+    added, renumbered = [], False
+    if new:
+        positions, renumbered = _place(playlist_id, len(new), before, after)
+        now = datetime.utcnow()
+        db.session.execute(playlist_tracks.insert(), [
+            {"playlist_id": playlist_id, "track_id": t, "position": p, "added_at": now}
+            for t, p in zip(new, positions)
+        ])
+        added = [{"track_id": t, "position": p} for t, p in zip(new, positions)]
+    return _delta(
+        playlist_id, added=added, renumbered=renumbered,
+        skipped=[t for t in ids if t in present], missing=[t for t in ids if t not in known]
+    )
+
+
+def remove_tracks(playlist_id, track_ids):
+    """Убрать треки; позиции остальных не меняются"""
+    ids = _unique(track_ids)
+    present = _in_playlist(playlist_id, ids)
+    for chunk in _chunks([t for t in ids if t in present]):
+        db.session.execute(
+            playlist_tracks.delete().where(pt.playlist_id == playlist_id, pt.track_id.in_(chunk))
+        )
+    return _delta(playlist_id, removed=[t for t in ids if t in present])
+
+
+def move_tracks(playlist_id, track_ids, before=None, after=None):
+    """
+    Переставить треки подряд (в переданном порядке) в конец или
+    перед/после якоря. Меняются только строки переставляемых треков.
+    """
+    ids = _unique(track_ids)
+    if before in ids or after in ids:
+        raise PlaylistError("anchor_in_track_ids")
+    present = _in_playlist(playlist_id, ids)
+    moving = [t for t in ids if t in present]
+
+    moved, renumbered = [], False
+    if moving:
+        positions, renumbered = _place(playlist_id, len(moving), before, after, exclude=moving)
+        db.session.execute(
+            playlist_tracks.update()
+            .where(pt.playlist_id == playlist_id, pt.track_id == bindparam("tid"))
+            .values(position=bindparam("pos")),
+            [{"tid": t, "pos": p} for t, p in zip(moving, positions)]
+        )
+        moved = [{"track_id": t, "position": p} for t, p in zip(moving, positions)]
+    return _delta(playlist_id, moved=moved, renumbered=renumbered,
+                  missing=[t for t in ids if t not in present])
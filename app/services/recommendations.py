@@ -0,0 +1,237 @@
+"""
+Item-item рекомендации по совместным прослушиваниям и лайкам.
+Фоновая задача сворачивает новую историю (id > watermark) в
+user_track_affinity и пересчитывает top-K соседей (косинус) только для
+треков пользователей, у которых что-то изменилось. Запрос рекомендаций —
+несколько индексных выборок и слияние списков соседей в памяти.
+С SciPy матрица сходства считается разреженным умножением, без него —
+тем же алгоритмом на словарях.
+"""
+import heapq
+import math
+from collections import defaultdict
+from sqlalchemy import func, bindparam, desc
+from ..models import ListeningHistory, LikedTrack, TrackNeighbor, UserTrackAffinity, Watermark
+from .. import db
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    sparse = None
+
+LIKE_WEIGHT = 2.0  # лайк весит как ~6 прослушиваний (log1p)
+SEED_HISTORY = 50  # последних прослушиваний — затравка рекомендаций
+SEED_LIKES = 50
+HISTORY_WATERMARK = "recs.history"
+_CHUNK = 900  # параметров в одном IN (лимит SQLite)
+
+
+def _weight(plays, liked):
+    return math.log1p(plays or 0) + (LIKE_WEIGHT if liked else 0.0)
+
+
+def _chunks(items, size=_CHUNK):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class Recommender:
+    def __init__(self, app):
+        self.app = app
+        self.k = app.config.get("RECS_NEIGHBORS", 50)
+        self.batch_size = app.config.get("RECS_BATCH_SIZE", 10000)
+
+    # ---- build ----
+
+    def build(self, full=False, on_progress=None):
+        """
+        Инкрементальный пересчёт: новая история + изменения лайков -> affinity,
+        затем соседи треков затронутых пользователей. full=True — всех треков.
+        """
+        touched = self._ingest_history() | self._sync_likes()
+        rows = db.session.query(
+            UserTrackAffinity.user_id, UserTrackAffinity.track_id,
+            UserTrackAffinity.plays, UserTrackAffinity.liked
+        ).all()
+        all_tracks = {t for _, t, _, _ in rows}
+        affected = all_tracks if full else {t for u, t, _, _ in rows if u in touched}
+        if len(affected) > len(all_tracks) // 2:
+            affected = all_tracks  # всё равно почти всё — считаем целиком
+
+        # матрица, нормы и индексы строятся один раз; пачки берут из неё свои столбцы
+        if sparse is not None:
+            matrix, similar = self._matrix_scipy(rows), self._similar_scipy
+        else:
+            matrix, similar = self._matrix_python(rows), self._similar_python
+        done = 0
+        for batch in _chunks(sorted(affected), 1000):
+            neighbors = similar(matrix, batch)
+            for ids in _chunks(batch):
+                TrackNeighbor.query.filter(TrackNeighbor.track_id.in_(ids)).delete(synchronize_session=False)
+            values = [
+                {"track_id": t, "neighbor_id": n, "score": score}
+                for t, items in neighbors.items() for n, score in items
+            ]
+            if values:
+                db.session.execute(TrackNeighbor.__table__.insert(), values)
+            db.session.commit()
+            done += len(batch)
+            if on_progress:
+                on_progress(done, len(affected))
+        return {"users": len(touched), "tracks": len(affected), "pairs": len(rows)}
+
+    def _ingest_history(self):
+        """Свернуть ListeningHistory с id > watermark пачками; вернуть затронутых пользователей"""
+        last = Watermark.get(HISTORY_WATERMARK)
+        top = db.session.query(func.max(ListeningHistory.id)).scalar() or 0
+        touched = set()
+        while last < top:
+            upto = min(last + self.batch_size, top)
+            rows = db.session.query(ListeningHistory.user_id, ListeningHistory.track_id, func.count())\
+                .filter(ListeningHistory.id > last, ListeningHistory.id <= upto)\
+                .group_by(ListeningHistory.user_id, ListeningHistory.track_id).all()
+            self._upsert(
+                {(u, t): n for u, t, n in rows},
+                UserTrackAffinity.plays + bindparam("n"),
+                lambda n: {"plays": n, "liked": False}
+            )
+            touched.update(u for u, _, _ in rows)
+            Watermark.set(HISTORY_WATERMARK, upto)
+            db.session.commit()
+            last = upto
+        return touched
+
+    def _sync_likes(self):
+        """Лайки сверяются целиком (их на порядки меньше истории, а удаления не видны по id)"""
+        liked = set(db.session.query(LikedTrack.user_id, LikedTrack.track_id))
+        flagged = set(
+            db.session.query(UserTrackAffinity.user_id, UserTrackAffinity.track_id)
+            .filter(UserTrackAffinity.liked.is_(True))
+        )
+        added, removed = liked - flagged, flagged - liked
+        self._upsert(dict.fromkeys(added, True), bindparam("n"), lambda n: {"plays": 0, "liked": True},
+                     column="liked")
+        self._upsert(dict.fromkeys(removed, False), bindparam("n"), None, column="liked")
+        db.session.commit()
+        return {u for u, _ in added | removed}
+
+    def _upsert(self, values, expr, make_row, column="plays"):
+        """{(user_id, track_id): n} -> UPDATE column = expr для существующих, INSERT make_row(n) для новых"""
+        table = UserTrackAffinity.__table__
+        for keys in _chunks(values, _CHUNK // 2):
+            users = {u for u, _ in keys}
+            tracks = {t for _, t in keys}
+            existing = set(
+                db.session.query(UserTrackAffinity.user_id, UserTrackAffinity.track_id)
+                .filter(UserTrackAffinity.user_id.in_(users), UserTrackAffinity.track_id.in_(tracks))
+            )
+            updates = [{"u": u, "t": t, "n": values[(u, t)]} for u, t in keys if (u, t) in existing]
+            if updates:
+                db.session.execute(
+                    table.update()
+                    .where(table.c.user_id == bindparam("u"), table.c.track_id == bindparam("t"))
+                    .values({column: expr}),
+                    updates
+                )
+            inserts = [
+                {"user_id": u, "track_id": t, **make_row(values[(u, t)])}
+                for u, t in keys if (u, t) not in existing and make_row is not None
+            ]
+            if inserts:
+                db.session.execute(table.insert(), inserts)
+
+    @staticmethod
+    def _matrix_scipy(rows):
+        """(CSC-матрица пользователь x трек, нормы столбцов, id треков, id -> столбец)"""
+        user_index, track_ids, track_index = {}, [], {}
+        r, c, data = [], [], []
+        for u, t, plays, liked in rows:
+            if t not in track_index:
+                track_index[t] = len(track_ids)
+                track_ids.append(t)
+            r.append(user_index.setdefault(u, len(user_index)))
+            c.append(track_index[t])
+            data.append(_weight(plays, liked))
+        m = sparse.csc_matrix((data, (r, c)), shape=(len(user_index), len(track_ids)))
+        norms = np.sqrt(np.asarray(m.multiply(m).sum(axis=0)).ravel())
+        return m, norms, track_ids, track_index
+
+    def _similar_scipy(self, matrix, batch):
+        """{track_id: [(neighbor_id, score), ...]} через разреженное M[:, batch].T @ M"""
+        m, norms, track_ids, track_index = matrix
+        cols = [track_index[t] for t in batch if t in track_index]
+        sims = (m[:, cols].T @ m).tocsr()
+
+        result = {}
+        for i, col in enumerate(cols):
+            start, end = sims.indptr[i], sims.indptr[i + 1]
+            idx = sims.indices[start:end]
+            scores = sims.data[start:end] / (norms[col] * norms[idx])
+            keep = idx != col
+            idx, scores = idx[keep], scores[keep]
+            if len(scores) > self.k:
+                top = np.argpartition(-scores, self.k)[:self.k]
+                idx, scores = idx[top], scores[top]
+            order = np.argsort(-scores)
+            result[track_ids[col]] = [(track_ids[j], round(float(s), 6)) for j, s in zip(idx[order], scores[order])]
+        return result
+
+    @staticmethod
+    def _matrix_python(rows):
+        """(треки пользователя, пользователи трека, квадраты норм) на словарях"""
+        by_user, by_track, norm2 = defaultdict(list), defaultdict(list), defaultdict(float)
+        for u, t, plays, liked in rows:
+            w = _weight(plays, liked)
+            by_user[u].append((t, w))
+            by_track[t].append((u, w))
+            norm2[t] += w * w
+        return by_user, by_track, norm2
+
+    def _similar_python(self, matrix, batch):
+        by_user, by_track, norm2 = matrix
+        result = {}
+        for t in batch:
+            dots = defaultdict(float)
+            for u, w in by_track.get(t, ()):
+                for other, w2 in by_user[u]:
+                    if other != t:
+                        dots[other] += w * w2
+            result[t] = [
+                (other, round(score, 6)) for score, other in heapq.nlargest(
+                    self.k, ((dot / math.sqrt(norm2[t] * norm2[other]), other) for other, dot in dots.items())
+                )
+            ]
+        return result
+
+    # ---- query ----
+
+    def recommend(self, user_id, limit=20):
+        """
+        id треков для пользователя: соседи последних прослушиваний и лайков,
+        взвешенные по свежести затравки; уже знакомые треки исключаются.
+        """
+        seeds = defaultdict(float)
+        recent = db.session.query(ListeningHistory.track_id)\
+            .filter(ListeningHistory.user_id == user_id)\
+            .order_by(desc(ListeningHistory.played_at)).limit(SEED_HISTORY)
+        for rank, (track_id,) in enumerate(recent):
+            seeds[track_id] += 1.0 / (1 + rank / 10)
+        likes = db.session.query(LikedTrack.track_id)\
+            .filter(LikedTrack.user_id == user_id)\
+            .order_by(desc(LikedTrack.liked_at)).limit(SEED_LIKES)
+        for (track_id,) in likes:
+            seeds[track_id] += LIKE_WEIGHT / 2
+        if not seeds:
+            return []
+
+        known = set(seeds)
+        known.update(t for (t,) in db.session.query(UserTrackAffinity.track_id).filter_by(user_id=user_id))
+        scores = defaultdict(float)
+        for track_id, neighbor_id, score in db.session.query(
+            TrackNeighbor.track_id, TrackNeighbor.neighbor_id, TrackNeighbor.score
+        ).filter(TrackNeighbor.track_id.in_(list(seeds))):
+            if neighbor_id not in known:
+                scores[neighbor_id] += seeds[track_id] * score
+        return [t for t, _ in heapq.nlargest(limit, scores.items(), key=lambda item: item[1])]
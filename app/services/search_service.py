@@ -0,0 +1,162 @@
+import re
+from sqlalchemy import text, table, column, inspect
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from ..models import Track, Playlist, Genre
+from .. import db
+
+# Индексируемые колонки и веса bm25 (порядок колонок важен)
+INDEXED = {
+    "tracks": (("title", 10.0), ("artist", 5.0), ("album", 2.0), ("genre", 1.0)),
+    "playlists": (("name", 10.0), ("description", 1.0)),
+    "genres": (("name", 1.0),),
+}
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _sqlite_ddl(tablename, columns):
+    cols = ", ".join(columns)
+    new_vals = ", ".join(f"new.{c}" for c in columns)
+    old_vals = ", ".join(f"old.{c}" for c in columns)
+    fts = f"{tablename}_fts"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{cols}, content='{tablename}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tablename} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tablename} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {tablename} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END",
+    ]
+
+
+def _pg_vector(tablename, columns):
+    parts = " || ' ' || ".join(f"coalesce({tablename}.{c}, '')" for c in columns)
+    return f"to_tsvector('simple', {parts})"
+
+
+class SearchService:
+    """
+    Полнотекстовый поиск по трекам, плейлистам и жанрам.
+    SQLite — FTS5 (external content + триггеры), Postgres — GIN-индекс
+    по to_tsvector; если ни то ни другое недоступно — ILIKE.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.backend = "like"
+
+    def init_index(self):
+        """Создать индексы (идемпотентно) и определить backend"""
+        dialect = db.engine.dialect.name
+        existing = set(inspect(db.engine).get_table_names())
+        if not set(INDEXED) <= existing:
+            return self.backend
+        try:
+            if dialect == "sqlite":
+                self._init_sqlite(existing)
+                self.backend = "fts5"
+            elif dialect == "postgresql":
+                self._init_postgres()
+                self.backend = "postgres"
+        except (OperationalError, ProgrammingError) as e:
+            db.session.rollback()
+            self.app.logger.warning(f"Full-text search unavailable, falling back to LIKE: {e}")
+            self.backend = "like"
+        return self.backend
+
+    def _init_sqlite(self, existing):
+        with db.engine.begin() as conn:
+            for tablename, cols in INDEXED.items():
+                columns = [c for c, _ in cols]
+                is_new = f"{tablename}_fts" not in existing
+                for stmt in _sqlite_ddl(tablename, columns):
+                    conn.exec_driver_sql(stmt)
+                if is_new:
+                    # первичное наполнение из существующих строк
+                    conn.exec_driver_sql(f"INSERT INTO {tablename}_fts({tablename}_fts) VALUES ('rebuild')")
+
+    def _init_postgres(self):
+        with db.engine.begin() as conn:
+            for tablename, cols in INDEXED.items():
+                vector = _pg_vector(tablename, [c for c, _ in cols])
+                conn.exec_driver_sql(
+                    f"CREATE INDEX IF NOT EXISTS ix_{tablename}_search "
+                    f"ON {tablename} USING GIN (({vector}))"
+                )
+
+    def rebuild(self):
+        """Полностью перестроить FTS5-индексы (после массовых правок в обход триггеров)"""
+        if self.backend != "fts5":
+            return
+        with db.engine.begin() as conn:
+            for tablename in INDEXED:
+                conn.exec_driver_sql(f"INSERT INTO {tablename}_fts({tablename}_fts) VALUES ('rebuild')")
+
+    # ---- query building ----
+
+    def _terms(self, q):
+        return _TERM_RE.findall(q or "")[:16]
+
+    def filter(self, query, model, q, ranked=False):
+        """
+        Добавить к ORM-запросу полнотекстовое условие по model.
+        ranked=True — дополнительно отсортировать по релевантности.
+        """
+        terms = self._terms(q)
+        if not terms:
+            return query.filter(db.false())
+        tablename = model.__tablename__
+        cols = INDEXED[tablename]
+
+        if self.backend == "fts5":
+            fts = table(f"{tablename}_fts", column("rowid"))
+            match = " ".join(f'"{t}"*' for t in terms)
+            query = query.join(fts, fts.c.rowid == model.id)\
+                .filter(text(f"{tablename}_fts MATCH :fts_q").bindparams(fts_q=match))
+            if ranked:
+                weights = ", ".join(str(w) for _, w in cols)
+                query = query.order_by(text(f"bm25({tablename}_fts, {weights})"))
+            return query
+
+        if self.backend == "postgres":
+            vector = _pg_vector(tablename, [c for c, _ in cols])
+            tsquery = " & ".join(f"{t}:*" for t in terms)
+            query = query.filter(
+                text(f"{vector} @@ to_tsquery('simple', :fts_q)").bindparams(fts_q=tsquery)
+            )
+            if ranked:
+                query = query.order_by(
+                    text(f"ts_rank({vector}, to_tsquery('simple', :fts_rq)) DESC").bindparams(fts_rq=tsquery)
+                )
+            return query
+
+        conds = []
+        for t in terms:
+            conds.append(db.or_(*[getattr(model, c).ilike(f"%{t}%") for c, _ in cols]))
+        query = query.filter(db.and_(*conds))
+        if ranked:
+            query = query.order_by(model.id)
+        return query
+
+    def search(self, q, user_id=None, types=("tracks", "playlists", "genres"), limit=20, offset=0):
+        """
+        Поиск по каталогу, результаты отсортированы по релевантности.
+        Возвращает {тип: (список моделей, есть_ещё)}.
+        """
+        results = {}
+        if "tracks" in types:
+            results["tracks"] = self._page(self.filter(Track.query, Track, q, ranked=True), limit, offset)
+        if "playlists" in types:
+            pq = Playlist.visible_to(user_id)
+            results["playlists"] = self._page(self.filter(pq, Playlist, q, ranked=True), limit, offset)
+        if "genres" in types:
+            results["genres"] = self._page(self.filter(Genre.query, Genre, q, ranked=True), limit, offset)
+        return results
+
+    def _page(self, query, limit, offset):
+        items = query.limit(limit + 1).offset(offset).all()
+        return items[:limit], len(items) > limit
@@ -0,0 +1,127 @@
+import re
+import mimetypes
+from pathlib import Path
+from urllib.parse import quote
+from flask import current_app, request, send_file, Response
+from werkzeug.wsgi import wrap_file
+from .tags import THUMB_SIZES, artwork_path
+
+ARTWORK_KEY_RE = re.compile(r"[0-9a-f]{40}")
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG", "image/png"),
+    (b"GIF8", "image/gif"),
+    (b"RIFF", "image/webp"),
+)
+
+
+def media_etag(path: Path, st=None) -> str:
+    """Сильный ETag по (mtime, size, inode) — меняется при любой перезаписи файла"""
+    st = st or path.stat()
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}-{st.st_ino:x}"
+
+
+class _FileTail:
+    """Файл, начинающийся с байта start: Range внутри ответа считается от него"""
+
+    def __init__(self, f, start):
+        self.f = f
+        self.start = start
+        f.seek(start)
+
+    def read(self, size=-1):
+        return self.f.read(size)
+
+    def seekable(self):
+        return True
+
+    def seek(self, pos, whence=0):
+        return self.f.seek(self.start + pos if whence == 0 else pos, whence) - self.start
+
+    def tell(self):
+        return self.f.tell() - self.start
+
+    def close(self):
+        self.f.close()
+
+
+def _send_tail(path, st, etag, start, max_age):
+    length = st.st_size - start
+    body = wrap_file(request.environ, _FileTail(open(path, "rb"), start))
+    mimetype = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    resp = Response(body, mimetype=mimetype, direct_passthrough=True)
+    resp.content_length = length
+    resp.set_etag(f"{etag}-{start:x}")
+    resp.last_modified = st.st_mtime
+    resp.cache_control.public = True
+    resp.cache_control.max_age = max_age
+    return resp.make_conditional(request, accept_ranges=True, complete_length=length)
+
+
+def send_media(path: Path, start=0):
+    """
+    Отдать медиафайл с поддержкой Range/If-Range, ETag и Last-Modified.
+    Если настроен MEDIA_ACCEL_PREFIX — передача байтов делегируется nginx
+    через X-Accel-Redirect; USE_X_SENDFILE обрабатывается самим Flask.
+    start > 0 — отдать файл начиная с этого байта (перемотка по индексу),
+    такой ответ всегда отдаёт сам Flask.
+    """
+    cfg = current_app.config
+    st = path.stat()
+    etag = media_etag(path, st)
+    max_age = cfg.get("MEDIA_CACHE_MAX_AGE", 86400)
+
+    if 0 < start < st.st_size:
+        return _send_tail(path, st, etag, start, max_age)
+
+    accel_prefix = cfg.get("MEDIA_ACCEL_PREFIX")
+    if accel_prefix:
+        mimetype = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        resp = Response(status=200, mimetype=mimetype)
+        resp.set_etag(etag)
+        resp.last_modified = st.st_mtime
+        resp.headers["Accept-Ranges"] = "bytes"
+        resp.headers["X-Accel-Redirect"] = f"{accel_prefix.rstrip('/')}/{quote(path.name)}"
+        resp.cache_control.public = True
+        resp.cache_control.max_age = max_age
+        # nginx сам обработает Range, здесь достаточно 304 по If-None-Match
+        resp = resp.make_conditional(request)
+        if resp.status_code == 304:
+            del resp.headers["X-Accel-Redirect"]
+        return resp
+
+    resp = send_file(
+        path,
+        conditional=True,
+        etag=etag,
+        last_modified=st.st_mtime,
+        max_age=max_age,
+    )
+    resp.cache_control.public = True
+    return resp
+
+
+def send_artwork(key, size):
+    """
+    Отдать обложку размера size (0 — исходник). URL зависит от содержимого,
+    поэтому ответ кэшируется навсегда (immutable). Без Pillow миниатюр нет —
+    отдаётся исходное изображение. Возвращает None, если обложки нет.
+    """
+    if not ARTWORK_KEY_RE.fullmatch(key) or (size and size not in THUMB_SIZES):
+        return None
+    artwork_dir = current_app.config["ARTWORK_DIR"]
+    path = artwork_path(artwork_dir, key, size)
+    if not path.is_file():
+        path = artwork_path(artwork_dir, key, 0)
+        if not path.is_file():
+            return None
+
+    with open(path, "rb") as f:
+        head = f.read(4)
+    mimetype = next((m for sig, m in _IMAGE_SIGNATURES if head.startswith(sig)), "application/octet-stream")
+    resp = send_file(path, mimetype=mimetype, conditional=True, etag=f"{key}-{size}", max_age=IMMUTABLE_MAX_AGE)
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    return resp
@@ -0,0 +1,168 @@
+"""
+Чтение тегов и обложек (ID3 / Vorbis / MP4) за один проход mutagen
+и content-addressed миниатюры обложек.
+"""
+import base64
+import hashlib
+import io
+import os
+import re
+from pathlib import Path
+from mutagen import File as MutagenFile
+from mutagen.id3 import ID3
+from mutagen.mp4 import MP4Tags
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow не установлен — храним только исходник, без миниатюр
+    Image = None
+
+THUMB_SIZES = (64, 256, 512)
+
+# тег -> поле трека (для Vorbis comments и MP4 atom-ов)
+VORBIS_KEYS = {
+    "title": "title", "artist": "artist", "album": "album", "date": "year",
+    "genre": "genre", "tracknumber": "track_number",
+    "lyrics": "lyrics", "unsyncedlyrics": "lyrics",
+}
+MP4_KEYS = {
+    "\xa9nam": "title", "\xa9ART": "artist", "\xa9alb": "album", "\xa9day": "year",
+    "\xa9gen": "genre", "trkn": "track_number", "\xa9lyr": "lyrics",
+}
+ID3_KEYS = {
+    "TIT2": "title", "TPE1": "artist", "TALB": "album", "TDRC": "year",
+    "TCON": "genre", "TRCK": "track_number",
+}
+
+_NUMBER_RE = re.compile(r"\d+")
+
+
+def _first(value):
+    if isinstance(value, (list, tuple)):
+        return value[0] if value else None
+    return value
+
+
+def _number(value):
+    """'2004-05-01' -> 2004, '3/12' -> 3, (3, 12) -> 3"""
+    value = _first(value)
+    if isinstance(value, int):
+        return value or None
+    m = _NUMBER_RE.search(str(value or ""))
+    return int(m.group()) if m else None
+
+
+def _id3_tags(tags, meta):
+    for key, field in ID3_KEYS.items():
+        frame = tags.get(key)
+        if frame is not None and frame.text:
+            meta[field] = str(frame.text[0])
+    lyrics = tags.getall("USLT")
+    if lyrics:
+        meta["lyrics"] = lyrics[0].text
+    pictures = tags.getall("APIC")
+    if pictures:
+        # 3 — front cover, иначе первая попавшаяся
+        front = [p for p in pictures if p.type == 3]
+        meta["picture"] = (front or pictures)[0].data
+
+
+def _vorbis_tags(audio, meta):
+    for key, value in audio.tags.items():
+        field = VORBIS_KEYS.get(key.lower())
+        if field and value:
+            meta[field] = _first(value)
+    pictures = list(getattr(audio, "pictures", []))  # FLAC
+    if not pictures:
+        from mutagen.flac import Picture
+        for raw in audio.tags.get("metadata_block_picture", []):
+            try:
+                pictures.append(Picture(base64.b64decode(raw)))
+            except Exception:
+                continue
+    if pictures:
+        front = [p for p in pictures if p.type == 3]
+        meta["picture"] = (front or pictures)[0].data
+
+
+def _mp4_tags(tags, meta):
+    for key, field in MP4_KEYS.items():
+        value = tags.get(key)
+        if value:
+            meta[field] = _first(value)
+    covers = tags.get("covr")
+    if covers:
+        meta["picture"] = bytes(covers[0])
+
+
+def read_metadata(path):
+    """
+    Длительность, теги и встроенная обложка одним проходом mutagen.
+    Отсутствующие значения — None; picture — байты изображения.
+    """
+    meta = dict.fromkeys(
+        ("duration", "title", "artist", "album", "year", "genre", "track_number", "lyrics", "picture")
+    )
+    try:
+        audio = MutagenFile(path)
+    except Exception:
+        return meta
+    if audio is None:
+        return meta
+    if getattr(audio, "info", None) is not None:
+        meta["duration"] = int(audio.info.length)
+
+    tags = audio.tags
+    if tags is not None:
+        try:
+            if isinstance(tags, ID3):  # MP3, а также ID3 в WAV/AIFF
+                _id3_tags(tags, meta)
+            elif isinstance(tags, MP4Tags):
+                _mp4_tags(tags, meta)
+            elif hasattr(tags, "items"):
+                _vorbis_tags(audio, meta)
+        except Exception:
+            pass  # битые теги не должны ломать импорт
+
+    meta["year"] = _number(meta["year"])
+    meta["track_number"] = _number(meta["track_number"])
+    for field in ("title", "artist", "album", "genre", "lyrics"):
+        if meta[field] is not None:
+            meta[field] = str(meta[field]).strip() or None
+    return meta
+
+
+def artwork_path(artwork_dir, key, size):
+    """ab/abcdef...-256.jpg; size=0 — исходное изображение"""
+    return Path(artwork_dir) / key[:2] / f"{key}-{size}.jpg"
+
+
+def store_artwork(data, artwork_dir):
+    """
+    Сохранить обложку и её миниатюры (THUMB_SIZES) под ключом sha1 содержимого.
+    Одинаковые обложки альбома хранятся один раз. Возвращает ключ или None.
+    """
+    if not data:
+        return None
+    key = hashlib.sha1(data).hexdigest()
+    original = artwork_path(artwork_dir, key, 0)
+    if original.exists():
+        return key
+    original.parent.mkdir(parents=True, exist_ok=True)
+
+    if Image is not None:
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                img = img.convert("RGB")
+                for size in THUMB_SIZES:
+                    thumb = img.copy()
+                    thumb.thumbnail((size, size), Image.LANCZOS)
+                    thumb.save(artwork_path(artwork_dir, key, size), "JPEG", quality=85, optimize=True)
+        except Exception:
+            return None  # не изображение
+
+    # исходник пишем последним: его наличие означает, что миниатюры готовы
+    tmp = original.parent / f"{original.name}.{os.getpid()}.tmp"
+    tmp.write_bytes(data)
+    tmp.replace(original)
+    return key
@@ -0,0 +1,145 @@
+"""
+Чарты «в тренде» по окнам времени. Слив буфера воспроизведений
+инкрементально пополняет свёртки plays по трекам за час и за день;
+периодическая задача считает по ним счёт с экспоненциальным затуханием
+и материализует top-N на окно (общий и по жанрам) в trending_charts.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from ..models import Track, ListeningHistory, TrackPlaysHourly, TrackPlaysDaily, TrendingChart, Watermark
+from .. import db
+
+# окно -> (длина, таблица свёрток, период полураспада)
+WINDOWS = {
+    "24h": (timedelta(hours=24), TrackPlaysHourly, timedelta(hours=6)),
+    "7d": (timedelta(days=7), TrackPlaysHourly, timedelta(hours=36)),
+    "30d": (timedelta(days=30), TrackPlaysDaily, timedelta(days=7)),
+}
+DEFAULT_WINDOW = "7d"
+HOURLY_RETENTION = timedelta(days=8)
+DAILY_RETENTION = timedelta(days=400)
+BACKFILL_WATERMARK = "trending.backfill"
+_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def _increment(model, key, counts, column="plays", session=None):
+    """column += n по ключам; на SQLite/PostgreSQL — одним INSERT ... ON CONFLICT"""
+    if not counts:
+        return
+    session = session or db.session
+    table = model.__table__
+    rows = [{**dict(zip(key, k)), column: n} for k, n in counts.items()]
+    insert = _INSERTS.get(db.engine.dialect.name)
+    if insert is not None:
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=key, set_={column: table.c[column] + stmt.excluded[column]})
+        session.execute(stmt, rows)
+        return
+    for row in rows:
+        cond = [table.c[c] == row[c] for c in key]
+        updated = session.execute(table.update().where(*cond).values({column: table.c[column] + row[column]}))
+        if not updated.rowcount:
+            session.execute(table.insert(), row)
+
+
+class Trending:
+    def __init__(self, app):
+        self.app = app
+        self.top_n = app.config.get("TRENDING_TOP_N", 100)
+
+    def record(self, plays):
+        """Учесть воспроизведения [(track_id, played_at), ...] в свёртках (в транзакции слива)"""
+        hourly, daily = Counter(), Counter()
+        for track_id, played_at in plays:
+            hourly[(track_id, played_at.replace(minute=0, second=0, microsecond=0))] += 1
+            daily[(track_id, played_at.date())] += 1
+        _increment(TrackPlaysHourly, ("track_id", "hour"), hourly)
+        _increment(TrackPlaysDaily, ("track_id", "day"), daily)
+
+    def _backfill(self):
+        """
+        Один раз свернуть ListeningHistory до начала свёрток (события до их
+        появления есть только там; анонимные прослушивания не восстановить).
+        """
+        if Watermark.get(BACKFILL_WATERMARK):
+            return 0
+        first_hour = db.session.query(func.min(TrackPlaysHourly.hour)).scalar()
+        since = datetime.utcnow() - DAILY_RETENTION
+        q = db.session.query(ListeningHistory.track_id, ListeningHistory.played_at)\
+            .filter(ListeningHistory.played_at >= since)
+        if first_hour is not None:
+            q = q.filter(ListeningHistory.played_at < first_hour)
+        total = 0
+        batch = []
+        for row in q.yield_per(10000):
+            batch.append(row)
+            if len(batch) >= 10000:
+                self.record(batch)
+                total += len(batch)
+                batch = []
+        self.record(batch)
+        total += len(batch)
+        Watermark.set(BACKFILL_WATERMARK, 1)
+        db.session.commit()
+        return total
+
+    def _scores(self, window, now):
+        length, model, half_life = WINDOWS[window]
+        bucket = model.hour if model is TrackPlaysHourly else model.day
+        start = now - length
+        if model is TrackPlaysDaily:
+            start = start.date()
+        step = timedelta(hours=1) if model is TrackPlaysHourly else timedelta(days=1)
+        scores = defaultdict(float)
+        for track_id, at, plays in db.session.query(model.track_id, bucket, model.plays).filter(bucket >= start):
+            if not isinstance(at, datetime):
+                at = datetime.combine(at, datetime.min.time())
+            age = max((now - (at + step / 2)).total_seconds(), 0.0)
+            scores[track_id] += plays * 0.5 ** (age / half_life.total_seconds())
+        return scores
+
+    def refresh(self, on_progress=None):
+        """Пересчитать и материализовать чарты всех окон; удалить устаревшие свёртки"""
+        backfilled = self._backfill()
+        now = datetime.utcnow()
+        genres = {}
+        summary = {"backfilled": backfilled}
+        for done, window in enumerate(WINDOWS, 1):
+            scores = self._scores(window, now)
+            missing = [t for t in scores if t not in genres]
+            for i in range(0, len(missing), 900):
+                genres.update(db.session.query(Track.id, Track.genre).filter(Track.id.in_(missing[i:i + 900])))
+
+            charts = defaultdict(list)
+            for track_id, score in sorted(scores.items(), key=lambda item: (-item[1], item[0])):
+                if track_id not in genres:
+                    continue  # трек удалён
+                for key in ("", genres[track_id] or ""):
+                    if len(charts[key]) < self.top_n:
+                        charts[key].append((track_id, score))
+
+            TrendingChart.query.filter_by(window=window).delete(synchronize_session=False)
+            rows = [
+                {"window": window, "genre": genre, "rank": rank, "track_id": track_id, "score": round(score, 4)}
+                for genre, items in charts.items() for rank, (track_id, score) in enumerate(items, 1)
+            ]
+            if rows:
+                db.session.execute(TrendingChart.__table__.insert(), rows)
+            db.session.commit()
+            summary[window] = len(charts[""])
+            if on_progress:
+                on_progress(done, len(WINDOWS))
+
+        TrackPlaysHourly.query.filter(TrackPlaysHourly.hour < now - HOURLY_RETENTION).delete(synchronize_session=False)
+        TrackPlaysDaily.query.filter(TrackPlaysDaily.day < (now - DAILY_RETENTION).date()).delete(synchronize_session=False)
+        db.session.commit()
+        return summary
+
+    def chart(self, window, genre="", limit=20):
+        """id треков из материализованного чарта по порядку мест"""
+        rows = db.session.query(TrendingChart.track_id)\
+            .filter_by(window=window, genre=genre or "")\
+            .order_by(TrendingChart.rank).limit(limit)
+        return [track_id for (track_id,) in rows]
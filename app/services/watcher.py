@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: выбор ведущего процесса не нужен (нет fork-воркеров)
+    fcntl = None
+
+# события, после которых файл мог измениться
+_TOUCH_EVENTS = ("created", "modified", "moved", "deleted", "closed")
+
+
+class MediaWatcher:
+    """
+    Слежение за MEDIA_DIR через watchdog. События копятся и сливаются:
+    путь обрабатывается, когда по нему не было событий WATCH_DEBOUNCE секунд
+    и размер файла перестал меняться, — тогда одной задачей "rescan" с
+    paths уходит вся пачка. Копирование 500 файлов даёт несколько задач,
+    а не 500 полных сканов. Переименование уходит одной пачкой: старое имя
+    ждёт, пока утихнет новое, иначе скан старого имени отвязал бы файл от
+    трека раньше, чем проиндексирован новый.
+
+    В gunicorn с несколькими воркерами наблюдает только один процесс —
+    тот, что держит flock на WATCH_LOCK_FILE; остальные периодически
+    пробуют его перехватить на случай, если ведущий процесс умрёт.
+    """
+
+    LEADER_RETRY = 30  # секунд между попытками стать ведущим
+
+    def __init__(self, app, media_dir, extensions):
+        self.app = app
+        # watchdog сообщает абсолютные пути без симлинков — сравниваем с тем же
+        self.media_dir = Path(media_dir).resolve()
+        self.extensions = extensions
+        self.debounce = app.config.get("WATCH_DEBOUNCE", 2.0)
+        self.lock_path = Path(app.config["WATCH_LOCK_FILE"])
+        self.observer = None
+        self._pending = {}  # имя файла -> (время последнего события, последний размер)
+        self._moves = {}  # старое имя -> новое, пока оба ждут в _pending
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._lock_file = None
+
+    # ---- leader election ----
+
+    def _acquire_leadership(self):
+        if fcntl is None:
+            return True
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        f = open(self.lock_path, "a+")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))
+        f.flush()
+        self._lock_file = f  # держим открытым, пока жив процесс
+        return True
+
+    def start(self):
+        """
+        Запустить наблюдение. True — этот процесс ведущий или будет пробовать
+        им стать; False — watchdog не установлен.
+        """
+        try:
+            from watchdog.observers import Observer  # noqa: F401
+        except ImportError:
+            return False
+        if self._acquire_leadership():
+            self._start_observer()
+        else:
+            threading.Thread(target=self._wait_leadership, name="media-watcher-election", daemon=True).start()
+        return True
+
+    def _wait_leadership(self):
+        while not self._stop.wait(self.LEADER_RETRY):
+            if self._acquire_leadership():
+                self._start_observer()
+                return
+
+    def stop(self):
+        self._stop.set()
+        if self.observer is not None:
+            self.observer.stop()
+
+    # ---- events ----
+
+    def _start_observer(self):
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory or event.event_type not in _TOUCH_EVENTS:
+                    return
+                moved_to = event.dest_path if event.event_type == "moved" else None
+                watcher.touch(event.src_path, moved_to)
+
+        self.observer = Observer()
+        self.observer.schedule(Handler(), str(self.media_dir), recursive=False)
+        self.observer.daemon = True
+        self.observer.start()
+        threading.Thread(target=self._run, name="media-watcher", daemon=True).start()
+        self.app.logger.info(f"Media watcher is leader (pid {os.getpid()})")
+
+    def touch(self, path, moved_to=None):
+        """
+        Отметить событие по пути; вызывается из потока watchdog, ничего не ждёт.
+        moved_to — новый путь при переименовании: оба имени попадут в одну пачку.
+        """
+        names = [self._media_name(p) for p in (path, moved_to) if p is not None]
+        now = time.monotonic()
+        with self._lock:
+            for name in names:
+                if name is not None:
+                    self._pending[name] = (now, None)
+            if len(names) == 2 and None not in names and names[0] != names[1]:
+                self._moves[names[0]] = names[1]
+
+    def _media_name(self, path):
+        """Имя аудиофайла в MEDIA_DIR или None"""
+        path = Path(os.fsdecode(path))
+        # resolve только каталога: сам файл может быть симлинком или уже удалён
+        if not path.name.lower().endswith(self.extensions) or path.parent.resolve() != self.media_dir:
+            return None
+        return path.name
+
+    def _settled(self):
+        """Имена файлов, по которым события утихли и размер больше не меняется"""
+        now = time.monotonic()
+        ready = set()
+        with self._lock:
+            for name, (last_event, last_size) in list(self._pending.items()):
+                if now - last_event < self.debounce:
+                    continue
+                try:
+                    size = (self.media_dir / name).stat().st_size
+                except FileNotFoundError:
+                    size = -1  # удалён — обрабатываем сразу
+                if size == last_size or size == -1:
+                    ready.add(name)
+                else:
+                    # файл ещё дописывается без событий (сетевые ФС) — ждём ещё окно
+                    self._pending[name] = (now, size)
+            # старое имя ждёт новое (и цепочки a -> b -> c)
+            held = True
+            while held:
+                held = [src for src in ready
+                        if self._moves.get(src) in self._pending and self._moves[src] not in ready]
+                ready.difference_update(held)
+            for name in ready:
+                del self._pending[name]
+                self._moves.pop(name, None)
+        return sorted(ready)
+
+    def _run(self):
+        while not self._stop.wait(max(self.debounce / 2, 0.1)):
+            ready = self._settled()
+            if not ready:
+                continue
+            try:
+                with self.app.app_context():
+                    job_id = self.app.jobs.enqueue("rescan", paths=ready)
+                self.app.logger.info(f"Media watcher: {len(ready)} changed files, job {job_id[:8]}")
+            except Exception as e:
+                self.app.logger.warning(f"Media watcher failed to queue rescan: {e}")
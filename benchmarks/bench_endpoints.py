@@ -0,0 +1,122 @@
+"""
+Latency benchmark of hot API endpoints and page routes (Flask test client)
+Run: python benchmarks/bench_endpoints.py [--tracks 20000 --history 200000] [--only api.tracks]
+
+Seeds a temporary database with seed_db.seed_synthetic, warms every
+endpoint up, then calls it --rounds times (at least --min-time seconds)
+and reports min/mean/p50/p95/p99 in milliseconds. Results are written
+to benchmarks/results/ as JSON; compare runs with benchmarks/compare.py.
+"""
+import argparse
+import fnmatch
+import time
+
+from common import bench_app, summarize, save_results, print_table
+
+from app import db
+from app.models import Playlist, Genre, User, playlist_tracks
+from seed_db import seed_database
+
+
+AJAX = {"X-Requested-With": "XMLHttpRequest"}
+
+
+def endpoints(ctx):
+    """(имя, метод, путь, нужен ли вход[, заголовки]) — то, что дёргает интерфейс при каждом открытии страницы"""
+    pl, genre = ctx["playlist_id"], ctx["genre_id"]
+    return [
+        ("api.tracks", "GET", "/api/tracks?limit=50", False),
+        ("api.tracks (genre)", "GET", "/api/tracks?genre=Rock&limit=50", False),
+        ("api.tracks (search)", "GET", "/api/tracks?search=synthetic%2012&limit=20", False),
+        ("api.search", "GET", "/api/search?q=artist%2042", False),
+        ("api.trending", "GET", "/api/tracks/trending", False),
+        ("api.recent", "GET", "/api/tracks/recent", False),
+        ("api.playlists", "GET", "/api/playlists", True),
+        ("api.playlist (stream)", "GET", f"/api/playlists/{pl}", True),
+        ("api.playlist tracks", "GET", f"/api/playlists/{pl}/tracks?limit=100", True),
+        ("api.genre tracks", "GET", f"/api/genres/{genre}/tracks", False),
+        ("api.user history", "GET", "/api/user/history", True),
+        ("api.user liked", "GET", "/api/user/liked?limit=100", True),
+        ("api.recommendations", "GET", "/api/user/recommendations", True),
+        ("api.play", "POST", "/api/tracks/1/play", True),
+        ("page.index", "GET", "/", True),
+        ("page.tracks", "GET", "/tracks", True),
+        # навигация внутри приложения запрашивает фрагменты (*_content.html)
+        ("page.playlist (ajax)", "GET", f"/playlist/{pl}", True, AJAX),
+        ("page.library (ajax)", "GET", "/library", True, AJAX),
+        ("page.profile", "GET", "/auth/profile", True),
+    ]
+
+
+def run(client, method, path, rounds, min_time, warmup, headers=None):
+    for _ in range(warmup):
+        client.open(path, method=method, headers=headers).close()
+    samples, started = [], time.perf_counter()
+    while len(samples) < rounds or time.perf_counter() - started < min_time:
+        t0 = time.perf_counter()
+        resp = client.open(path, method=method, headers=headers)
+        resp.get_data()  # потоковые ответы — до конца
+        samples.append((time.perf_counter() - t0) * 1000)
+        if resp.status_code >= 400:
+            raise RuntimeError(f"{method} {path} -> {resp.status_code}")
+        resp.close()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--tracks", type=int, default=20000)
+    parser.add_argument("--history", type=int, default=200000)
+    parser.add_argument("--playlists", type=int, default=1000)
+    parser.add_argument("--likes", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=50, help="minimum calls per endpoint")
+    parser.add_argument("--min-time", type=float, default=1.0, help="minimum seconds per endpoint")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--cache", default="none", help="CACHE_BACKEND (none measures the real work)")
+    parser.add_argument("--only", help="glob over endpoint names, e.g. 'api.*'")
+    parser.add_argument("--out", help="results file (default benchmarks/results/...)")
+    args = parser.parse_args()
+
+    app, tmp = bench_app(CACHE_BACKEND=args.cache)
+    print(f"🌱 Seeding {args.tracks} tracks, {args.history} plays, {args.users} users into {tmp}...")
+    started = time.monotonic()
+    seed_database(app, users=args.users, tracks=args.tracks, history=args.history,
+                  playlists=args.playlists, likes=args.likes)
+    with app.app_context():
+        app.trending.refresh()
+        app.recommender.build(full=True)
+        # самый большой плейлист и пользователь с историей — худший обычный случай
+        playlist_id = db.session.query(playlist_tracks.c.playlist_id)\
+            .group_by(playlist_tracks.c.playlist_id)\
+            .order_by(db.func.count().desc()).limit(1).scalar()
+        db.session.execute(Playlist.__table__.update().where(Playlist.id == playlist_id).values(is_public=True))
+        db.session.commit()
+        ctx = {
+            "playlist_id": playlist_id,
+            "genre_id": Genre.query.filter_by(name="Rock").one().id,
+            "user_id": User.query.filter_by(username="admin").one().id,
+        }
+    print(f"   done in {time.monotonic() - started:.1f}s\n")
+
+    anon, user = app.test_client(), app.test_client()
+    with user.session_transaction() as s:
+        s["user_id"] = ctx["user_id"]
+
+    results = {}
+    for name, method, path, login, *headers in endpoints(ctx):
+        if args.only and not fnmatch.fnmatch(name, args.only):
+            continue
+        samples = run(user if login else anon, method, path, args.rounds, args.min_time, args.warmup,
+                      headers[0] if headers else None)
+        results[name] = summarize(samples)
+        print(f"  {name:<24} p50 {results[name]['p50']:8.2f} ms   p95 {results[name]['p95']:8.2f} ms")
+
+    print()
+    print_table(results)
+    params = {k: v for k, v in vars(args).items() if k != "out"}
+    print(f"\n💾 {save_results('endpoints', params, results, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
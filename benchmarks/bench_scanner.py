@@ -0,0 +1,100 @@
+"""
+Media scanner benchmark: cold scan, warm rescan and rescan after changes
+Run: python benchmarks/bench_scanner.py [--files 2000] [--modify 0.05] [--workers 0]
+
+Generates short WAV files (stdlib wave, distinct content per file) in a
+temporary MEDIA_DIR and times MediaService.scan_and_sync_db:
+  cold      — empty index, every file is hashed and probed
+  warm      — nothing changed, (size, mtime, inode) comparison only
+  modified  — --modify share of the files rewritten
+  added     — the same share of new files
+Results are written to benchmarks/results/ as JSON.
+"""
+import argparse
+import math
+import struct
+import tempfile
+import time
+import wave
+from pathlib import Path
+
+from common import bench_app, summarize, save_results, print_table
+
+RATE = 8000
+
+
+def write_wav(path, n, seconds):
+    """Тон, частота которого зависит от n — у каждого файла своё содержимое (и хеш)"""
+    freq = 110 + (n % 2000) * 0.5
+    frames = int(RATE * seconds)
+    data = struct.pack(f"<{frames}h", *(
+        int(12000 * math.sin(2 * math.pi * freq * i / RATE) + (n & 0xff)) for i in range(frames)
+    ))
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(RATE)
+        w.writeframes(data)
+
+
+def timed_scan(app):
+    with app.app_context():
+        started = time.perf_counter()
+        summary = app.media_service.scan_and_sync_db()
+        return (time.perf_counter() - started) * 1000, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--seconds", type=float, default=1.0, help="length of each WAV")
+    parser.add_argument("--modify", type=float, default=0.05, help="share of files changed/added")
+    parser.add_argument("--warm-rounds", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=0, help="SCAN_WORKERS (0 — by CPU count)")
+    parser.add_argument("--analyze", action="store_true", help="ANALYZE_AUDIO on (slower cold scan)")
+    parser.add_argument("--out", help="results file (default benchmarks/results/...)")
+    args = parser.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="noxbench-"))
+    media_dir = tmp / "media"
+    media_dir.mkdir()
+    app, _ = bench_app(
+        tmp, MEDIA_DIR=media_dir, ARTWORK_DIR=str(tmp / "artwork"), HLS_CACHE_DIR=str(tmp / "hls"),
+        SCAN_WORKERS=args.workers, ANALYZE_AUDIO=args.analyze,
+    )
+
+    print(f"🎼 Generating {args.files} WAV files in {media_dir}...")
+    for n in range(args.files):
+        write_wav(media_dir / f"bench_{n:06d}.wav", n, args.seconds)
+
+    results = {}
+    changed = max(1, int(args.files * args.modify))
+
+    elapsed, summary = timed_scan(app)
+    results["cold"] = {**summarize([elapsed]), "added": summary["added"]}
+    print(f"  cold      {elapsed:9.1f} ms  {summary}")
+
+    samples = [timed_scan(app)[0] for _ in range(args.warm_rounds)]
+    results["warm"] = summarize(samples)
+    print(f"  warm      {results['warm']['p50']:9.1f} ms  (p50 of {args.warm_rounds})")
+
+    for n in range(changed):
+        write_wav(media_dir / f"bench_{n:06d}.wav", n + args.files, args.seconds)
+    elapsed, summary = timed_scan(app)
+    results["modified"] = {**summarize([elapsed]), "updated": summary["updated"]}
+    print(f"  modified  {elapsed:9.1f} ms  {summary}")
+
+    for n in range(args.files, args.files + changed):
+        write_wav(media_dir / f"bench_{n:06d}.wav", n + 2 * args.files, args.seconds)
+    elapsed, summary = timed_scan(app)
+    results["added"] = {**summarize([elapsed]), "added": summary["added"]}
+    print(f"  added     {elapsed:9.1f} ms  {summary}")
+
+    print()
+    print_table(results, columns=("p50", "min", "max", "n"))
+    params = {k: v for k, v in vars(args).items() if k != "out"}
+    print(f"\n💾 {save_results('scanner', params, results, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
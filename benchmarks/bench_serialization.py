@@ -0,0 +1,108 @@
+"""
+Micro-benchmark: ORM to_dict() + stdlib JSON vs column projections + fast JSON provider
+Run: python benchmarks/bench_serialization.py [--rows 10000] [--repeat 20]
+
+Seeds a temporary SQLite database with synthetic tracks and times building
+the /api/tracks payload both ways: query, row -> dict, and JSON encoding
+(median of --repeat runs, milliseconds). The old path is the one before
+the list optimizations: full ORM rows with lyrics loaded and included in
+every item. "to_dict() without lyrics" isolates the gain from dropping
+lyrics from lists alone.
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from flask.json.provider import DefaultJSONProvider
+
+from app import create_app, db, serializers
+from app.config import Config
+from app.models import Track
+from app.serializers import TRACK_COLUMNS, JSONProvider, as_dicts
+
+GENRES = ["Pop", "Rock", "Hip-Hop", "Jazz", "Electronic"]
+
+
+def seed(rows):
+    now = datetime.utcnow()
+    db.session.execute(Track.__table__.insert(), [
+        {
+            "title": f"Track {i}", "artist": f"Artist {i % 500}", "album": f"Album {i % 2000}",
+            "duration": 180 + i % 120, "media": f"/static/media/t{i}.mp3", "genre": GENRES[i % len(GENRES)],
+            "year": 1990 + i % 35, "track_number": i % 12 + 1, "plays": i * 7 % 10000,
+            "lyrics": "la " * 400, "created_at": now - timedelta(seconds=i),
+        }
+        for i in range(1, rows + 1)
+    ])
+    db.session.commit()
+
+
+def measure(func, repeat):
+    """Медиана времени (мс) по repeat запускам; сессия чистится, чтобы ORM не брал объекты из identity map"""
+    times = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000, help="tracks to seed")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per variant")
+    args = parser.parse_args()
+
+    tmp = Path(tempfile.mkdtemp())
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp / 'bench.db'}"
+        PLAY_EVENTS_DB = str(tmp / "play_events.db")
+        JOBS_DB = str(tmp / "jobs.db")
+        CACHE_BACKEND = "none"
+        WATCH_MEDIA = False
+        DEBUG = False
+
+    app = create_app(BenchConfig())
+    stdlib = DefaultJSONProvider(app)
+    fast = JSONProvider(app)
+    with app.app_context():
+        db.create_all()
+        seed(args.rows)
+
+        # как до оптимизаций: lyrics не отложена и входит в каждый элемент списка
+        old_rows = lambda: [
+            t.to_dict(include_lyrics=True) for t in Track.query.options(db.undefer(Track.lyrics)).order_by(Track.id)
+        ]
+        no_lyrics_rows = lambda: [t.to_dict() for t in Track.query.options(Track.list_columns()).order_by(Track.id)]
+        new_rows = lambda: as_dicts(db.session.query(*TRACK_COLUMNS).order_by(Track.id))
+        old_payload, new_payload = old_rows(), new_rows()
+        expected = [{k: v for k, v in item.items() if k != "lyrics"} for item in old_payload]
+        assert stdlib.loads(stdlib.dumps(expected)) == fast.loads(fast.dumps(new_payload)), "payloads differ"
+
+        results = {
+            "query + to_dict() + lyrics": measure(old_rows, args.repeat),
+            "to_dict() without lyrics": measure(no_lyrics_rows, args.repeat),
+            "query + projection": measure(new_rows, args.repeat),
+            "json: stdlib": measure(lambda: stdlib.dumps(old_payload), args.repeat),
+            f"json: {'orjson' if serializers.orjson else 'stdlib (orjson not installed)'}":
+                measure(lambda: fast.dumps(new_payload), args.repeat),
+            "total: old": measure(lambda: stdlib.dumps(old_rows()), args.repeat),
+            "total: new": measure(lambda: fast.dumps(new_rows()), args.repeat),
+        }
+
+    print(f"{args.rows} tracks, median of {args.repeat} runs")
+    for name, ms in results.items():
+        print(f"  {name:<30} {ms:8.1f} ms")
+    print(f"  speedup {results['total: old'] / results['total: new']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Shared helpers for the benchmark scripts: a throwaway app on a temporary
+SQLite database, latency statistics and JSON results tagged with the git
+revision (compare two runs with benchmarks/compare.py).
+"""
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+
+sys.path.insert(0, str(ROOT))
+
+
+def bench_app(tmp=None, **overrides):
+    """(app, tmp) — приложение на временной БД; overrides — атрибуты конфига"""
+    from app import create_app, db
+    from app.config import Config
+
+    tmp = Path(tmp or tempfile.mkdtemp(prefix="noxbench-"))
+    settings = {
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp / 'bench.db'}",
+        "PLAY_EVENTS_DB": str(tmp / "play_events.db"),
+        "JOBS_DB": str(tmp / "jobs.db"),
+        "CACHE_BACKEND": "none",
+        "WATCH_MEDIA": False,
+        "DEBUG": False,
+        **overrides,
+    }
+    app = create_app(type("BenchConfig", (Config,), settings)())
+    with app.app_context():
+        db.create_all()
+        app.search_service.init_index()
+    return app, tmp
+
+
+def percentile(sorted_samples, p):
+    """Перцентиль p (0..100) по отсортированной выборке, линейная интерполяция"""
+    if not sorted_samples:
+        return 0.0
+    k = (len(sorted_samples) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_samples) - 1)
+    return sorted_samples[lo] + (sorted_samples[hi] - sorted_samples[lo]) * (k - lo)
+
+
+def summarize(samples_ms):
+    """Статистика задержек в миллисекундах"""
+    s = sorted(samples_ms)
+    if not s:
+        return {"n": 0}
+    return {
+        "n": len(s),
+        "min": round(s[0], 3),
+        "mean": round(sum(s) / len(s), 3),
+        "p50": round(percentile(s, 50), 3),
+        "p95": round(percentile(s, 95), 3),
+        "p99": round(percentile(s, 99), 3),
+        "max": round(s[-1], 3),
+    }
+
+
+def git_revision():
+    """Короткий sha HEAD (+ "-dirty" при незакоммиченных изменениях) или None"""
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{sha}-dirty" if dirty else sha
+
+
+def save_results(name, params, results, out=None):
+    """Записать результаты в JSON; по умолчанию benchmarks/results/<name>-<rev>-<время>.json"""
+    revision = git_revision()
+    payload = {
+        "benchmark": name,
+        "revision": revision,
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+        "results": results,
+    }
+    if out is None:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        out = RESULTS_DIR / f"{name}-{revision or 'norev'}-{stamp}.json"
+    Path(out).write_text(json.dumps(payload, indent=2, ensure_ascii=False))
+    return Path(out)
+
+
+def print_table(rows, columns=("p50", "p95", "p99", "mean", "n")):
+    """Таблица {имя: summarize(...)} в stdout"""
+    width = max((len(name) for name in rows), default=10)
+    print(f"  {'':<{width}} " + " ".join(f"{c:>9}" for c in columns))
+    for name, stats in rows.items():
+        print(f"  {name:<{width}} " + " ".join(f"{stats.get(c, 0):>9}" for c in columns))
@@ -0,0 +1,63 @@
+"""
+Compare two benchmark result files (before / after)
+Run: python benchmarks/compare.py results/endpoints-abc123-....json results/endpoints-def456-....json
+     [--metric p50] [--threshold 10]
+
+Prints the metric for every name present in both files with the change
+in percent; changes beyond --threshold are marked. Exit code 1 if any
+latency regressed by more than --threshold (for CI).
+"""
+import argparse
+import json
+import sys
+
+# больше — лучше; для остальных метрик (задержки) лучше меньше
+HIGHER_IS_BETTER = {"rps"}
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--metric", default="p50")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent")
+    args = parser.parse_args()
+
+    before, after = load(args.before), load(args.after)
+    if before.get("benchmark") != after.get("benchmark"):
+        print(f"⚠️  different benchmarks: {before.get('benchmark')} vs {after.get('benchmark')}")
+    if before.get("params") != after.get("params"):
+        print("⚠️  parameters differ, numbers may not be comparable")
+    print(f"{args.metric}: {before.get('revision')} -> {after.get('revision')}\n")
+
+    names = [n for n in before["results"] if n in after["results"]]
+    width = max((len(n) for n in names), default=10)
+    higher_better = args.metric in HIGHER_IS_BETTER
+    regressions = 0
+    for name in names:
+        old = before["results"][name].get(args.metric)
+        new = after["results"][name].get(args.metric)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        worse = -change if higher_better else change
+        mark = ""
+        if worse > args.threshold:
+            mark, regressions = "  ❌ slower", regressions + 1
+        elif worse < -args.threshold:
+            mark = "  ✅ faster"
+        print(f"  {name:<{width}} {old:>10.3f} {new:>10.3f} {change:>+8.1f}%{mark}")
+
+    missing = sorted(set(before["results"]) ^ set(after["results"]))
+    if missing:
+        print(f"\n  only in one file: {', '.join(missing)}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+HTTP load generator for a running server (or a spawned gunicorn)
+Run: python benchmarks/loadgen.py --url http://127.0.0.1:5000 [--concurrency 16 --duration 30]
+     python benchmarks/loadgen.py --spawn [--gunicorn-workers 4 --tracks 20000 --history 200000]
+
+Closed loop: --concurrency threads, each with its own keep-alive
+connection, request the --path mix (default: hot read endpoints) round
+robin for --duration seconds. Reports throughput, error count and
+p50/p95/p99 latency per path and overall; results go to
+benchmarks/results/ as JSON.
+
+--spawn seeds a temporary database (seed_db.seed_synthetic), starts
+gunicorn run:app on it and logs the load in as a seeded user via a
+signed session cookie. With --url pass --cookie "session=..." to
+load endpoints that need a login.
+"""
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from common import ROOT, bench_app, summarize, save_results, print_table
+
+DEFAULT_PATHS = [
+    "/api/tracks?limit=50",
+    "/api/tracks/trending",
+    "/api/tracks/recent",
+    "/api/genres",
+    "/api/playlists",
+    "/api/search?q=artist%2042",
+    "/api/user/recommendations",
+    "/api/user/history",
+]
+
+
+def worker(url, paths, offset, deadline, cookie, samples, errors, lock):
+    parts = urlsplit(url)
+    conn_cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    conn = None
+    headers = {"Cookie": cookie} if cookie else {}
+    local = {path: [] for path in paths}
+    local_errors = {path: 0 for path in paths}
+    i = offset
+    while time.monotonic() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        if conn is None:
+            conn = conn_cls(parts.hostname, parts.port, timeout=30)
+        t0 = time.perf_counter()
+        try:
+            conn.request("GET", parts.path.rstrip("/") + path, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            ok = resp.status < 400
+            if resp.will_close:
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException):
+            ok = False
+            conn.close()
+            conn = None
+        if ok:
+            local[path].append((time.perf_counter() - t0) * 1000)
+        else:
+            local_errors[path] += 1
+    if conn is not None:
+        conn.close()
+    with lock:
+        for path in paths:
+            samples[path].extend(local[path])
+            errors[path] += local_errors[path]
+
+
+def run_load(url, paths, concurrency, duration, cookie=None):
+    samples = {path: [] for path in paths}
+    errors = {path: 0 for path in paths}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=worker, args=(url, paths, n, deadline, cookie, samples, errors, lock))
+        for n in range(concurrency)
+    ]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    results = {}
+    for path in paths:
+        results[path] = {**summarize(samples[path]), "errors": errors[path],
+                         "rps": round(len(samples[path]) / elapsed, 1)}
+    everything = [s for path in paths for s in samples[path]]
+    results["total"] = {**summarize(everything), "errors": sum(errors.values()),
+                        "rps": round(len(everything) / elapsed, 1)}
+    return results
+
+
+def wait_for_port(host, port, proc, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {proc.returncode}")
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"gunicorn did not start listening on {host}:{port}")
+
+
+def spawn(args):
+    """Засеять временную БД и поднять на ней gunicorn; (процесс, url, cookie)"""
+    from app import db
+    from app.models import User
+    from seed_db import seed_database
+
+    app, tmp = bench_app()
+    print(f"🌱 Seeding {args.tracks} tracks, {args.history} plays into {tmp}...")
+    seed_database(app, users=args.users, tracks=args.tracks, history=args.history,
+                  playlists=args.playlists, likes=args.likes)
+    with app.app_context():
+        app.trending.refresh()
+        app.recommender.build(full=True)
+        user_id = db.session.query(User.id).filter_by(username="admin").scalar()
+    serializer = app.session_interface.get_signing_serializer(app)
+    cookie = f"{app.config['SESSION_COOKIE_NAME']}={serializer.dumps({'user_id': user_id})}"
+
+    env = {
+        **os.environ,
+        "DATABASE_URL": app.config["SQLALCHEMY_DATABASE_URI"],
+        "PLAY_EVENTS_DB": app.config["PLAY_EVENTS_DB"],
+        "JOBS_DB": app.config["JOBS_DB"],
+        "CACHE_BACKEND": args.cache,
+        "CACHE_SQLITE_PATH": str(tmp / "cache.db"),
+        "WATCH_MEDIA": "0",
+        "JOB_WORKERS": "0",
+        "SECRET_KEY": app.config["SECRET_KEY"],
+    }
+    cmd = [sys.executable, "-m", "gunicorn", "run:app", "--bind", f"127.0.0.1:{args.port}",
+           "--workers", str(args.gunicorn_workers), "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+    try:
+        wait_for_port("127.0.0.1", args.port, proc)
+    except RuntimeError:
+        proc.terminate()
+        raise
+    return proc, f"http://127.0.0.1:{args.port}", cookie
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="base URL of a running server")
+    parser.add_argument("--spawn", action="store_true", help="seed a temp DB and start gunicorn on it")
+    parser.add_argument("--path", action="append", dest="paths", help="path to request (repeatable)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds of unrecorded load first")
+    parser.add_argument("--cookie", help='e.g. "session=..." for endpoints behind a login')
+    parser.add_argument("--port", type=int, default=5099, help="--spawn: gunicorn port")
+    parser.add_argument("--gunicorn-workers", type=int, default=4)
+    parser.add_argument("--cache", default="sqlite", help="--spawn: CACHE_BACKEND")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--tracks", type=int, default=20000)
+    parser.add_argument("--history", type=int, default=200000)
+    parser.add_argument("--playlists", type=int, default=1000)
+    parser.add_argument("--likes", type=int, default=20000)
+    parser.add_argument("--out", help="results file (default benchmarks/results/...)")
+    args = parser.parse_args()
+    if bool(args.url) == args.spawn:
+        parser.error("pass exactly one of --url or --spawn")
+
+    paths = args.paths or DEFAULT_PATHS
+    proc, url, cookie = None, args.url, args.cookie
+    if args.spawn:
+        proc, url, cookie = spawn(args)
+    try:
+        if args.warmup:
+            run_load(url, paths, args.concurrency, args.warmup, cookie)
+        print(f"🔥 {args.concurrency} connections × {args.duration:g}s against {url}...")
+        results = run_load(url, paths, args.concurrency, args.duration, cookie)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    print()
+    print_table(results, columns=("rps", "p50", "p95", "p99", "errors", "n"))
+    params = {k: v for k, v in vars(args).items() if k not in ("out", "cookie")}
+    params["paths"] = paths
+    print(f"\n💾 {save_results('loadgen', params, results, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
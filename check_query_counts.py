@@ -0,0 +1,123 @@
+"""
+Check that playlist/library endpoints issue a bounded number of SQL statements
+Run: python check_query_counts.py [--scale 10]
+
+Seeds two temporary SQLite databases (small and --scale times larger),
+calls each endpoint through the Flask test client and counts statements
+with a before_cursor_execute listener. Fails if an endpoint exceeds its
+budget or issues more statements on the larger database (N+1).
+"""
+import argparse
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+from sqlalchemy import event, func
+
+from app import create_app, db
+from app.config import Config
+from app.models import Playlist, playlist_tracks
+from seed_db import seed_synthetic
+
+AJAX = {"X-Requested-With": "XMLHttpRequest"}
+
+# endpoint -> (путь, заголовки, максимум запросов)
+BUDGETS = {
+    "api.get_playlists (anon)": ("/api/playlists", None, 1),
+    "api.get_playlists (user)": ("/api/playlists", None, 1),
+    "api.get_my_playlists": ("/api/playlists/my", None, 1),
+    "api.get_playlist": ("/api/playlists/{playlist}", None, 2),
+    "api.get_playlist_tracks": ("/api/playlists/{playlist}/tracks", None, 2),
+    "api.get_user_history": ("/api/user/history", None, 1),
+    "api.get_user_liked": ("/api/user/liked", None, 1),
+    "routes.index": ("/", None, 4),
+    "routes.playlist_view": ("/playlist/{playlist}", AJAX, 3),
+    "routes.library_page": ("/library", AJAX, 5),
+    "auth.profile": ("/auth/profile", None, 3),
+}
+
+
+def make_app(tmp, scale):
+    class CountConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp / 'counts.db'}"
+        PLAY_EVENTS_DB = str(tmp / "play_events.db")
+        JOBS_DB = str(tmp / "jobs.db")
+        CACHE_BACKEND = "none"  # считаем запросы самих view, а не попадания в кэш
+        WATCH_MEDIA = False
+
+    app = create_app(CountConfig())
+    with app.app_context():
+        db.create_all()
+        seed_synthetic(app, users=5 * scale, tracks=100 * scale, history=500 * scale,
+                       playlists=10 * scale, likes=100 * scale, days=30)
+        # пользователь с наибольшим числом плейлистов и самый большой плейлист
+        user_id = db.session.query(Playlist.user_id).group_by(Playlist.user_id)\
+            .order_by(func.count().desc()).limit(1).scalar()
+        playlist_id = db.session.query(playlist_tracks.c.playlist_id)\
+            .join(Playlist, Playlist.id == playlist_tracks.c.playlist_id)\
+            .filter(Playlist.user_id == user_id)\
+            .group_by(playlist_tracks.c.playlist_id)\
+            .order_by(func.count().desc()).limit(1).scalar()
+    return app, user_id, playlist_id
+
+
+def count_statements(app, user_id, playlist_id):
+    counts = {}
+    current = {"n": 0}
+    thread = threading.get_ident()
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        # только поток запроса — фоновые потоки приложения не в счёт
+        if threading.get_ident() == thread:
+            current["n"] += 1
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", _count)
+    try:
+        anon, user = app.test_client(), app.test_client()
+        with user.session_transaction() as s:
+            s["user_id"] = user_id
+        for name, (path, headers, _) in BUDGETS.items():
+            client = anon if name.endswith("(anon)") else user
+            current["n"] = 0
+            resp = client.get(path.format(playlist=playlist_id), headers=headers)
+            resp.get_data()  # потоковые ответы читают БД по мере отдачи
+            if resp.status_code != 200:
+                raise RuntimeError(f"{name}: {path} -> {resp.status_code}")
+            counts[name] = current["n"]
+    finally:
+        event.remove(engine, "before_cursor_execute", _count)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", type=int, default=10, help="size of the larger database vs the small one")
+    args = parser.parse_args()
+
+    runs = []
+    for scale in (1, args.scale):
+        app, user_id, playlist_id = make_app(Path(tempfile.mkdtemp()), scale)
+        runs.append(count_statements(app, user_id, playlist_id))
+    small, large = runs
+
+    failed = 0
+    for name, (_, _, budget) in BUDGETS.items():
+        problems = []
+        if large[name] > budget:
+            problems.append(f"budget {budget}")
+        if large[name] > small[name]:
+            problems.append("grows with data")
+        failed += bool(problems)
+        status = "FAIL" if problems else "ok"
+        print(f"[{status:>4}] {name:<28} {small[name]:>3} -> {large[name]:>3} statements"
+              + (f"  ({', '.join(problems)})" if problems else ""))
+
+    print(f"\n{'❌' if failed else '✅'} {failed} endpoints over budget or N+1")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""
+Check that hot queries use indexes (SQLite EXPLAIN QUERY PLAN)
+Run: python check_query_plans.py [--rows 1000000]
+
+Creates a temporary SQLite database, seeds it with synthetic data, calls
+the hot endpoints through the Flask test client (first page and, for
+cursor-paginated ones, the next page) and records every statement they
+actually execute. Each one is run through EXPLAIN QUERY PLAN with its
+real parameters; the check fails if any falls back to a full table scan.
+"""
+import argparse
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from urllib.parse import quote
+
+from sqlalchemy import event
+
+from app import create_app, db
+from app.config import Config
+
+GENRES = ["Pop", "Rock", "Hip-Hop", "Jazz", "Electronic", "Classical", "R&B", "Country", "Latin", "Indie"]
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+# endpoint -> таблицы, где полный проход — осознанно самый дешёвый план:
+# ORDER BY id по (почти) всем публичным плейлистам дешевле, чем MULTI-INDEX OR + сортировка
+ALLOWED_SCANS = {"api.get_playlists (user)": {"playlists"}}
+
+# endpoint -> (метод, путь, пользователь: None / "user" / "admin"); {genre} и
+# {playlist} подставляются. Ответы с курсором next запрашиваются ещё раз (page 2)
+REQUESTS = {
+    "api.get_tracks (genre)": ("GET", "/api/tracks?genre=Rock&limit=100", None),
+    "api.get_trending (all)": ("GET", "/api/tracks/trending?window=all", None),
+    "api.get_recent": ("GET", "/api/tracks/recent", None),
+    "api.get_genre_tracks": ("GET", "/api/genres/{genre}/tracks", None),
+    "api.get_playlists (anon)": ("GET", "/api/playlists", None),
+    "api.get_playlists (user)": ("GET", "/api/playlists", "user"),
+    "api.get_my_playlists_only": ("GET", "/api/playlists/my", "user"),
+    "api.get_playlist_tracks": ("GET", "/api/playlists/{playlist}/tracks?limit=20", "user"),
+    "api.get_user_history": ("GET", "/api/user/history", "user"),
+    "api.get_user_liked": ("GET", "/api/user/liked", "user"),
+    "api.get_user_liked (cursor)": ("GET", "/api/user/liked?limit=20", "user"),
+    "api.like_track": ("POST", "/api/tracks/1/like", "user"),
+    "api.get_recommendations": ("GET", "/api/user/recommendations", "user"),
+    "routes.liked_songs_page": ("GET", "/liked", "user"),
+    "routes.genre_view": ("GET", "/genre/{genre}", None),
+    "routes.admin_dashboard": ("GET", "/admin", "admin"),
+    "auth.profile": ("GET", "/auth/profile", "user"),
+}
+
+
+def seed(conn, rows):
+    """Быстрое наполнение через executemany: rows — размер listening_history"""
+    n_tracks = max(rows // 10, 100)
+    n_users = max(rows // 1000, 10)
+    n_playlists = max(rows // 100, 10)
+    now = datetime.utcnow()
+    rnd = random.Random(42)
+
+    def ts(i):
+        return (now - timedelta(seconds=i)).isoformat(sep=" ")
+
+    cur = conn.cursor()
+    cur.executemany(
+        "INSERT INTO users (id, username, is_admin, created_at) VALUES (?, ?, ?, ?)",
+        ((i, f"user{i}", int(i == 1), ts(i)) for i in range(1, n_users + 1))
+    )
+    cur.executemany("INSERT INTO genres (name) VALUES (?)", ((g,) for g in GENRES))
+    cur.executemany(
+        "INSERT INTO tracks (id, title, artist, media, genre, plays, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ((i, f"Track {i}", f"Artist {i % 5000}", f"/static/media/t{i}.mp3",
+          rnd.choice(GENRES), rnd.randint(0, 100000), ts(i)) for i in range(1, n_tracks + 1))
+    )
+    cur.executemany(
+        "INSERT INTO playlists (id, name, is_public, user_id, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+        ((i, f"Playlist {i}", int(rnd.random() < 0.3), rnd.randint(1, n_users), ts(i), ts(i))
+         for i in range(1, n_playlists + 1))
+    )
+    cur.executemany(
+        "INSERT OR IGNORE INTO playlist_tracks (playlist_id, track_id, position, added_at) VALUES (?, ?, ?, ?)",
+        ((rnd.randint(1, n_playlists), rnd.randint(1, n_tracks), i, ts(i)) for i in range(rows // 10))
+    )
+    cur.executemany(
+        "INSERT INTO listening_history (user_id, track_id, played_at) VALUES (?, ?, ?)",
+        ((rnd.randint(1, n_users), rnd.randint(1, n_tracks), ts(i)) for i in range(rows))
+    )
+    cur.executemany(
+        "INSERT OR IGNORE INTO liked_tracks (user_id, track_id, liked_at) VALUES (?, ?, ?)",
+        ((rnd.randint(1, n_users), rnd.randint(1, n_tracks), ts(i)) for i in range(rows // 10))
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+
+
+class StatementLog:
+    """Запросы к основной БД из текущего потока (фоновые потоки приложения не в счёт)"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.thread = threading.get_ident()
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self.thread and not executemany \
+                and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+            self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+
+def _next_cursor(resp):
+    if resp.headers.get("X-Next-Cursor"):
+        return resp.headers["X-Next-Cursor"]
+    data = resp.get_json(silent=True)
+    return data.get("next") if isinstance(data, dict) else None
+
+
+def hot_queries(app, genre_id, playlist_id):
+    """
+    [(endpoint, подпись, [(SQL, параметры), ...])] — то, что эндпоинты из
+    REQUESTS выполняют на самом деле, плюс фоновое сжатие истории
+    """
+    clients = {None: app.test_client(), "user": app.test_client(), "admin": app.test_client()}
+    for role, user_id in (("user", 2), ("admin", 1)):
+        with clients[role].session_transaction() as s:
+            s["user_id"] = user_id
+
+    result = []
+    with app.app_context():
+        engine = db.engine
+    for name, (method, path, role) in REQUESTS.items():
+        path = path.format(genre=genre_id, playlist=playlist_id)
+        with StatementLog(engine) as log:
+            try:
+                resp = clients[role].open(path, method=method)
+                resp.get_data()
+            except Exception as e:  # ошибка после запросов (например, нет шаблона) — планы всё равно проверяем
+                result.append((name, f"{name} [{type(e).__name__}: {e}]", log.statements))
+                continue
+        result.append((name, f"{name} [{resp.status_code}]", log.statements))
+        cursor = _next_cursor(resp) if method == "GET" else None
+        if cursor:
+            with StatementLog(engine) as log:
+                resp = clients[role].get(f"{path}{'&' if '?' in path else '?'}after={quote(cursor)}")
+                resp.get_data()
+            result.append((name, f"{name} (page 2) [{resp.status_code}]", log.statements))
+
+    with app.app_context(), StatementLog(engine) as log:
+        app.history.compact(max_batches=1)
+    result.append(("history.compact", "history.compact", log.statements))
+    return result
+
+
+def explain(conn, statement, parameters):
+    return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ())]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000, help="listening_history rows to seed")
+    args = parser.parse_args()
+
+    tmp = Path(tempfile.mkdtemp())
+
+    class PlanConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp / 'plans.db'}"
+        PLAY_EVENTS_DB = str(tmp / "play_events.db")
+        JOBS_DB = str(tmp / "jobs.db")
+        CACHE_BACKEND = "none"  # планы запросов самих view, а не попадания в кэш
+        WATCH_MEDIA = False
+
+    app = create_app(PlanConfig())
+    failed = 0
+    with app.app_context():
+        db.create_all()
+        conn = db.engine.raw_connection()
+        started = time.monotonic()
+        print(f"🌱 Seeding {args.rows} history rows...")
+        seed(conn, args.rows)
+        print(f"   done in {time.monotonic() - started:.1f}s\n")
+        genre_id = conn.execute("SELECT id FROM genres WHERE name = 'Rock'").fetchone()[0]
+        playlist_id = conn.execute(
+            "SELECT playlist_id FROM playlist_tracks JOIN playlists ON playlists.id = playlist_id "
+            "WHERE playlists.is_public = 1 GROUP BY playlist_id ORDER BY count(*) DESC LIMIT 1"
+        ).fetchone()[0]
+        db.session.remove()
+
+    for name, label, statements in hot_queries(app, genre_id, playlist_id):
+        if not statements:
+            print(f"[FAIL] {label}\n         no queries recorded")
+            failed += 1
+            continue
+        plans = [explain(conn, sql, params) for sql, params in statements]
+        scans = {m.group(1) for plan in plans for d in plan for m in [FULL_SCAN.match(d)] if m}
+        allowed = ALLOWED_SCANS.get(name, set())
+        if scans - allowed:
+            status, failed = "FAIL", failed + 1
+        else:
+            status = "skip" if scans else "ok"
+        print(f"[{status:>4}] {label}")
+        for (sql, _), plan in zip(statements, plans):
+            print(f"       {' '.join(sql.split())[:110]}")
+            for detail in plan:
+                print(f"         {detail}")
+    conn.close()
+
+    print(f"\n{'❌' if failed else '✅'} {failed} endpoints use full table scans")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
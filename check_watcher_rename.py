@@ -0,0 +1,181 @@
+"""
+Check that renaming a file in MEDIA_DIR keeps its track, likes and history
+Run: python check_watcher_rename.py [--debounce 0.3]
+
+Indexes a temporary media directory, likes the track, adds it to a playlist
+and to the listening history, then renames the file twice:
+
+- events replayed through MediaWatcher.touch and the debounce loop, with
+  every settled batch scanned right away as the rescan job would do it;
+- a real rename picked up by watchdog (skipped if it is not installed),
+  processed by a job worker.
+
+Fails if the rename produced a new Track id or lost likes, playlist entries
+or history.
+"""
+import argparse
+import math
+import os
+import struct
+import sys
+import tempfile
+import time
+import wave
+from pathlib import Path
+
+from app import create_app, db
+from app.config import Config
+from app.models import LikedTrack, ListeningHistory, MediaFile, Playlist, Track, User, playlist_tracks
+
+
+def write_wav(path, seconds=0.5, rate=8000):
+    frames = int(rate * seconds)
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(struct.pack(f"<{frames}h", *(int(8000 * math.sin(i / 7)) for i in range(frames))))
+
+
+def make_app(tmp, debounce):
+    class RenameConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp / 'rename.db'}"
+        PLAY_EVENTS_DB = str(tmp / "play_events.db")
+        JOBS_DB = str(tmp / "jobs.db")
+        MEDIA_DIR = tmp / "media"
+        ARTWORK_DIR = str(tmp / "artwork")
+        HLS_CACHE_DIR = str(tmp / "hls")
+        WATCH_LOCK_FILE = str(tmp / "watcher.lock")
+        WATCH_DEBOUNCE = debounce
+        WATCH_MEDIA = False
+        ANALYZE_AUDIO = False
+        CACHE_BACKEND = "none"
+
+    RenameConfig.MEDIA_DIR.mkdir()
+    app = create_app(RenameConfig())
+    with app.app_context():
+        db.create_all()
+        app.search_service.init_index()
+    return app
+
+
+def seed(app):
+    """Трек с лайком, записью в плейлисте и историей; возвращает его id"""
+    write_wav(app.media_service.media_dir / "song.wav")
+    with app.app_context():
+        app.media_service.scan_and_sync_db()
+        track = Track.query.one()
+        user = User(username="listener", email="listener@localhost")
+        db.session.add(user)
+        db.session.flush()
+        playlist = Playlist(name="Mix", user_id=user.id)
+        db.session.add(playlist)
+        db.session.flush()
+        db.session.execute(playlist_tracks.insert().values(playlist_id=playlist.id, track_id=track.id, position=1))
+        db.session.add(LikedTrack(user_id=user.id, track_id=track.id))
+        db.session.add(ListeningHistory(user_id=user.id, track_id=track.id))
+        db.session.commit()
+        return track.id
+
+
+def state(app):
+    with app.app_context():
+        return {
+            "tracks": [(t.id, Path(t.media).name) for t in Track.query.order_by(Track.id)],
+            "likes": [row.track_id for row in LikedTrack.query],
+            "playlist": [row.track_id for row in db.session.query(playlist_tracks)],
+            "history": [row.track_id for row in ListeningHistory.query],
+            "files": sorted((mf.path, mf.track_id) for mf in MediaFile.query),
+        }
+
+
+def expect(app, track_id, name):
+    """Список расхождений с ожидаемым: один трек track_id на файле name"""
+    s = state(app)
+    want = {
+        "tracks": [(track_id, name)],
+        "likes": [track_id],
+        "playlist": [track_id],
+        "history": [track_id],
+        "files": [(name, track_id)],
+    }
+    return [f"{key}: {s[key]} != {value}" for key, value in want.items() if s[key] != value]
+
+
+def rename_via_touch(app, src, dest):
+    """Событие moved через touch; каждую готовую пачку сразу сканируем, как задача rescan"""
+    from app.services.watcher import MediaWatcher
+    from app.services.media_service import AUDIO_EXTENSIONS
+
+    media_dir = app.media_service.media_dir
+    watcher = MediaWatcher(app, media_dir, AUDIO_EXTENSIONS)
+    os.rename(media_dir / src, media_dir / dest)
+    watcher.touch(str(media_dir / src), str(media_dir / dest))
+    batches = []
+    deadline = time.monotonic() + 10 * watcher.debounce + 5
+    while watcher._pending and time.monotonic() < deadline:
+        time.sleep(max(watcher.debounce / 2, 0.1))
+        ready = watcher._settled()
+        if ready:
+            batches.append(ready)
+            with app.app_context():
+                app.media_service.scan_and_sync_db(paths=ready)
+    return batches
+
+
+def rename_via_watchdog(app, src, dest, timeout=30):
+    """Настоящее переименование: watchdog -> задачи rescan -> воркер очереди; их статусы"""
+    media_dir = app.media_service.media_dir
+    if not app.media_service.start_watcher():
+        return None
+    app.jobs.start(workers=1)
+    time.sleep(0.5)  # observer должен успеть подписаться
+    os.rename(media_dir / src, media_dir / dest)
+    deadline = time.monotonic() + timeout
+    try:
+        while time.monotonic() < deadline:
+            time.sleep(0.2)
+            with app.app_context():
+                jobs = [j for j in app.jobs.recent(50) if j["kind"] == "rescan"]
+            if jobs and all(j["status"] in ("done", "failed") for j in jobs) and \
+                    not app.media_service.watcher._pending:
+                return [j["status"] for j in jobs]
+        return None
+    finally:
+        app.media_service.watcher.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--debounce", type=float, default=0.3, help="WATCH_DEBOUNCE for the check")
+    args = parser.parse_args()
+
+    app = make_app(Path(tempfile.mkdtemp()), args.debounce)
+    track_id = seed(app)
+
+    failed = 0
+    batches = rename_via_touch(app, "song.wav", "renamed.wav")
+    problems = expect(app, track_id, "renamed.wav")
+    if any("song.wav" in batch and "renamed.wav" not in batch for batch in batches):
+        problems.append(f"old name scanned without the new one: {batches}")
+    failed += bool(problems)
+    print(f"[{'FAIL' if problems else 'ok':>4}] touch + debounce   batches {batches}")
+    for problem in problems:
+        print(f"       {problem}")
+
+    batches = rename_via_watchdog(app, "renamed.wav", "final.wav")
+    if batches is None:
+        print("[skip] watchdog           not installed or no rescan job finished")
+    else:
+        problems = expect(app, track_id, "final.wav")
+        failed += bool(problems)
+        print(f"[{'FAIL' if problems else 'ok':>4}] watchdog           jobs {batches}")
+        for problem in problems:
+            print(f"       {problem}")
+
+    print(f"\n{'❌' if failed else '✅'} {failed} renames lost the track or its likes")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+"""
+Listening history maintenance
+Run: python compact_history.py [--batch-size 5000] [--max-batches N] [--rebuild-stats]
+
+Compacts listening_history rows older than HISTORY_RETENTION_DAYS into
+per-user per-track per-day rows (listening_history_daily). Works in short
+batches, each in its own transaction, so the web app keeps writing.
+The same job runs periodically in the job workers (compact_history).
+"""
+import argparse
+
+from app import create_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, help="rows per transaction (default HISTORY_COMPACT_BATCH)")
+    parser.add_argument("--max-batches", type=int, help="stop after N batches")
+    parser.add_argument("--pause", type=float, help="seconds between batches (default HISTORY_COMPACT_PAUSE)")
+    parser.add_argument("--rebuild-stats", action="store_true", help="recount user_stats from scratch")
+    args = parser.parse_args()
+
+    app = create_app()
+    history = app.history
+    if args.batch_size:
+        history.batch_size = args.batch_size
+    if args.pause is not None:
+        history.pause = args.pause
+    with app.app_context():
+        print(f"🗜  Compacting history older than {history.retention_days} days...")
+        summary = history.compact(
+            max_batches=args.max_batches,
+            on_progress=lambda done, _: print(f"   {done} rows", end="\r", flush=True)
+        )
+        print(f"   {summary['compacted']} rows in {summary['batches']} batches (before {summary['cutoff']})")
+        if args.rebuild_stats:
+            print(f"   user_stats rebuilt for {history.rebuild_stats()['users']} users")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+"""
+gunicorn settings, picked up automatically from the working directory
+Run: gunicorn run:app [--workers 4]
+
+Background threads (play event flusher, JOB_WORKERS job workers, media
+watcher) are started in each worker after the fork, not on import of
+run.py, so `flask db upgrade` and the scripts never start them.
+"""
+from app import start_background
+
+
+def post_worker_init(worker):
+    start_background(worker.wsgi)
@@ -0,0 +1,40 @@
+"""Backfill gap-based positions in playlist_tracks
+
+Revision ID: 7d99e5b98a54
+Revises: 12805044a9bb
+Create Date: 2026-10-19 04:02:37.914260
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d99e5b98a54'
+down_revision = '12805044a9bb'
+branch_labels = None
+depends_on = None
+
+POSITION_STEP = 1024  # app.services.playlists.POSITION_STEP на момент миграции
+
+
+def upgrade():
+    # position раньше не заполнялся (везде 0): раскладываем в порядке добавления
+    conn = op.get_bind()
+    rows = conn.execute(sa.text(
+        "SELECT playlist_id, track_id FROM playlist_tracks ORDER BY playlist_id, added_at, track_id"
+    )).fetchall()
+    values, last, n = [], None, 0
+    for playlist_id, track_id in rows:
+        n = n + 1 if playlist_id == last else 1
+        last = playlist_id
+        values.append({"p": playlist_id, "t": track_id, "pos": n * POSITION_STEP})
+    if values:
+        conn.execute(
+            sa.text("UPDATE playlist_tracks SET position = :pos WHERE playlist_id = :p AND track_id = :t"),
+            values
+        )
+
+
+def downgrade():
+    pass
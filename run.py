@@ -1,6 +1,7 @@
-from app import create_app
+from app import create_app, start_background
 
 app = create_app()
 
 if __name__ == "__main__":
+    start_background(app)
     app.run(host="0.0.0.0", port=5000, debug=app.config.get("DEBUG", False))
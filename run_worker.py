@@ -0,0 +1,42 @@
+"""
+Background job worker
+Run: python run_worker.py [--threads 2]
+
+Executes jobs from the shared queue (JOBS_DB): uploads, ZIP imports, rescans
+and periodic jobs (recommendations, trending charts, history compaction).
+Optional with the default JOB_WORKERS=1 (the web server runs jobs itself);
+with JOB_WORKERS=0 the web app leaves all jobs to this process.
+"""
+import argparse
+import threading
+
+from app import create_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=1, help="worker threads")
+    args = parser.parse_args()
+
+    app = create_app()
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=app.jobs.run_worker, args=(stop,), name=f"job-worker-{i}", daemon=True)
+        for i in range(args.threads)
+    ]
+    for t in threads:
+        t.start()
+    print(f"👷 Job worker started ({args.threads} threads), queue: {app.config['JOBS_DB']}")
+    try:
+        while any(t.is_alive() for t in threads):
+            for t in threads:
+                t.join(timeout=1)
+    except KeyboardInterrupt:
+        print("Stopping: waiting for running jobs to finish...")
+        stop.set()
+        for t in threads:
+            t.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,120 @@
 """
 Seed database with sample data
-Run: python seed_db.py
+Run: python seed_db.py [--users N --tracks N --history N --playlists N --likes N]
+
+Without arguments creates genres, the admin user and sample playlists.
+The counts add synthetic data on top (for benchmarks and load tests):
+tracks without audio files, users, playlists, likes and listening
+history skewed towards popular tracks. Same --seed — same data.
 """
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, func
+
 from app import create_app, db
-from app.models import Genre, Playlist, User
+from app.models import Genre, Playlist, User, Track, ListeningHistory, LikedTrack, playlist_tracks
+from app.services.playlists import POSITION_STEP
+
+GENRE_NAMES = ["Pop", "Rock", "Hip-Hop", "Jazz", "Electronic", "Classical", "R&B", "Country", "Latin", "Indie"]
+BATCH = 10000  # строк в одном executemany
+
+def _insert(table, rows):
+    """executemany пачками по BATCH строк"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH:
+            db.session.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+
+def seed_synthetic(app, users=0, tracks=0, history=0, playlists=0, likes=0, seed=42, days=120):
+    """
+    Добавить синтетические данные к существующим (id продолжают текущие).
+    Прослушивания и лайки смещены к популярным трекам (~ степенной закон),
+    played_at — за последние days дней.
+    """
+    rnd = random.Random(seed)
+    now = datetime.utcnow()
+    first_user = (db.session.query(func.max(User.id)).scalar() or 0) + 1
+    first_track = (db.session.query(func.max(Track.id)).scalar() or 0) + 1
+    first_playlist = (db.session.query(func.max(Playlist.id)).scalar() or 0) + 1
+
+    _insert(User.__table__, (
+        {"id": i, "username": f"bench_user_{i}", "avatar": "👤", "is_admin": False,
+         "created_at": now - timedelta(days=rnd.randint(0, days))}
+        for i in range(first_user, first_user + users)
+    ))
+    _insert(Track.__table__, (
+        {"id": i, "title": f"Synthetic Track {i}", "artist": f"Artist {i % 2000}", "album": f"Album {i % 8000}",
+         "duration": rnd.randint(90, 420), "media": f"/static/media/bench_{i}.mp3",
+         "genre": rnd.choice(GENRE_NAMES), "year": rnd.randint(1960, 2025), "track_number": rnd.randint(1, 14),
+         "plays": 0, "lyrics": "", "created_at": now - timedelta(minutes=i)}
+        for i in range(first_track, first_track + tracks)
+    ))
+    db.session.commit()
+
+    user_ids = db.session.query(func.min(User.id), func.max(User.id)).one()
+    track_ids = db.session.query(func.min(Track.id), func.max(Track.id)).one()
+    if None in user_ids or None in track_ids:
+        return
 
-def seed_database():
-    app = create_app()
+    def any_user():
+        return rnd.randint(*user_ids)
+
+    def popular_track():
+        # ~20% треков собирают большую часть прослушиваний
+        span = track_ids[1] - track_ids[0]
+        return track_ids[0] + int(span * rnd.random() ** 3)
+
+    _insert(Playlist.__table__, (
+        {"id": i, "name": f"Synthetic Playlist {i}", "description": "", "cover": "🎵",
+         "gradient": "linear-gradient(135deg,#7c3aed,#3b82f6)", "is_public": rnd.random() < 0.7,
+         "user_id": any_user(), "created_at": now, "updated_at": now}
+        for i in range(first_playlist, first_playlist + playlists)
+    ))
+
+    def playlist_rows():
+        for i in range(first_playlist, first_playlist + playlists):
+            members = {popular_track() for _ in range(rnd.randint(0, 100))}
+            for n, track_id in enumerate(sorted(members, key=lambda _: rnd.random()), 1):
+                yield {"playlist_id": i, "track_id": track_id, "position": n * POSITION_STEP, "added_at": now}
+    _insert(playlist_tracks, playlist_rows())
+
+    existing_likes = set(db.session.query(LikedTrack.user_id, LikedTrack.track_id))
+    def like_rows():
+        for _ in range(likes):
+            pair = (any_user(), popular_track())
+            if pair not in existing_likes:
+                existing_likes.add(pair)
+                yield {"user_id": pair[0], "track_id": pair[1],
+                       "liked_at": now - timedelta(seconds=rnd.randint(0, days * 86400))}
+    _insert(LikedTrack.__table__, like_rows())
+
+    plays = {}
+    def history_rows():
+        for _ in range(history):
+            track_id = popular_track()
+            plays[track_id] = plays.get(track_id, 0) + 1
+            yield {"user_id": any_user(), "track_id": track_id,
+                   "played_at": now - timedelta(seconds=rnd.randint(0, days * 86400))}
+    _insert(ListeningHistory.__table__, history_rows())
+    tracks_table = Track.__table__
+    if plays:
+        db.session.execute(
+            tracks_table.update()
+            .where(tracks_table.c.id == bindparam("tid"))
+            .values(plays=func.coalesce(tracks_table.c.plays, 0) + bindparam("n")),
+            [{"tid": t, "n": n} for t, n in plays.items()]
+        )
+    db.session.commit()
+    app.history.rebuild_stats()  # счётчики профиля — по вставленным напрямую строкам
+
+def seed_database(app=None, **synthetic):
+    app = app or create_app()
     
     with app.app_context():
         print("🌱 Seeding database...")
@@ -98,6 +206,11 @@ def seed_database():
                 print(f"  ✓ Added playlist: {playlist_data['name']}")
         
         db.session.commit()
+        
+        if any(synthetic.get(k) for k in ("users", "tracks", "history", "playlists", "likes")):
+            print("  … generating synthetic data: " + ", ".join(f"{k}={v}" for k, v in synthetic.items()))
+            seed_synthetic(app, **synthetic)
+        
         print("✅ Database seeded successfully!")
         print("\n📝 Next steps:")
         print("1. Start the server: python run.py")
@@ -105,4 +218,8 @@ def seed_database():
         print("3. Enjoy your Spotify clone!")
 
 if __name__ == "__main__":
-    seed_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    for name in ("users", "tracks", "history", "playlists", "likes"):
+        parser.add_argument(f"--{name}", type=int, default=0, help=f"synthetic {name} to add")
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    seed_database(**vars(parser.parse_args()))
\ No newline at end of file
@@ -161,6 +161,9 @@ const Router = {
         Router.navigate(`/search?q=${encodeURIComponent(query)}`);
       };
     });
+    
+    // Бесконечная прокрутка в новом контенте
+    initInfiniteScroll();
   }
 };
 
@@ -200,7 +203,10 @@ let state = {
   isPlaying: false,
   currentTime: 0,
   duration: 0,
+  seekBase: 0, // с какой секунды трека начинается текущий поток (?t=)
   volume: parseFloat(volumeRange?.value || 0.7),
+  gain: 1,
+  waveform: null,
   isMuted: false,
   isShuffle: false,
   repeatMode: 0,
@@ -214,14 +220,19 @@ let state = {
   originalTracks: DATA.tracks || []
 };
 
-// Load liked tracks from API
+// Load liked tracks from API (постранично, по курсору X-Next-Cursor)
 async function loadLikedTracks() {
   try {
-    const res = await fetch('/api/user/liked');
-    if (res.ok) {
+    const liked = new Set();
+    let cursor = '';
+    do {
+      const res = await fetch(`/api/user/liked?limit=500${cursor ? `&after=${cursor}` : ''}`);
+      if (!res.ok) return;
       const likedTracks = await res.json();
-      state.liked = new Set(likedTracks.map(t => t.id));
-    }
+      likedTracks.forEach(t => liked.add(t.id));
+      cursor = res.headers.get('X-Next-Cursor');
+    } while (cursor);
+    state.liked = liked;
   } catch (e) {
     console.log('Not logged in or error loading liked tracks');
   }
@@ -235,6 +246,70 @@ function formatTime(sec) {
   return `${m}:${s}`;
 }
 
+function escapeHtml(str) {
+  return String(str ?? '').replace(/[&<>"']/g, c => ({
+    '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+  })[c]);
+}
+
+// Бесконечная прокрутка по курсорному API:
+// <tbody data-infinite-src="/api/tracks?..." data-next="<cursor>">
+function initInfiniteScroll() {
+  document.querySelectorAll('[data-infinite-src]').forEach(list => {
+    if (list.dataset.infiniteBound) return;
+    list.dataset.infiniteBound = '1';
+    
+    const container = list.closest('table') || list;
+    const sentinel = document.createElement('div');
+    sentinel.style.height = '1px';
+    container.after(sentinel);
+    
+    // ссылки Prev/Next не нужны при подгрузке
+    const pager = container.parentElement.querySelector('.pager');
+    if (pager) pager.style.display = 'none';
+    
+    let loading = false;
+    const observer = new IntersectionObserver(async (entries) => {
+      if (!entries[0].isIntersecting || loading || !list.dataset.next) return;
+      loading = true;
+      try {
+        const src = list.dataset.infiniteSrc;
+        const sep = src.includes('?') ? '&' : '?';
+        const res = await fetch(`${src}${sep}after=${encodeURIComponent(list.dataset.next)}`);
+        if (!res.ok) return;
+        const data = await res.json();
+        let index = list.children.length;
+        list.insertAdjacentHTML('beforeend', data.items.map(t => `
+          <tr>
+            <td>${++index}</td>
+            <td><a href="/track/${t.id}">${escapeHtml(t.title)}</a></td>
+            <td>${escapeHtml(t.artist)}</td>
+            <td>${escapeHtml(t.album)}</td>
+            <td>${formatTime(t.duration)}</td>
+          </tr>`).join(''));
+        list.dataset.next = data.next || '';
+        if (!data.next) observer.disconnect();
+      } finally {
+        loading = false;
+      }
+    });
+    observer.observe(sentinel);
+  });
+}
+
+// Статус фоновых задач в админке: <span data-job-id="...">
+function initJobStatus() {
+  document.querySelectorAll('[data-job-id]').forEach(el => {
+    const timer = setInterval(async () => {
+      const job = await apiCall(`/api/jobs/${el.dataset.jobId}`);
+      if (!job) return clearInterval(timer);
+      const { done, total } = job.progress;
+      el.textContent = job.status + (total ? ` ${done}/${total}` : '') + (job.error ? `: ${job.error}` : '');
+      if (job.status === 'done' || job.status === 'failed') clearInterval(timer);
+    }, 2000);
+  });
+}
+
 async function apiCall(url, options = {}) {
   try {
     const res = await fetch(url, {
@@ -256,9 +331,9 @@ function savePlayerState() {
   if (state.currentTrack) {
     const playerState = {
       trackId: state.currentTrack.id,
-      currentTime: audio.currentTime,
+      currentTime: position(),
       isPlaying: !audio.paused,
-      volume: audio.volume
+      volume: state.volume
     };
     localStorage.setItem('playerState', JSON.stringify(playerState));
   }
@@ -273,9 +348,11 @@ function restorePlayerState() {
       const track = state.originalTracks.find(t => t.id === playerState.trackId);
       if (track) {
         state.currentTrack = track;
-        audio.src = track.media;
-        audio.currentTime = playerState.currentTime || 0;
-        audio.volume = playerState.volume || 0.7;
+        audio.src = streamUrl(track);
+        state.seekBase = 0;
+        seekTo(playerState.currentTime || 0);
+        state.volume = playerState.volume || 0.7;
+        loadWaveform(track);
         
         renderNowPlaying();
         
@@ -330,7 +407,7 @@ function renderNowPlaying() {
     
     nowPlayingEl.innerHTML = `
       <div style="display:flex;gap:12px;align-items:center;min-width:0">
-        <div class="track-cover" style="width:56px;height:56px;background:${t.gradient}">${t.cover}</div>
+        <div class="track-cover" style="width:56px;height:56px;background:${t.gradient}">${t.artwork ? `<img src="${artworkUrl(t, 64)}" alt="">` : t.cover}</div>
         <div style="min-width:0;flex:1">
           <div style="font-weight:700;white-space:nowrap;overflow:hidden;text-overflow:ellipsis">${t.title}</div>
           <div style="color:var(--muted);font-size:13px;white-space:nowrap;overflow:hidden;text-overflow:ellipsis">${t.artist}</div>
@@ -342,10 +419,129 @@ function renderNowPlaying() {
   }
 }
 
+// Обложки: content-addressed миниатюры (64/256/512), кэшируются браузером навсегда
+function artworkUrl(t, size) {
+  return `/api/artwork/${t.artwork}-${size}.jpg`;
+}
+
 // Playback functions
+const HLS_MIN_DURATION = 600; // длинные миксы/подкасты — сегментами, если браузер умеет HLS
+const nativeHls = !!audio.canPlayType && audio.canPlayType('application/vnd.apple.mpegurl') !== '';
+
+// Треки, для которых манифест не отдался (202, пока строится индекс перемотки, или 404)
+const hlsUnavailable = new Set();
+
+function streamUrl(t) {
+  // Стриминг через API: Range-запросы, ETag и кэширование вместо /static
+  if (!t.id) return t.media || '';
+  if (nativeHls && !hlsUnavailable.has(t.id) && (t.duration || 0) >= HLS_MIN_DURATION &&
+      /\.mp3$/i.test(t.media || '')) {
+    return `/api/tracks/${t.id}/hls.m3u8`;
+  }
+  return `/api/tracks/${t.id}/stream`;
+}
+
+audio.addEventListener('error', () => {
+  const t = state.currentTrack;
+  if (!t || !audio.src.endsWith('/hls.m3u8')) return;
+  hlsUnavailable.add(t.id);
+  audio.src = streamUrl(t);
+  if (state.isPlaying) audio.play().catch(() => {});
+});
+
+// Позиция в треке с учётом потока, начатого с середины
+function position() {
+  return state.seekBase + audio.currentTime;
+}
+
+// Длинные MP3 без HLS перематываются на сервере: поток начинается с нужного кадра,
+// вместо того чтобы браузер докачивал файл до места перемотки
+function serverSeekable(t) {
+  return !!t && !!t.id && streamUrl(t).endsWith('/stream') &&
+    (t.duration || 0) >= HLS_MIN_DURATION && /\.mp3$/i.test(t.media || '');
+}
+
+function isBuffered(time) {
+  for (let i = 0; i < audio.buffered.length; i++) {
+    if (audio.buffered.start(i) <= time && time <= audio.buffered.end(i)) return true;
+  }
+  return false;
+}
+
+async function seekTo(seconds) {
+  const t = state.currentTrack;
+  const local = seconds - state.seekBase;
+  if (!serverSeekable(t) || (local >= 0 && isBuffered(local)) || (seconds < 1 && !state.seekBase)) {
+    if (local >= 0) {
+      audio.currentTime = local;
+      return;
+    }
+  }
+  const res = serverSeekable(t) ? await apiCall(`/api/tracks/${t.id}/seek?t=${seconds.toFixed(3)}`) : null;
+  if (state.currentTrack !== t) return;
+  if (!res) {
+    audio.currentTime = Math.max(local, 0);
+    return;
+  }
+  const wasPlaying = !audio.paused;
+  state.seekBase = res.t;
+  audio.src = res.url;
+  if (wasPlaying) audio.play().catch(() => {});
+}
+
+// Громкость с поправкой ReplayGain текущего трека
+function applyVolume() {
+  audio.volume = state.isMuted ? 0 : state.volume * state.gain;
+}
+
+// Волна и нормализация громкости, посчитанные при импорте
+async function loadWaveform(t) {
+  state.gain = 1;
+  state.waveform = null;
+  applyVolume();
+  drawWaveform();
+  if (!t.id) return;
+  const data = await apiCall(`/api/tracks/${t.id}/waveform`);
+  if (!data || state.currentTrack?.id !== t.id) return;
+  // <audio> не усиливает громче 1.0 — приглушаем только громкие треки
+  if (data.replay_gain != null) state.gain = Math.min(1, Math.pow(10, data.replay_gain / 20));
+  state.waveform = data.peaks;
+  applyVolume();
+  drawWaveform();
+}
+
+function drawWaveform() {
+  if (!progressBar) return;
+  progressBar.classList.toggle('has-waveform', !!state.waveform);
+  if (!state.waveform) return;
+  
+  let canvas = progressBar.querySelector('canvas');
+  if (!canvas) {
+    canvas = document.createElement('canvas');
+    progressBar.prepend(canvas);
+  }
+  const rect = progressBar.getBoundingClientRect();
+  const dpr = window.devicePixelRatio || 1;
+  canvas.width = rect.width * dpr;
+  canvas.height = rect.height * dpr;
+  
+  const ctx = canvas.getContext('2d');
+  ctx.fillStyle = 'rgba(255, 255, 255, 0.45)';
+  const peaks = state.waveform;
+  const bars = Math.max(1, Math.min(peaks.length, Math.floor(rect.width / 3)));
+  const step = peaks.length / bars;
+  const barWidth = canvas.width / bars;
+  for (let i = 0; i < bars; i++) {
+    const slice = peaks.slice(Math.floor(i * step), Math.max(Math.floor((i + 1) * step), Math.floor(i * step) + 1));
+    const h = Math.max(Math.max(...slice) / 255 * canvas.height, dpr);
+    ctx.fillRect(i * barWidth, (canvas.height - h) / 2, Math.max(barWidth - dpr, dpr), h);
+  }
+}
+
 function setAudioForTrack(t) {
-  audio.src = t.media || '';
+  audio.src = streamUrl(t);
   audio.currentTime = 0;
+  state.seekBase = 0;
   state.duration = t.duration || 0;
   timeDuration && (timeDuration.textContent = formatTime(state.duration));
   
@@ -354,7 +550,11 @@ function setAudioForTrack(t) {
       title: t.title,
       artist: t.artist,
       album: t.album,
-      artwork: [
+      artwork: t.artwork ? [256, 512].map(size => ({
+        src: artworkUrl(t, size),
+        sizes: `${size}x${size}`,
+        type: 'image/jpeg'
+      })) : [
         { 
           src: 'data:image/svg+xml,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100"><rect width="100" height="100" fill="%237d3aed"/><text x="50" y="60" font-size="40" text-anchor="middle" fill="white">' + t.cover + '</text></svg>', 
           sizes: '96x96', 
@@ -373,7 +573,7 @@ async function playTrack(id) {
   state.currentTrack = t;
   
   setAudioForTrack(t);
-  audio.volume = state.isMuted ? 0 : state.volume;
+  loadWaveform(t);
   
   try {
     await audio.play();
@@ -439,8 +639,8 @@ function handleNext() {
 function handlePrev() {
   if (!state.currentTrack) return;
   
-  if (audio.currentTime > 3) {
-    audio.currentTime = 0;
+  if (position() > 3) {
+    seekTo(0);
     return;
   }
   
@@ -486,7 +686,7 @@ async function toggleLike(id) {
 
 function toggleMute() {
   state.isMuted = !state.isMuted;
-  audio.volume = state.isMuted ? 0 : state.volume;
+  applyVolume();
   muteBtn && (muteBtn.textContent = state.isMuted ? '🔈' : '🔊');
   savePlayerState();
 }
@@ -612,19 +812,19 @@ muteBtn?.addEventListener('click', toggleMute);
 
 volumeRange?.addEventListener('input', (e) => {
   state.volume = parseFloat(e.target.value);
-  if (!state.isMuted) audio.volume = state.volume;
+  applyVolume();
   savePlayerState();
 });
 
 audio?.addEventListener('timeupdate', () => {
-  state.currentTime = audio.currentTime;
+  state.currentTime = position();
   timeCurrent && (timeCurrent.textContent = formatTime(state.currentTime));
   const pct = state.duration ? (state.currentTime / state.duration) * 100 : (audio.duration ? (audio.currentTime / audio.duration) * 100 : 0);
   progress && (progress.style.width = pct + '%');
 });
 
 audio?.addEventListener('loadedmetadata', () => {
-  state.duration = audio.duration || state.currentTrack?.duration || 0;
+  state.duration = audio.duration ? state.seekBase + audio.duration : (state.currentTrack?.duration || 0);
   timeDuration && (timeDuration.textContent = formatTime(state.duration));
 });
 
@@ -636,18 +836,25 @@ audio?.addEventListener('ended', () => {
   }
 });
 
+window.addEventListener('resize', drawWaveform);
+
 progressBar?.addEventListener('click', (e) => {
   const rect = progressBar.getBoundingClientRect();
   const pct = (e.clientX - rect.left) / rect.width;
-  if (audio.duration) audio.currentTime = pct * audio.duration;
+  if (state.duration) seekTo(pct * state.duration);
   savePlayerState();
 });
 
+let searchTimer = null;
 searchInput?.addEventListener('input', (e) => {
   state.searchQuery = e.target.value;
   const query = e.target.value.trim();
+  // Не дёргаем поиск на каждую клавишу
+  clearTimeout(searchTimer);
   if (query) {
-    Router.navigate(`/search?q=${encodeURIComponent(query)}`);
+    searchTimer = setTimeout(() => {
+      Router.navigate(`/search?q=${encodeURIComponent(query)}`);
+    }, 250);
   }
 });
 
@@ -681,6 +888,8 @@ async function init() {
   restorePlayerState();
   renderNowPlaying();
   await loadUserPlaylists();
+  initInfiniteScroll();
+  initJobStatus();
   
   // Инициализируем роутер
   Router.init();